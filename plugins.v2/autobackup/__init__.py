@@ -1,12 +1,22 @@
 import glob
+import hashlib
+import io
+import json
 import os
 import re
 import shutil
+import sqlite3
 import subprocess
+import tarfile
+import tempfile
+import threading
 import time
+import zipfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Iterator, Callable, Set
 from urllib.parse import urljoin
 
 import docker
@@ -27,6 +37,392 @@ from app.schemas import NotificationType
 from app.utils.system import SystemUtils
 
 
+class BackupArchive:
+    """
+    备份归档
+    各备份内容直接写入归档文件，不再复制到临时目录后打包；
+    SQLite 数据库通过在线备份接口取得一致快照，不直接复制正在写入的数据库及WAL文件
+    """
+
+    # 归档格式 -> 扩展名
+    FORMATS = {
+        "zip": ".zip",
+        "tar.gz": ".tar.gz",
+        "tar.xz": ".tar.xz",
+        "tar.zst": ".tar.zst",
+    }
+    # 小于该大小的数据库通过在线备份接口在内存中取得快照
+    MEMORY_SNAPSHOT_SIZE = 256 * 1024 * 1024
+    # 流式写入的块大小
+    CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, base_path: Path, compress_format: str = "zip", compress_level: Optional[int] = None):
+        """
+        :param base_path: 归档路径（不含扩展名）
+        :param compress_format: 归档格式
+        :param compress_level: 压缩级别，为空使用默认级别
+        """
+        if compress_format not in self.FORMATS:
+            compress_format = "zip"
+        if compress_format == "tar.zst" and not self.__zstd():
+            logger.warn("缺少zstandard依赖包，改用zip格式，可安装：pip install zstandard")
+            compress_format = "zip"
+        self.format = compress_format
+        self.level = compress_level
+        self.path = Path(f"{base_path}{self.FORMATS[compress_format]}")
+        self.in_bytes = 0
+        self._zip: Optional[zipfile.ZipFile] = None
+        self._tar: Optional[tarfile.TarFile] = None
+        self._raw = None
+        self._zstd_writer = None
+        self._started = time.time()
+        self.__open()
+
+    @staticmethod
+    def __zstd():
+        try:
+            import zstandard
+            return zstandard
+        except ImportError:
+            return None
+
+    def __open(self):
+        if self.format == "zip":
+            kwargs = {"compresslevel": self.level} if self.level is not None else {}
+            self._zip = zipfile.ZipFile(self.path, "w", compression=zipfile.ZIP_DEFLATED, allowZip64=True, **kwargs)
+        elif self.format == "tar.zst":
+            zstandard = self.__zstd()
+            self._raw = open(self.path, "wb")
+            compressor = zstandard.ZstdCompressor(level=self.level if self.level is not None else 3, threads=-1)
+            self._zstd_writer = compressor.stream_writer(self._raw)
+            self._tar = tarfile.open(fileobj=self._zstd_writer, mode="w|")
+        else:
+            mode = "w:gz" if self.format == "tar.gz" else "w:xz"
+            if self.level is None:
+                self._tar = tarfile.open(self.path, mode)
+            elif self.format == "tar.gz":
+                self._tar = tarfile.open(self.path, mode, compresslevel=self.level)
+            else:
+                self._tar = tarfile.open(self.path, mode, preset=self.level)
+
+    def add_file(self, file_path: Path, arcname: str):
+        """
+        写入单个文件
+        """
+        size = file_path.stat().st_size
+        if self._zip:
+            self._zip.write(file_path, arcname)
+        else:
+            self._tar.add(str(file_path), arcname=arcname, recursive=False)
+        self.in_bytes += size
+
+    def add_tree(self, dir_path: Path, arcname: str):
+        """
+        写入目录
+        """
+        for root, dirs, files in os.walk(dir_path):
+            dirs.sort()
+            rel_root = Path(arcname) / Path(root).relative_to(dir_path)
+            if self._zip:
+                self._zip.write(root, f"{rel_root.as_posix()}/")
+            else:
+                self._tar.add(root, arcname=rel_root.as_posix(), recursive=False)
+            for name in sorted(files):
+                self.add_file(Path(root) / name, (rel_root / name).as_posix())
+
+    def add_stream(self, reader, arcname: str, size: Optional[int] = None):
+        """
+        从可读对象写入成员
+        :param size: 成员大小，tar格式必须提供；zip格式可为空，边读边写
+        """
+        if self._zip:
+            written = 0
+            with self._zip.open(arcname, "w", force_zip64=True) as writer:
+                while chunk := reader.read(self.CHUNK_SIZE):
+                    writer.write(chunk)
+                    written += len(chunk)
+            self.in_bytes += written
+            return
+        if size is None:
+            # tar成员需预先知道大小，先写入临时文件（小于64MB时在内存中）
+            with tempfile.SpooledTemporaryFile(max_size=64 * 1024 * 1024, dir=self.path.parent) as spool:
+                shutil.copyfileobj(reader, spool, self.CHUNK_SIZE)
+                size = spool.tell()
+                spool.seek(0)
+                self.add_stream(spool, arcname=arcname, size=size)
+            return
+        info = tarfile.TarInfo(name=arcname)
+        info.size = size
+        info.mtime = int(time.time())
+        self._tar.addfile(info, reader)
+        self.in_bytes += size
+
+    def add_sqlite(self, db_file: Path, arcname: str):
+        """
+        写入数据库一致快照：较小的数据库通过SQLite在线备份接口在内存中取得快照（已包含WAL中已提交的内容），
+        较大的数据库在只读事务中直接读取文件
+        """
+        source = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True, timeout=30)
+        try:
+            if db_file.stat().st_size < self.MEMORY_SNAPSHOT_SIZE and hasattr(source, "serialize"):
+                target = sqlite3.connect(":memory:")
+                try:
+                    source.backup(target)
+                    data = target.serialize()
+                finally:
+                    target.close()
+                self.add_stream(io.BytesIO(data), arcname=arcname, size=len(data))
+                return
+            # 大数据库不再落盘暂存：开启只读事务固定快照后直接读取数据库文件，
+            # 事务期间其它连接无法覆盖快照所需页面，WAL模式下随后一并写入WAL文件，恢复时由SQLite自动重放
+            source.execute("BEGIN")
+            source.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+            journal_mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+            with open(db_file, "rb") as reader:
+                self.add_stream(reader, arcname=arcname, size=db_file.stat().st_size)
+            wal_file = db_file.with_name(f"{db_file.name}-wal")
+            if str(journal_mode).lower() == "wal" and wal_file.exists():
+                with open(wal_file, "rb") as reader:
+                    self.add_stream(reader, arcname=f"{arcname}-wal")
+            source.rollback()
+        finally:
+            source.close()
+
+    def close(self) -> Path:
+        """
+        完成归档，输出统计
+        """
+        if self._zip:
+            self._zip.close()
+        if self._tar:
+            self._tar.close()
+        if self._zstd_writer:
+            self._zstd_writer.close()
+        if self._raw and not self._raw.closed:
+            self._raw.close()
+        elapsed = max(time.time() - self._started, 0.001)
+        out_bytes = self.path.stat().st_size
+        logger.info(f"备份归档 {self.path.name} 完成，原始 {self.in_bytes / 1024 / 1024:.1f}MB，"
+                    f"归档 {out_bytes / 1024 / 1024:.1f}MB，耗时 {elapsed:.1f} 秒，"
+                    f"速度 {self.in_bytes / 1024 / 1024 / elapsed:.1f}MB/s")
+        return self.path
+
+    def abort(self):
+        """
+        出错时关闭并删除未完成的归档
+        """
+        for closer in [self._zip, self._tar, self._zstd_writer, self._raw]:
+            try:
+                if closer:
+                    closer.close()
+            except Exception:
+                pass
+        self.path.unlink(missing_ok=True)
+
+
+class ChunkStore:
+    """
+    增量备份块存储
+    文件按内容切分为块，块以SHA-256命名、zlib压缩后保存，相同内容的块只保存一次
+    """
+
+    # 以4KB为单位判断切分点，SQLite页面原地修改时只影响所在的块
+    BLOCK_SIZE = 4096
+    MIN_CHUNK = 256 * 1024
+    MAX_CHUNK = 4 * 1024 * 1024
+    # 块校验值满足掩码时切分，平均块约768KB
+    BOUNDARY_MASK = 0x7f
+    READ_SIZE = 16 * 1024 * 1024
+    # 已上传到WebDAV的块及清单记录
+    UPLOADED_FILE = ".uploaded"
+
+    def __init__(self, root: Path, compress_level: Optional[int] = None):
+        self.root = root
+        self.level = compress_level if compress_level is not None and 0 <= compress_level <= 9 else 6
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def split(cls, reader) -> Iterator[bytes]:
+        """
+        按4KB对齐位置分块：块末尾4KB的CRC满足掩码即切分，切分点只在对齐位置判断，
+        因此原地修改（如SQLite页面更新）只影响所在的块；插入或删除内容会使之后的切分点全部错位，
+        PostgreSQL导出的SQL文本在首个变化处之后无法复用已有块
+        """
+        carry = b""
+        blocks = []
+        length = 0
+        while data := reader.read(cls.READ_SIZE):
+            if carry:
+                data = carry + data
+            end = len(data) - len(data) % cls.BLOCK_SIZE
+            carry = data[end:]
+            view = memoryview(data)
+            for offset in range(0, end, cls.BLOCK_SIZE):
+                block = view[offset:offset + cls.BLOCK_SIZE]
+                blocks.append(block)
+                length += cls.BLOCK_SIZE
+                if length >= cls.MAX_CHUNK \
+                        or (length >= cls.MIN_CHUNK and zlib.crc32(block) & cls.BOUNDARY_MASK == 0):
+                    yield b"".join(blocks)
+                    blocks = []
+                    length = 0
+        tail = b"".join(blocks) + carry
+        if tail:
+            yield tail
+
+    def chunk_path(self, digest: str) -> Path:
+        return self.root / digest
+
+    def put(self, data: bytes) -> Tuple[str, bool]:
+        """
+        保存块
+        :return: 块摘要，是否新增
+        """
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.chunk_path(digest)
+        if path.exists():
+            return digest, False
+        tmp_path = self.root / f".{digest}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(zlib.compress(data, self.level))
+        os.replace(tmp_path, path)
+        return digest, True
+
+    def get(self, digest: str) -> bytes:
+        """
+        读取块并校验内容
+        """
+        data = zlib.decompress(self.chunk_path(digest).read_bytes())
+        if hashlib.sha256(data).hexdigest() != digest:
+            raise IOError(f"备份块 {digest} 校验失败")
+        return data
+
+    def gc(self, referenced: Set[str]) -> int:
+        """
+        删除没有被任何清单引用的块
+        """
+        removed = 0
+        for path in self.root.iterdir():
+            if path.name not in referenced and path.is_file() and path.name != self.UPLOADED_FILE:
+                path.unlink(missing_ok=True)
+                removed += 1
+        return removed
+
+    def uploaded(self) -> Set[str]:
+        """
+        已上传到WebDAV的块及清单
+        """
+        path = self.root / self.UPLOADED_FILE
+        if not path.exists():
+            return set()
+        return set(path.read_text(encoding="utf-8").split())
+
+    def mark_uploaded(self, name: str):
+        """
+        追加上传记录，上传中断后下次从未记录的块继续
+        """
+        with self._lock:
+            with open(self.root / self.UPLOADED_FILE, "a", encoding="utf-8") as f:
+                f.write(f"{name}\n")
+
+    def reset_uploaded(self, names: Set[str]):
+        """
+        重写上传记录
+        """
+        with self._lock:
+            tmp_path = self.root / f"{self.UPLOADED_FILE}.tmp"
+            tmp_path.write_text("".join(f"{name}\n" for name in sorted(names)), encoding="utf-8")
+            os.replace(tmp_path, self.root / self.UPLOADED_FILE)
+
+    @staticmethod
+    def read_manifest(data: bytes) -> dict:
+        return json.loads(data.decode("utf-8"))
+
+    @staticmethod
+    def manifest_digests(manifest: dict) -> Set[str]:
+        return {digest for item in manifest.get("files", []) for digest, _ in item.get("chunks", [])}
+
+    def restore(self, manifest: dict, target_dir: Path, fetch: Callable[[str], None] = None):
+        """
+        按清单还原各文件
+        :param fetch: 本地缺少块时调用，将块下载到本地块存储
+        """
+        for item in manifest.get("files", []):
+            target = target_dir / item["name"]
+            target.parent.mkdir(parents=True, exist_ok=True)
+            with open(target, "wb") as f:
+                for digest, _ in item.get("chunks", []):
+                    if not self.chunk_path(digest).exists() and fetch:
+                        fetch(digest)
+                    f.write(self.get(digest))
+
+
+class ChunkedBackup(BackupArchive):
+    """
+    增量备份
+    与归档备份写入相同的内容，但各文件切块后存入块存储，只新增发生变化的块，每次备份写入一个清单
+    """
+
+    def __init__(self, base_path: Path, store: ChunkStore):
+        self.format = "chunks"
+        self.level = None
+        self.path = Path(f"{base_path}.json")
+        self.store = store
+        self.in_bytes = 0
+        self.new_bytes = 0
+        self.new_chunks = 0
+        self.reused_chunks = 0
+        self._files: List[dict] = []
+        self._started = time.time()
+
+    def add_file(self, file_path: Path, arcname: str):
+        with open(file_path, "rb") as reader:
+            self.add_stream(reader, arcname=arcname)
+
+    def add_tree(self, dir_path: Path, arcname: str):
+        for root, dirs, files in os.walk(dir_path):
+            dirs.sort()
+            rel_root = Path(arcname) / Path(root).relative_to(dir_path)
+            for name in sorted(files):
+                self.add_file(Path(root) / name, (rel_root / name).as_posix())
+
+    def add_stream(self, reader, arcname: str, size: Optional[int] = None):
+        chunks = []
+        total = 0
+        for data in self.store.split(reader):
+            digest, created = self.store.put(data)
+            chunks.append([digest, len(data)])
+            total += len(data)
+            if created:
+                self.new_chunks += 1
+                self.new_bytes += len(data)
+            else:
+                self.reused_chunks += 1
+        self._files.append({"name": arcname, "size": total, "chunks": chunks})
+        self.in_bytes += total
+
+    def close(self) -> Path:
+        manifest = {
+            "version": 1,
+            "time": self.path.name[3:17],
+            "files": self._files
+        }
+        tmp_path = self.path.with_name(f".{self.path.name}.tmp")
+        tmp_path.write_text(json.dumps(manifest, ensure_ascii=False), encoding="utf-8")
+        os.replace(tmp_path, self.path)
+        elapsed = max(time.time() - self._started, 0.001)
+        logger.info(f"增量备份 {self.path.name} 完成，原始 {self.in_bytes / 1024 / 1024:.1f}MB，"
+                    f"新增块 {self.new_chunks} 个 {self.new_bytes / 1024 / 1024:.1f}MB，"
+                    f"复用块 {self.reused_chunks} 个，耗时 {elapsed:.1f} 秒，"
+                    f"速度 {self.in_bytes / 1024 / 1024 / elapsed:.1f}MB/s")
+        return self.path
+
+    def abort(self):
+        # 已写入的块由之后的清理回收
+        self.path.unlink(missing_ok=True)
+
+
 class AutoBackup(_PluginBase):
     # 插件名称
     plugin_name = "自动备份"
@@ -35,7 +431,7 @@ class AutoBackup(_PluginBase):
     # 插件图标
     plugin_icon = "Time_machine_B.png"
     # 插件版本
-    plugin_version = "2.1.4"
+    plugin_version = "2.2"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -55,6 +451,11 @@ class AutoBackup(_PluginBase):
     _onlyonce = False
     _notify = False
     _back_path = None
+    # 归档格式及压缩级别
+    _compress_format = "zip"
+    _compress_level = None
+    # 增量备份
+    _incremental = False
 
     # WebDAV相关配置
     _webdav_enabled = False
@@ -66,6 +467,9 @@ class AutoBackup(_PluginBase):
     _webdav_notify = False
     _webdav_disable_check = False
     _webdav_client = None
+    # WebDAV上增量备份块目录及并行上传数
+    _webdav_chunk_dir = "chunks"
+    _webdav_upload_workers = 4
 
     # 定时器
     _scheduler: Optional[BackgroundScheduler] = None
@@ -81,6 +485,10 @@ class AutoBackup(_PluginBase):
             self._notify = config.get("notify")
             self._onlyonce = config.get("onlyonce")
             self._back_path = config.get("back_path")
+            self._compress_format = config.get("compress_format") or "zip"
+            self._compress_level = int(config.get("compress_level")) \
+                if str(config.get("compress_level") or "").strip().lstrip("-").isdigit() else None
+            self._incremental = config.get("incremental", False)
 
             # WebDAV配置
             self._webdav_enabled = config.get("webdav_enabled", False)
@@ -112,6 +520,9 @@ class AutoBackup(_PluginBase):
                 "cnt": self._cnt,
                 "notify": self._notify,
                 "back_path": self._back_path,
+                "compress_format": self._compress_format,
+                "compress_level": self._compress_level,
+                "incremental": self._incremental,
                 "webdav_enabled": self._webdav_enabled,
                 "webdav_hostname": self._webdav_hostname,
                 "webdav_login": self._webdav_login,
@@ -135,6 +546,42 @@ class AutoBackup(_PluginBase):
             return schemas.Response(success=False, message="API密钥错误")
         return self.__backup()
 
+    def api_restore(self, name: str, apikey: str):
+        """
+        API调用还原增量备份，还原到备份路径下的 restore/<备份名> 目录
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        name = str(name or "").removesuffix(".json")
+        if not re.match(r"^bk_\d{14}$", name):
+            return schemas.Response(success=False, message="备份名称格式错误，应为 bk_YYYYMMDDHHMMSS")
+        bk_path = self.__get_backup_path()
+        manifest_file = bk_path / f"{name}.json"
+        store = ChunkStore(bk_path / "chunks")
+        fetch = self.__fetch_webdav_chunk if self._webdav_enabled and self._webdav_client else None
+        try:
+            if manifest_file.exists():
+                data = manifest_file.read_bytes()
+            elif fetch:
+                buffer = io.BytesIO()
+                self._webdav_client.download_from(buff=buffer, remote_path=manifest_file.name)
+                data = buffer.getvalue()
+            else:
+                return schemas.Response(success=False, message=f"未找到备份清单 {manifest_file.name}")
+            target = bk_path / "restore" / name
+            store.restore(ChunkStore.read_manifest(data), target, fetch=fetch)
+        except Exception as e:
+            logger.error(f"还原增量备份 {name} 失败: {str(e)}")
+            return schemas.Response(success=False, message=f"还原失败: {str(e)}")
+        logger.info(f"增量备份 {name} 已还原到 {target}")
+        return schemas.Response(success=True, message=f"已还原到 {target}")
+
+    def __get_backup_path(self) -> Path:
+        """
+        备份保存路径
+        """
+        return Path(self._back_path) if self._back_path else self.get_data_path()
+
     def __backup(self):
         """
         自动备份、删除备份
@@ -142,10 +589,13 @@ class AutoBackup(_PluginBase):
         logger.info(f"当前时间 {time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(time.time()))} 开始备份")
 
         # 备份保存路径
-        bk_path = Path(self._back_path) if self._back_path else self.get_data_path()
+        bk_path = self.__get_backup_path()
 
         # 备份
-        zip_file = self.backup_file(bk_path=bk_path)
+        zip_file = self.backup_file(bk_path=bk_path,
+                                    compress_format=self._compress_format,
+                                    compress_level=self._compress_level,
+                                    incremental=self._incremental)
 
         if zip_file:
             success = True
@@ -180,12 +630,16 @@ class AutoBackup(_PluginBase):
             else:
                 logger.info(
                     f"获取到 {bk_path} 路径下备份文件数量 {bk_cnt} 保留数量 {int(self._cnt)} 无需删除")
+        self.__clean_local_chunks(bk_path)
 
         # 如果启用了WebDAV备份，则上传到WebDAV
         webdav_success = True
         webdav_msg = ""
         if self._webdav_enabled and zip_file and success:
-            webdav_success, webdav_msg = self.__upload_to_webdav(zip_file)
+            if self._incremental:
+                webdav_success, webdav_msg = self.__upload_chunks_to_webdav(bk_path)
+            else:
+                webdav_success, webdav_msg = self.__upload_to_webdav(zip_file)
             if webdav_success and self._webdav_max_count:
                 self.__clean_old_webdav_backups(self._webdav_max_count)
 
@@ -209,31 +663,46 @@ class AutoBackup(_PluginBase):
         return success and webdav_success, f"{msg}{(' ' + webdav_msg) if webdav_msg else ''}"
 
     @staticmethod
-    def backup_file(bk_path: Path = None):
+    def backup_file(bk_path: Path = None, compress_format: str = "zip", compress_level: Optional[int] = None,
+                    incremental: bool = False):
         """
         @param bk_path     自定义备份路径
+        @param compress_format 归档格式 zip/tar.gz/tar.xz/tar.zst
+        @param compress_level  压缩级别
+        @param incremental 增量备份，各文件切块存入 chunks 目录并写入清单 bk_*.json
         """
+        archive = None
         try:
-            # 创建备份文件夹
             config_path = Path(settings.CONFIG_PATH)
             backup_file = f"bk_{time.strftime('%Y%m%d%H%M%S')}"
-            backup_path = bk_path / backup_file
-            if not backup_path.exists():
-                backup_path.mkdir(parents=True)
+            if not bk_path.exists():
+                bk_path.mkdir(parents=True)
+            if incremental:
+                archive = ChunkedBackup(base_path=bk_path / backup_file,
+                                        store=ChunkStore(bk_path / "chunks", compress_level=compress_level))
+            else:
+                archive = BackupArchive(base_path=bk_path / backup_file,
+                                        compress_format=compress_format,
+                                        compress_level=compress_level)
 
-            # 把现有的相关文件进行copy备份
+            # 把现有的相关文件直接写入归档
             category_file = config_path / "category.yaml"
             if category_file.exists():
-                shutil.copy(category_file, backup_path)
+                archive.add_file(category_file, category_file.name)
 
             # 备份数据库
             if settings.DB_TYPE == "sqlite":
                 # 查找所有以 "user.db" 开头的文件
-                userdb_files = list(config_path.glob("user.db*"))
-                # 如果找到了任何匹配的文件，则进行复制
-                for userdb_file in userdb_files:
-                    if userdb_file.exists():
-                        shutil.copy(userdb_file, backup_path)
+                for userdb_file in sorted(config_path.glob("user.db*")):
+                    if not userdb_file.exists():
+                        continue
+                    if userdb_file.name == "user.db":
+                        # 数据库一致快照，已包含WAL内容
+                        archive.add_sqlite(userdb_file, userdb_file.name)
+                    elif userdb_file.name.endswith(("-wal", "-shm", "-journal")):
+                        continue
+                    else:
+                        archive.add_file(userdb_file, userdb_file.name)
             if settings.DB_TYPE == "postgresql":
                 # 获取数据库连接信息
                 db_host = str(settings.DB_POSTGRESQL_HOST)
@@ -258,45 +727,47 @@ class AutoBackup(_PluginBase):
                         logger.error(f"安装 PostgreSQL {pg_version} 客户端失败: {e.stderr.strip() if e.stderr else str(e)}")
                         logger.error("请手动执行安装命令。")
                         logger.error(f'apt-get update && apt-get install -y wget gnupg lsb-release && wget --quiet -O - https://www.postgresql.org/media/keys/ACCC4CF8.asc | gpg --dearmor > /etc/apt/trusted.gpg.d/postgresql.gpg && echo "deb http://apt.postgresql.org/pub/repos/apt $(lsb_release -cs)-pgdg main" > /etc/apt/sources.list.d/pgdg.list && apt-get update && apt-get install -y postgresql-client-{pg_version}')
+                        archive.abort()
                         return None
 
-                # 构建 pg_dump 命令
+                # 构建 pg_dump 命令，输出直接写入归档
                 pg_dump_cmd = [
                     'pg_dump',
                     '-h', db_host,
                     '-p', db_port,
                     '-U', db_user,
-                    '-d', db_name,
-                    '-f', str(backup_path / 'postgresql_backup.sql')
+                    '-d', db_name
                 ]
 
                 # 执行备份
-                try:
-                    result = subprocess.run(pg_dump_cmd, env=env, check=True, capture_output=True, text=True)
-                    logger.info(f"PostgreSQL数据库备份成功: {backup_path / 'postgresql_backup.sql'}")
-                except subprocess.CalledProcessError as e:
-                    error_message = e.stderr.strip() if e.stderr else str(e)
+                with tempfile.TemporaryFile() as stderr:
+                    process = subprocess.Popen(pg_dump_cmd, env=env, stdout=subprocess.PIPE, stderr=stderr)
+                    archive.add_stream(process.stdout, arcname='postgresql_backup.sql')
+                    process.stdout.close()
+                    return_code = process.wait()
+                    stderr.seek(0)
+                    error_message = stderr.read().decode(errors="replace").strip()
+                if return_code != 0:
                     logger.error(f"PostgreSQL数据库备份失败: {error_message}")
                     # 检查是否是版本不匹配的错误
                     if "server version mismatch" in error_message:
                         logger.error("PostgreSQL数据库备份失败: pg_dump 版本与服务器版本不匹配，请安装与服务器版本匹配的 pg_dump。")
+                    archive.abort()
                     return None
+                logger.info(f"PostgreSQL数据库备份成功: {archive.path}/postgresql_backup.sql")
 
             app_file = config_path / "app.env"
             if app_file.exists():
-                shutil.copy(app_file, backup_path)
+                archive.add_file(app_file, app_file.name)
             cookies_path = config_path / "cookies"
             if cookies_path.exists():
-                shutil.copytree(cookies_path, f'{backup_path}/cookies')
-
-            zip_file = str(backup_path) + '.zip'
-            if os.path.exists(zip_file):
-                zip_file = str(backup_path) + '.zip'
-            shutil.make_archive(str(backup_path), 'zip', str(backup_path))
-            shutil.rmtree(str(backup_path))
-            return zip_file
-        except IOError as e:
+                archive.add_tree(cookies_path, "cookies")
+
+            return str(archive.close())
+        except (IOError, sqlite3.Error) as e:
             logger.error(f"创建备份失败: {e}")
+            if archive:
+                archive.abort()
             return None
 
     @classmethod
@@ -466,15 +937,16 @@ class AutoBackup(_PluginBase):
             return
 
         # 定义备份文件的正则表达式模式
-        pattern = re.compile(r"bk_\d{14}\.zip")
+        pattern = re.compile(r"bk_\d{14}\.(zip|tar\.gz|tar\.xz|tar\.zst|json)$")
 
         # 清理WebDAV服务器上的旧备份
         try:
             remote_files = self._webdav_client.list('/')
             filtered_files = [f for f in remote_files if pattern.match(f)]
             sorted_files = sorted(filtered_files,
-                                  key=lambda x: datetime.strptime(x, "bk_%Y%m%d%H%M%S.zip"))
+                                  key=lambda x: datetime.strptime(x[3:17], "%Y%m%d%H%M%S"))
             excess_count = len(sorted_files) - int(max_count)
+            deleted = set()
 
             if excess_count > 0:
                 logger.info(
@@ -483,15 +955,178 @@ class AutoBackup(_PluginBase):
                     remote_file_path = f"/{file_info}"
                     try:
                         self._webdav_client.clean(remote_file_path)
+                        deleted.add(file_info)
                         logger.info(f"WebDAV上的备份文件 {remote_file_path} 已删除")
                     except Exception as e:
                         logger.error(f"删除WebDAV文件 {remote_file_path} 失败: {str(e)}")
             else:
                 logger.info(
                     f"WebDAV上备份文件数量为 {len(sorted_files)}，符合最大保留数 {max_count}，不需删除文件")
+            # 删除失败的清单仍需保留其引用的块
+            manifests = [f for f in sorted_files if f.endswith(".json") and f not in deleted]
+            if self._incremental or manifests:
+                self.__clean_webdav_chunks(manifests)
         except Exception as e:
             logger.error(f"获取WebDAV文件列表失败: {str(e)}")
 
+    @staticmethod
+    def __clean_local_chunks(bk_path: Path):
+        """
+        删除本地没有被任何清单引用的增量备份块
+        """
+        chunk_path = bk_path / "chunks"
+        if not chunk_path.exists():
+            return
+        try:
+            referenced = set()
+            for manifest_file in bk_path.glob("bk_*.json"):
+                referenced |= ChunkStore.manifest_digests(ChunkStore.read_manifest(manifest_file.read_bytes()))
+            removed = ChunkStore(chunk_path).gc(referenced)
+            if removed:
+                logger.info(f"已删除 {removed} 个不再被引用的本地备份块")
+        except Exception as e:
+            logger.error(f"清理本地备份块失败: {str(e)}")
+
+    def __upload_chunks_to_webdav(self, bk_path: Path):
+        """
+        上传增量备份到WebDAV：先并行上传服务器上缺少的块，块全部上传成功后再上传清单，
+        上传中断时已上传的块有记录，下次备份时只上传剩余部分
+        """
+        logger.info("开始上传增量备份到WebDAV服务器")
+
+        # 检查WebDAV客户端
+        if not self._webdav_client:
+            if not self.__init_webdav_client():
+                return False, "WebDAV客户端初始化失败"
+
+        # 检查连接
+        if not self.__connect_to_webdav():
+            return False, "连接到WebDAV服务器失败"
+
+        store = ChunkStore(bk_path / "chunks")
+        try:
+            uploaded = store.uploaded()
+            if not self._webdav_client.check(self._webdav_chunk_dir):
+                # 服务器上没有块目录，此前的上传记录失效
+                self._webdav_client.mkdir(self._webdav_chunk_dir)
+                uploaded = set()
+                store.reset_uploaded(uploaded)
+
+            # 尚未上传的清单，包括此前上传失败的
+            pending = {}
+            for manifest_file in sorted(bk_path.glob("bk_*.json")):
+                if manifest_file.name not in uploaded:
+                    pending[manifest_file] = ChunkStore.manifest_digests(
+                        ChunkStore.read_manifest(manifest_file.read_bytes()))
+            if not pending:
+                return True, "WebDAV增量备份无需上传"
+            missing = sorted(set().union(*pending.values()) - uploaded)
+            logger.info(f"待上传清单 {len(pending)} 个，服务器缺少块 {len(missing)} 个")
+        except Exception as e:
+            error_msg = f"准备上传增量备份失败: {str(e)}"
+            logger.error(error_msg)
+            return False, error_msg
+
+        def upload_chunk(digest: str) -> int:
+            local_path = store.chunk_path(digest)
+            if not local_path.exists():
+                logger.error(f"本地缺少备份块 {digest}")
+                return -1
+            for retry in range(3):
+                try:
+                    self._webdav_client.upload_sync(remote_path=f"{self._webdav_chunk_dir}/{digest}",
+                                                    local_path=str(local_path))
+                    store.mark_uploaded(digest)
+                    return local_path.stat().st_size
+                except Exception as err:
+                    logger.warning(f"上传备份块 {digest} 失败（第 {retry + 1} 次）: {str(err)}")
+                    if retry < 2:
+                        time.sleep(2 ** retry)
+            return -1
+
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=self._webdav_upload_workers,
+                                thread_name_prefix="autobackup-upload") as executor:
+            results = dict(zip(missing, executor.map(upload_chunk, missing)))
+        succeeded = {digest for digest, size in results.items() if size >= 0}
+        done = uploaded | succeeded
+        failed = len(missing) - len(succeeded)
+        sent_bytes = sum(size for size in results.values() if size > 0)
+
+        # 块全部就绪的清单才上传，保证服务器上的每个清单都可还原
+        manifest_failed = 0
+        for manifest_file, digests in pending.items():
+            if not digests <= done:
+                manifest_failed += 1
+                continue
+            try:
+                self._webdav_client.upload_sync(remote_path=manifest_file.name, local_path=str(manifest_file))
+                store.mark_uploaded(manifest_file.name)
+            except Exception as e:
+                logger.error(f"上传备份清单 {manifest_file.name} 失败: {str(e)}")
+                manifest_failed += 1
+
+        elapsed = max(time.time() - start, 0.001)
+        msg = (f"上传块 {len(succeeded)} 个 {sent_bytes / 1024 / 1024:.1f}MB，"
+               f"耗时 {elapsed:.1f} 秒，速度 {sent_bytes / 1024 / 1024 / elapsed:.1f}MB/s")
+        if failed or manifest_failed:
+            msg = f"WebDAV增量备份未完成，{failed} 个块、{manifest_failed} 个清单上传失败，下次备份时继续上传，{msg}"
+            logger.error(msg)
+            return False, msg
+        msg = f"WebDAV增量备份上传成功，{msg}"
+        logger.info(msg)
+        return True, msg
+
+    def __fetch_webdav_chunk(self, digest: str):
+        """
+        从WebDAV下载备份块到本地块存储
+        """
+        store = ChunkStore(self.__get_backup_path() / "chunks")
+        tmp_path = store.root / f".{digest}.tmp"
+        self._webdav_client.download_sync(remote_path=f"{self._webdav_chunk_dir}/{digest}", local_path=str(tmp_path))
+        os.replace(tmp_path, store.chunk_path(digest))
+
+    def __clean_webdav_chunks(self, manifests: List[str]):
+        """
+        删除WebDAV上没有被任何清单引用的块
+        :param manifests: 服务器上保留的清单
+        """
+        bk_path = self.__get_backup_path()
+        store = ChunkStore(bk_path / "chunks")
+        uploaded = store.uploaded()
+        referenced = set()
+        try:
+            for name in manifests:
+                local_file = bk_path / name
+                if local_file.exists():
+                    data = local_file.read_bytes()
+                else:
+                    buffer = io.BytesIO()
+                    self._webdav_client.download_from(buff=buffer, remote_path=name)
+                    data = buffer.getvalue()
+                referenced |= ChunkStore.manifest_digests(ChunkStore.read_manifest(data))
+            # 本地尚未上传的清单可能引用已上传的块
+            for manifest_file in bk_path.glob("bk_*.json"):
+                if manifest_file.name not in uploaded:
+                    referenced |= ChunkStore.manifest_digests(ChunkStore.read_manifest(manifest_file.read_bytes()))
+            remote_chunks = [name.strip("/") for name in self._webdav_client.list(self._webdav_chunk_dir)]
+        except Exception as e:
+            # 引用关系不完整时不能删除任何块
+            logger.error(f"读取WebDAV备份清单失败，跳过清理备份块: {str(e)}")
+            return
+        removed = set()
+        for digest in remote_chunks:
+            if not re.match(r"^[0-9a-f]{64}$", digest) or digest in referenced:
+                continue
+            try:
+                self._webdav_client.clean(f"{self._webdav_chunk_dir}/{digest}")
+                removed.add(digest)
+            except Exception as e:
+                logger.error(f"删除WebDAV备份块 {digest} 失败: {str(e)}")
+        if removed:
+            store.reset_uploaded(uploaded - removed)
+            logger.info(f"已删除WebDAV上 {len(removed)} 个不再被引用的备份块")
+
     def get_state(self) -> bool:
         return self._enabled
 
@@ -506,6 +1141,12 @@ class AutoBackup(_PluginBase):
             "methods": ["GET"],
             "summary": "MoviePilot备份",
             "description": "MoviePilot备份",
+        }, {
+            "path": "/restore",
+            "endpoint": self.api_restore,
+            "methods": ["GET"],
+            "summary": "还原增量备份",
+            "description": "按备份名称（bk_YYYYMMDDHHMMSS）还原增量备份到备份路径下的restore目录",
         }]
 
     def get_service(self) -> List[Dict[str, Any]]:
@@ -652,6 +1293,68 @@ class AutoBackup(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSelect',
+                                        'props': {
+                                            'model': 'compress_format',
+                                            'label': '归档格式',
+                                            'items': [
+                                                {'title': 'zip', 'value': 'zip'},
+                                                {'title': 'tar.gz', 'value': 'tar.gz'},
+                                                {'title': 'tar.xz', 'value': 'tar.xz'},
+                                                {'title': 'tar.zst（需zstandard）', 'value': 'tar.zst'}
+                                            ]
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'compress_level',
+                                            'label': '压缩级别',
+                                            'placeholder': '留空使用默认，zip/gz 0-9，xz 0-9，zst 1-22'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VSwitch',
+                                        'props': {
+                                            'model': 'incremental',
+                                            'label': '增量备份',
+                                            'hint': '文件切块保存，只保存和上传变化的部分，通过API按备份名称还原；PostgreSQL导出文本在首个变化处之后无法复用',
+                                            'persistent-hint': True
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     # WebDAV配置部分
                     {
                         'component': 'VRow',
@@ -942,6 +1645,9 @@ class AutoBackup(_PluginBase):
             "request_method": "POST",
             "webhook_url": "",
             "back_path": str(self.get_data_path()),
+            "compress_format": "zip",
+            "compress_level": "",
+            "incremental": False,
             "webdav_enabled": False,
             "webdav_notify": False
         }
@@ -1,4 +1,9 @@
+import random
 import re
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Any, List, Dict, Tuple, Optional
 
@@ -25,7 +30,7 @@ class Cd2Assistant(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/clouddrive.png"
     # 插件版本
-    plugin_version = "2.0.5"
+    plugin_version = "2.0.8"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -51,6 +56,26 @@ class Cd2Assistant(_PluginBase):
     _cd2_clients = {}
     _clients = {}
     _cd2_url = {}
+    # 状态采样间隔（秒）
+    _sample_interval: int = 10
+    # 每个CloudDrive2保留的采样数
+    _sample_size: int = 60
+    # 云盘空间缓存有效期（秒）
+    _space_ttl: int = 1800
+    # 最近采样 {cd2名称: deque[(采样时间, 状态信息)]}
+    _samples: Dict[str, deque] = {}
+    # 云盘空间缓存 {cd2名称: (缓存时间, 空间信息)}
+    _space_cache: Dict[str, Tuple[float, str]] = {}
+    _sample_lock = threading.Lock()
+    # 需要读取的protobuf字段
+    _running_info_fields = ["cpuUsage", "memUsageKB", "uptime", "fhTableCount", "dirCacheCount", "tempFileCount"]
+    _task_count_fields = ["uploadCount", "downloadCount"]
+    _space_fields = ["totalSpace", "usedSpace", "freeSpace"]
+    # 云盘cookie健康状态 {cd2名称: {云盘: {status, message, last_check, next_check, failures}}}
+    _cookie_health: Dict[str, Dict[str, dict]] = {}
+    # 检查失败后的退避时间（秒）
+    _probe_backoff: int = 300
+    _probe_backoff_max: int = 6 * 3600
 
     _scheduler: Optional[BackgroundScheduler] = None
 
@@ -58,6 +83,9 @@ class Cd2Assistant(_PluginBase):
         self._cd2_clients = {}
         self._clients = {}
         self._cd2_url = {}
+        self._samples = {}
+        self._space_cache = {}
+        self._cookie_health = self.get_data("cookie_health") or {}
         if config:
             self._enabled = config.get("enabled")
             self._notify = config.get("notify")
@@ -69,6 +97,7 @@ class Cd2Assistant(_PluginBase):
             self._cd2_confs = config.get("cd2_confs")
             self._black_dir = config.get("black_dir") or ""
             self._cloud_path = config.get("cloud_path") or ""
+            self._sample_interval = int(config.get("sample_interval") or 10)
 
             # 兼容旧版本配置
             self.__sync_old_config()
@@ -100,6 +129,14 @@ class Cd2Assistant(_PluginBase):
             # 周期运行
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
 
+            if self._enabled and self._clients:
+                # 后台采样状态，仪表盘、homepage及/cd2_info读取最近一次采样
+                self._scheduler.add_job(func=self.sample,
+                                        trigger='interval',
+                                        seconds=self._sample_interval,
+                                        next_run_time=datetime.now(tz=pytz.timezone(settings.TZ)),
+                                        name="CloudDrive2状态采样")
+
             if self._cron:
                 try:
                     self._scheduler.add_job(func=self.check,
@@ -164,6 +201,7 @@ class Cd2Assistant(_PluginBase):
             "cd2_confs": self._cd2_confs,
             "black_dir": self._black_dir,
             "cloud_path": self._cloud_path,
+            "sample_interval": self._sample_interval,
         })
 
     def check(self):
@@ -177,7 +215,7 @@ class Cd2Assistant(_PluginBase):
 
     def __check_cookie(self, cd2_name, cd2_client):
         """
-        检查cookie是否过期
+        检查cookie是否过期，每个云盘只请求一次空间信息，不列举云盘目录
         """
         logger.info(f"开始检查 {cd2_name} cookie")
         if not cd2_client:
@@ -188,24 +226,144 @@ class Cd2Assistant(_PluginBase):
             logger.error("CloudDrive2连接失败，请检查配置")
             return
 
-        for f in fs.listdir():
-            error_msg = None
-            if f and f not in self._black_dir.split(","):
-                try:
-                    cloud_file = fs.listdir(f)
-                    if not cloud_file or len(cloud_file) == 0:
-                        logger.warning(f"云盘 {f} 为空")
-                        error_msg = f"云盘 {f} cookie过期"
-                except Exception as err:
-                    logger.error(f"云盘 {f} cookie过期：{err}")
-                    if "429" in str(err):
-                        error_msg = f"云盘 {f} 访问频率过高，请稍后再试"
-                    else:
-                        error_msg = f"云盘 {f} cookie过期"
+        clouds = [f for f in fs.listdir() if f and f not in self._black_dir.split(",")]
+        if not clouds:
+            return
+        # 新的检查结果在本地构建，完成后整体替换，避免页面读取时字典被修改
+        previous = self._cookie_health.get(cd2_name) or {}
+        health = {}
+        now = time.time()
+        with ThreadPoolExecutor(max_workers=min(len(clouds), 4), thread_name_prefix="cd2-probe") as executor:
+            futures = {}
+            for f in clouds:
+                cloud_health = previous.get(f)
+                if cloud_health and cloud_health.get("next_check", 0) > now:
+                    health[f] = cloud_health
+                    logger.info(f"云盘 {f} 上次检查{cloud_health.get('status')}，"
+                                f"退避至 {datetime.fromtimestamp(cloud_health.get('next_check')).strftime('%H:%M:%S')} 再检查")
+                    continue
+                futures[f] = executor.submit(self.__probe_cloud, cd2_client, f)
+
+            for f, future in futures.items():
+                status, error_msg = future.result()
+                failures = 0 if status == "正常" else (previous.get(f) or {}).get("failures", 0) + 1
+                next_check = 0
+                if failures:
+                    # 指数退避加随机抖动，避免同时重试
+                    next_check = now + min(self._probe_backoff * 2 ** (failures - 1),
+                                           self._probe_backoff_max) * random.uniform(0.8, 1.2)
+                health[f] = {
+                    "status": status,
+                    "message": error_msg or "",
+                    "last_check": now,
+                    "next_check": next_check,
+                    "failures": failures,
+                }
+                # 发送通知
+                if self._notify and error_msg:
+                    self.__send_notify(error_msg)
+
+        # 只保留仍存在的云盘
+        self._cookie_health = {**self._cookie_health, cd2_name: health}
+        self.save_data("cookie_health", self._cookie_health)
 
-            # 发送通知
-            if self._notify and error_msg:
-                self.__send_notify(error_msg)
+    def __probe_cloud(self, cd2_client, f):
+        """
+        探测云盘cookie是否有效：请求空间信息（仅元数据），
+        不返回空间信息的云盘只读取子文件列表的第一页
+        :return: (状态, 错误信息)
+        """
+        # 错开请求时间
+        time.sleep(random.uniform(0, 1))
+        try:
+            space_info = self.__message_fields(cd2_client.GetSpaceInfo(CloudDrive_pb2.FileRequest(path=f)),
+                                               self._space_fields)
+            if space_info.get("totalSpace"):
+                return "正常", None
+            first_page = next(iter(cd2_client.GetSubFiles(CloudDrive_pb2.ListSubFileRequest(path=f))), None)
+            if not first_page or not first_page.subFiles:
+                logger.warning(f"云盘 {f} 为空")
+                return "cookie过期", f"云盘 {f} cookie过期"
+            return "正常", None
+        except Exception as err:
+            logger.error(f"云盘 {f} 检查失败：{err}")
+            if "429" in str(err):
+                return "访问频率过高", f"云盘 {f} 访问频率过高，请稍后再试"
+            return "cookie过期", f"云盘 {f} cookie过期"
+
+    def __cookie_health_elements(self, cd2_name: str) -> Optional[dict]:
+        """
+        云盘cookie健康状态表格，读取上次检查结果，不重新检查
+        """
+        health = self._cookie_health.get(cd2_name)
+        if not health:
+            return None
+        return {
+            'component': 'VRow',
+            'content': [
+                {
+                    'component': 'VCol',
+                    'props': {
+                        'cols': 12,
+                    },
+                    'content': [
+                        {
+                            'component': 'VTable',
+                            'props': {
+                                'hover': True,
+                                'density': 'compact'
+                            },
+                            'content': [
+                                {
+                                    'component': 'thead',
+                                    'content': [
+                                        {
+                                            'component': 'th',
+                                            'props': {
+                                                'class': 'text-start ps-4'
+                                            },
+                                            'text': text
+                                        } for text in [f'{cd2_name} 云盘', '状态', '上次检查', '下次检查']
+                                    ]
+                                },
+                                {
+                                    'component': 'tbody',
+                                    'content': [
+                                        {
+                                            'component': 'tr',
+                                            'content': [
+                                                {
+                                                    'component': 'td',
+                                                    'text': cloud
+                                                },
+                                                {
+                                                    'component': 'td',
+                                                    'props': {
+                                                        'class': 'text-success' if item.get(
+                                                            'status') == '正常' else 'text-error'
+                                                    },
+                                                    'text': item.get('status')
+                                                },
+                                                {
+                                                    'component': 'td',
+                                                    'text': datetime.fromtimestamp(item.get('last_check')).strftime(
+                                                        '%Y-%m-%d %H:%M:%S') if item.get('last_check') else ''
+                                                },
+                                                {
+                                                    'component': 'td',
+                                                    'text': datetime.fromtimestamp(item.get('next_check')).strftime(
+                                                        '%Y-%m-%d %H:%M:%S') if item.get('next_check') else '下个检测周期'
+                                                }
+                                            ]
+                                        } for cloud, item in health.items()
+                                    ]
+                                }
+                            ]
+                        }
+                    ]
+                }
+            ]
+        }
 
     def __check_task(self, cd2_name, cd2_client):
         """
@@ -256,10 +414,13 @@ class Cd2Assistant(_PluginBase):
                 logger.info(f"{cd2_name} CloudDrive2重启成功")
                 _client.RestartService()
 
-    def __get_cloud_space(self, cd2_client):
+    def __get_cloud_space(self, cd2_name, cd2_client):
         """
-        获取云盘空间
+        获取云盘空间，云盘空间变化慢，按较长有效期缓存
         """
+        cached = self._space_cache.get(cd2_name)
+        if cached and time.time() - cached[0] < self._space_ttl:
+            return cached[1]
         fs = cd2_client.fs
         if not fs:
             logger.error("CloudDrive2连接失败，请检查配置")
@@ -270,7 +431,7 @@ class Cd2Assistant(_PluginBase):
             try:
                 if f and f not in self._black_dir.split(","):
                     space_info = cd2_client.GetSpaceInfo(CloudDrive_pb2.FileRequest(path=f))
-                    space_info = self.__str_to_dict(space_info)
+                    space_info = self.__message_fields(space_info, self._space_fields)
                     total = self.__convert_bytes(space_info.get("totalSpace"))
                     used = self.__convert_bytes(space_info.get("usedSpace"))
                     free = self.__convert_bytes(space_info.get("freeSpace"))
@@ -278,6 +439,7 @@ class Cd2Assistant(_PluginBase):
             except Exception:
                 logger.error(f"获取云盘 {f} 空间信息失败")
 
+        self._space_cache[cd2_name] = (time.time(), _space_info)
         return _space_info
 
     @eventmanager.register(EventType.PluginAction)
@@ -351,34 +513,96 @@ class Cd2Assistant(_PluginBase):
                 if args and str(args).lower() != str(cd2_name):
                     continue
                 found = True
-                cd2_client = self._cd2_clients[cd2_name]
-                self.__get_cd2_info(event=event, client=client, cd2_client=cd2_client)
+                self.__get_cd2_info(cd2_name=cd2_name, event=event)
 
             if args and not found:
                 self.post_message(channel=event.event_data.get("channel"),
                                   title=f"未找到 {args} 配置！", userid=event.event_data.get("user"))
                 return
 
-    def __get_cd2_info(self, event: Event = None, client: Client = None, cd2_client: CloudDriveClient = None):
+    def sample(self):
+        """
+        并发采集所有CloudDrive2状态
+        """
+        if not self._clients:
+            return
+        with ThreadPoolExecutor(max_workers=len(self._clients), thread_name_prefix="cd2-sample") as executor:
+            futures = {cd2_name: executor.submit(self.__collect_cd2_info, cd2_name) for cd2_name in self._clients}
+            for cd2_name, future in futures.items():
+                try:
+                    self.__add_sample(cd2_name, future.result())
+                except Exception as e:
+                    logger.error(f"采集 {cd2_name} 状态失败：{str(e)}")
+
+    def __add_sample(self, cd2_name: str, cd2_info: dict):
+        """
+        记录一次采样
+        """
+        with self._sample_lock:
+            samples = self._samples.get(cd2_name)
+            if samples is None:
+                samples = self._samples[cd2_name] = deque(maxlen=self._sample_size)
+            samples.append((time.time(), cd2_info))
+
+    def __latest_info(self, cd2_name: str) -> dict:
+        """
+        获取最近一次采样，采样服务未运行或采样已过期时实时采集
+        """
+        with self._sample_lock:
+            samples = self._samples.get(cd2_name)
+            latest = samples[-1] if samples else None
+        if latest and time.time() - latest[0] < max(self._sample_interval * 3, 30):
+            return latest[1]
+        try:
+            cd2_info = self.__collect_cd2_info(cd2_name)
+        except Exception as e:
+            logger.error(f"采集 {cd2_name} 状态失败：{str(e)}")
+            return latest[1] if latest else {}
+        self.__add_sample(cd2_name, cd2_info)
+        return cd2_info
+
+    def __get_cd2_info(self, cd2_name: str, event: Event = None):
         """
         获取CloudDrive2信息
         """
+        system_info_dict = self.__latest_info(cd2_name)
+
+        if event:
+            self.post_message(channel=event.event_data.get("channel"),
+                              title="CloudDrive2系统信息",
+                              userid=event.event_data.get("user"),
+                              text=f"CPU占用：{system_info_dict.get('cpuUsage')}\n"
+                                   f"内存占用：{system_info_dict.get('memUsageKB')}\n"
+                                   f"运行时间：{system_info_dict.get('uptime')}\n"
+                                   f"打开文件数量：{system_info_dict.get('fhTableCount')}\n"
+                                   f"目录缓存数量：{system_info_dict.get('dirCacheCount')}\n"
+                                   f"临时文件数量：{system_info_dict.get('tempFileCount')}\n"
+                                   f"上传任务数量：{system_info_dict.get('upload_count')}\n"
+                                   f"下载任务数量：{system_info_dict.get('download_count')}\n"
+                                   f"下载速度：{system_info_dict.get('download_speed')}\n"
+                                   f"上传速度：{system_info_dict.get('upload_speed')}\n"
+                                   f"存储空间：{system_info_dict.get('cloud_space')}\n")
+
+        return system_info_dict
+
+    def __collect_cd2_info(self, cd2_name: str) -> dict:
+        """
+        实时采集CloudDrive2信息
+        """
+        client: Client = self._clients.get(cd2_name)
+        cd2_client: CloudDriveClient = self._cd2_clients.get(cd2_name)
         # 运行信息
-        system_info = client.GetRunningInfo()
-        system_info = self.__str_to_dict(system_info) if system_info else {}
+        system_info = self.__message_fields(client.GetRunningInfo(), self._running_info_fields)
 
         # 任务数量
-        task_count = client.GetAllTasksCount()
-        task_count = self.__str_to_dict(task_count) if task_count else {}
+        task_count = self.__message_fields(client.GetAllTasksCount(), self._task_count_fields)
 
-        # 速度
-        downloadFileList = client.GetDownloadFileList()
-        downloadFileList = self.__str_to_dict(downloadFileList) if downloadFileList else {}
-        uploadFileList = client.GetUploadFileList(CloudDrive_pb2.GetUploadFileListRequest(getAll=True))
-        uploadFileList = self.__str_to_dict(uploadFileList) if uploadFileList else {}
+        # 速度，下载列表无分页参数，直接读取全局速度字段，不展开文件列表
+        downloadFileList = self.__message_fields(client.GetDownloadFileList(), ["globalBytesPerSecond"])
+        uploadFileList = self.__get_upload_summary(client)
 
         # 云盘空间
-        cloud_space = self.__get_cloud_space(cd2_client)
+        cloud_space = self.__get_cloud_space(cd2_name, cd2_client)
 
         system_info_dict = {
             "cpuUsage": f"{system_info.get('cpuUsage'):.2f}%" if system_info.get(
@@ -402,24 +626,7 @@ class Cd2Assistant(_PluginBase):
             "cloud_space": cloud_space
         }
 
-        logger.info(f"获取CloudDrive2系统信息：\n{system_info_dict}")
-
-        if event:
-            self.post_message(channel=event.event_data.get("channel"),
-                              title="CloudDrive2系统信息",
-                              userid=event.event_data.get("user"),
-                              text=f"CPU占用：{system_info_dict.get('cpuUsage')}\n"
-                                   f"内存占用：{system_info_dict.get('memUsageKB')}\n"
-                                   f"运行时间：{system_info_dict.get('uptime')}\n"
-                                   f"打开文件数量：{system_info_dict.get('fhTableCount')}\n"
-                                   f"目录缓存数量：{system_info_dict.get('dirCacheCount')}\n"
-                                   f"临时文件数量：{system_info_dict.get('tempFileCount')}\n"
-                                   f"上传任务数量：{system_info_dict.get('upload_count')}\n"
-                                   f"下载任务数量：{system_info_dict.get('download_count')}\n"
-                                   f"下载速度：{system_info_dict.get('download_speed')}\n"
-                                   f"上传速度：{system_info_dict.get('upload_speed')}\n"
-                                   f"存储空间：{system_info_dict.get('cloud_space')}\n")
-
+        logger.debug(f"获取CloudDrive2系统信息：\n{system_info_dict}")
         return system_info_dict
 
     def homepage(self, apikey: str, name: str = None) -> Any:
@@ -429,16 +636,28 @@ class Cd2Assistant(_PluginBase):
         if apikey != settings.API_TOKEN:
             return schemas.Response(success=False, message="API密钥错误")
 
-        client = None
-        cd2_client = None
         for cd2_name, client in self._clients.items():
             if name and str(cd2_name) != name:
                 continue
-            cd2_client = self._cd2_clients[cd2_name]
-            if client and cd2_client:
-                break
+            if client and self._cd2_clients.get(cd2_name):
+                return self.__get_cd2_info(cd2_name=cd2_name)
 
-        return self.__get_cd2_info(client=client, cd2_client=cd2_client)
+        return {}
+
+    def samples(self, apikey: str, name: str = None) -> Any:
+        """
+        最近采样记录
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+
+        with self._sample_lock:
+            return {
+                cd2_name: [{"time": datetime.fromtimestamp(sample_time).strftime('%Y-%m-%d %H:%M:%S'), **cd2_info}
+                           for sample_time, cd2_info in samples]
+                for cd2_name, samples in self._samples.items()
+                if not name or str(cd2_name) == name
+            }
 
     @staticmethod
     def __convert_bytes(size_in_bytes):
@@ -453,14 +672,21 @@ class Cd2Assistant(_PluginBase):
         return f"{size_in_bytes:.2f} {units[unit_index]}"
 
     @staticmethod
-    def __str_to_dict(str_data):
+    def __message_fields(message, fields: List[str]) -> dict:
+        """
+        直接读取protobuf消息字段，避免将整个消息（可能包含上千条文件记录）转为文本再解析
+        """
+        if not message:
+            return {}
+        return {field: getattr(message, field, 0) for field in fields}
+
+    def __get_upload_summary(self, client: Client) -> dict:
         """
-        字符串转字典
+        上传任务概况（全局速度、任务总数），只请求一条记录，不拉取全部上传列表
         """
-        pattern = re.compile(r'(\w+): ([\d.]+)')
-        matches = pattern.findall(str(str_data))
-        # 将匹配到的结果转换为字典
-        return {key: float(value) for key, value in matches}
+        upload_list = client.GetUploadFileList(
+            CloudDrive_pb2.GetUploadFileListRequest(getAll=False, itemsPerPage=1, pageNumber=0))
+        return self.__message_fields(upload_list, ["globalBytesPerSecond", "totalCount"])
 
     def __send_notify(self, msg):
         """
@@ -532,6 +758,12 @@ class Cd2Assistant(_PluginBase):
             "methods": ["GET"],
             "summary": "HomePage",
             "description": "HomePage自定义api",
+        }, {
+            "path": "/samples",
+            "endpoint": self.samples,
+            "methods": ["GET"],
+            "summary": "最近采样",
+            "description": "CloudDrive2最近状态采样记录",
         }]
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
@@ -733,6 +965,23 @@ class Cd2Assistant(_PluginBase):
                                     }
                                 ]
                             },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'sample_interval',
+                                            'label': '状态采样间隔（秒）',
+                                            'placeholder': '10'
+                                        }
+                                    }
+                                ]
+                            },
                         ]
                     },
                     {
@@ -845,14 +1094,14 @@ class Cd2Assistant(_PluginBase):
             "msgtype": "Manual",
             "black_dir": "",
             "cloud_path": "",
+            "sample_interval": 10,
         }
 
     def get_page(self) -> List[dict]:
         page_form = []
         for cd2_name, client in self._clients.items():
-            cd2_client = self._cd2_clients[cd2_name]
             cd2_url = self._cd2_url[cd2_name]
-            cd2_info = self.__get_cd2_info(client=client, cd2_client=cd2_client)
+            cd2_info = self.__get_cd2_info(cd2_name=cd2_name)
             page_form.append({
                 'component': 'VRow',
                 'content': [
@@ -1443,6 +1692,9 @@ class Cd2Assistant(_PluginBase):
                     }
                 ]
             }, )
+            health_elements = self.__cookie_health_elements(cd2_name)
+            if health_elements:
+                page_form.append(health_elements)
         return page_form
 
     def get_dashboard(self) -> Optional[Tuple[Dict[str, Any], Dict[str, Any], List[dict]]]:
@@ -1481,9 +1733,8 @@ class Cd2Assistant(_PluginBase):
         else:
             elements = []
             for cd2_name, client in self._clients.items():
-                cd2_client = self._cd2_clients[cd2_name]
                 cd2_url = self._cd2_url[cd2_name]
-                cd2_info = self.__get_cd2_info(client=client, cd2_client=cd2_client)
+                cd2_info = self.__get_cd2_info(cd2_name=cd2_name)
 
                 elements.append(
                     {
@@ -2119,6 +2370,9 @@ class Cd2Assistant(_PluginBase):
 
                         ]
                     })
+                health_elements = self.__cookie_health_elements(cd2_name)
+                if health_elements:
+                    elements.append(health_elements)
 
         return cols, attrs, elements
 
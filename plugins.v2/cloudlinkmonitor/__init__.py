@@ -1,17 +1,22 @@
+import copy
 import datetime
+import os
+import queue
 import re
 import shutil
 import threading
+import time
 import traceback
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Callable
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
 
 from app import schemas
 from app.chain.media import MediaChain
@@ -36,6 +41,697 @@ from app.utils.system import SystemUtils
 lock = threading.Lock()
 
 
+class PathClassifier:
+    """
+    文件路径分类器，插件初始化时预编译扩展名集合及过滤规则，处理文件时快速分类
+    """
+    # 分类结果
+    IGNORED = "ignored"
+    EXCLUDED = "excluded"
+    MEDIA = "media"
+    SUBTITLE = "subtitle"
+    OTHER = "other"
+    UNKNOWN = "unknown"
+
+    # 回收站及隐藏的文件
+    _ignore_re = re.compile(r"/@Recycle|/#recycle|/\.|/@eaDir")
+    _subtitle_exts = frozenset([".srt", ".ass", ".ssa", ".sub"])
+
+    def __init__(self, media_exts: Any = None, other_exts: Any = None, exclude_keywords: Any = None):
+        """
+        :param media_exts: 媒体文件扩展名，逗号分隔字符串或列表
+        :param other_exts: 非媒体文件扩展名，逗号分隔字符串或列表
+        :param exclude_keywords: 过滤关键字（区分大小写），换行分隔字符串或列表
+        """
+        self.media_exts = self.__parse_exts(media_exts)
+        self.other_exts = self.__parse_exts(other_exts)
+        # SystemUtils.exits_files 等需要列表参数
+        self.media_ext_list = list(self.media_exts)
+        self._keywords: List[Tuple[str, Any]] = []
+        self._keywords_re = None
+        self._exclude_words: Tuple[str, ...] = ()
+        self._exclude_words_list: List[Tuple[str, Any]] = []
+        self._exclude_words_re = None
+        if isinstance(exclude_keywords, str):
+            exclude_keywords = exclude_keywords.split("\n")
+        self._keywords, self._keywords_re = self.__compile(exclude_keywords or [], flags=0)
+
+    @staticmethod
+    def __parse_exts(exts: Any) -> frozenset:
+        """
+        解析扩展名配置
+        """
+        if not exts:
+            return frozenset()
+        if isinstance(exts, str):
+            exts = exts.split(",")
+        return frozenset(ext.strip().lower() for ext in exts if ext and ext.strip())
+
+    @staticmethod
+    def __compile(keywords: Any, flags: int) -> Tuple[List[Tuple[str, Any]], Any]:
+        """
+        逐个编译关键字（跳过无效正则），并合并为一个正则用于快速判断
+        """
+        compiled = []
+        for keyword in keywords:
+            if not keyword:
+                continue
+            try:
+                compiled.append((keyword, re.compile(keyword, flags)))
+            except re.error as e:
+                logger.warn(f"过滤关键字 {keyword} 不是有效的正则表达式：{str(e)}")
+        if not compiled:
+            return compiled, None
+        try:
+            combined = re.compile("|".join(f"(?:{keyword})" for keyword, _ in compiled), flags)
+        except re.error:
+            # 关键字间存在同名分组等冲突时，逐个匹配
+            combined = None
+        return compiled, combined
+
+    def set_exclude_words(self, words: Any):
+        """
+        设置整理屏蔽词（忽略大小写），内容未变化时不重复编译
+        """
+        words = tuple(words or ())
+        if words == self._exclude_words:
+            return
+        self._exclude_words_list, self._exclude_words_re = self.__compile(words, flags=re.IGNORECASE)
+        self._exclude_words = words
+
+    @staticmethod
+    def suffix(path: Any) -> str:
+        """
+        小写扩展名
+        """
+        return os.path.splitext(str(path))[1].lower()
+
+    def is_ignored(self, path: Any) -> bool:
+        """
+        是否回收站或隐藏的文件
+        """
+        return self._ignore_re.search(str(path)) is not None
+
+    def is_media(self, path: Any) -> bool:
+        """
+        是否媒体文件
+        """
+        return self.suffix(path) in self.media_exts
+
+    def is_other(self, path: Any) -> bool:
+        """
+        是否配置的非媒体文件
+        """
+        return self.suffix(path) in self.other_exts
+
+    def is_subtitle(self, path: Any) -> bool:
+        """
+        是否字幕文件
+        """
+        return self.suffix(path) in self._subtitle_exts
+
+    @staticmethod
+    def __match(path: str, compiled: List[Tuple[str, Any]], combined: Any) -> Optional[str]:
+        """
+        先用合并正则快速判断，命中后再找出具体关键字
+        """
+        if not compiled:
+            return None
+        if combined is not None and not combined.search(path):
+            return None
+        for keyword, pattern in compiled:
+            if pattern.search(path):
+                return keyword
+        return None
+
+    def exclude_keyword(self, path: Any) -> Optional[str]:
+        """
+        命中的过滤关键字
+        """
+        return self.__match(str(path), self._keywords, self._keywords_re)
+
+    def exclude_word(self, path: Any) -> Optional[str]:
+        """
+        命中的整理屏蔽词
+        """
+        return self.__match(str(path), self._exclude_words_list, self._exclude_words_re)
+
+    def classify(self, path: Any) -> str:
+        """
+        路径分类：回收站/隐藏、命中过滤、媒体、字幕、其他、未知
+        """
+        path = str(path)
+        if self._ignore_re.search(path):
+            return self.IGNORED
+        if self.exclude_keyword(path) or self.exclude_word(path):
+            return self.EXCLUDED
+        suffix = self.suffix(path)
+        if suffix in self.media_exts:
+            return self.MEDIA
+        if suffix in self._subtitle_exts:
+            return self.SUBTITLE
+        if suffix in self.other_exts:
+            return self.OTHER
+        return self.UNKNOWN
+
+
+class RecognizeCache:
+    """
+    识别结果缓存（LRU + 过期时间），同一季多集文件复用媒体信息及集信息
+    """
+
+    def __init__(self, ttl: float = 600, max_size: int = 256):
+        self._ttl = ttl
+        self._max_size = max_size
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: tuple) -> Any:
+        """
+        获取缓存，返回副本避免后续处理修改缓存内容
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and time.monotonic() - entry[0] < self._ttl:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return copy.deepcopy(entry[1])
+            if entry:
+                del self._entries[key]
+            self.misses += 1
+        return None
+
+    def put(self, key: tuple, value: Any):
+        """
+        写入缓存，空结果不缓存
+        """
+        if not value:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic(), copy.deepcopy(value))
+            self._entries.move_to_end(key)
+            while len(self._entries) > self._max_size:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        """
+        清空缓存及统计
+        """
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def __str__(self):
+        return f"命中 {self.hits} 次，未命中 {self.misses} 次，缓存 {len(self._entries)} 条"
+
+
+class PipelineStage:
+    """
+    流水线阶段：有界队列 + 固定数量工作线程，处理结果交给下一阶段
+    """
+
+    def __init__(self, name: str, handler: Callable[[Any], Any], workers: int = 1, maxsize: int = 100,
+                 next_stage: Optional["PipelineStage"] = None, on_done: Optional[Callable[[Any], None]] = None):
+        """
+        :param name: 阶段名称
+        :param handler: 处理函数，返回None表示任务结束，否则交给下一阶段
+        :param workers: 工作线程数
+        :param maxsize: 队列长度，队列满时提交方阻塞等待
+        :param next_stage: 下一阶段
+        :param on_done: 任务结束（含失败、丢弃）时的回调
+        """
+        self.name = name
+        self._handler = handler
+        self._next_stage = next_stage
+        self._on_done = on_done
+        self._queue = queue.Queue(maxsize=maxsize)
+        self._stop_event = threading.Event()
+        self._threads = []
+        for i in range(max(1, workers)):
+            thread = threading.Thread(target=self.__run, name=f"{name}-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def put(self, item: Any) -> bool:
+        """
+        提交任务，队列已满时阻塞等待，阶段停止后放弃
+        """
+        while not self._stop_event.is_set():
+            try:
+                self._queue.put(item, timeout=1)
+                return True
+            except queue.Full:
+                continue
+        self.__done(item)
+        return False
+
+    def __run(self):
+        """
+        工作线程
+        """
+        while not self._stop_event.is_set():
+            try:
+                item = self._queue.get(timeout=1)
+            except queue.Empty:
+                continue
+            try:
+                result = self._handler(item)
+                if result and self._next_stage:
+                    self._next_stage.put(result)
+                else:
+                    self.__done(item)
+            except Exception as e:
+                logger.error(f"{self.name}阶段处理失败：{str(e)} - {traceback.format_exc()}")
+                self.__done(item)
+            finally:
+                self._queue.task_done()
+
+    def __done(self, item: Any):
+        """
+        任务结束回调
+        """
+        if not self._on_done:
+            return
+        try:
+            self._on_done(item)
+        except Exception as e:
+            logger.debug(f"{self.name}阶段任务结束回调失败：{str(e)}")
+
+    @property
+    def size(self) -> int:
+        """
+        队列中等待的任务数
+        """
+        return self._queue.qsize()
+
+    def join(self):
+        """
+        等待队列中的任务处理完成
+        """
+        self._queue.join()
+
+    def stop(self):
+        """
+        停止工作线程，丢弃未处理的任务
+        """
+        self._stop_event.set()
+        for thread in self._threads:
+            thread.join(timeout=5)
+        while True:
+            try:
+                item = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self.__done(item)
+            self._queue.task_done()
+
+
+class EventDebouncer:
+    """
+    目录监控事件防抖队列
+    监控线程只负责登记路径，同一路径在静默窗口内的重复事件合并为一次；
+    窗口结束后检查文件大小，大小仍在变化（下载/复制中）则继续等待，稳定后再分发给处理线程池
+    """
+
+    class _Pending:
+        __slots__ = ("mon_path", "text", "due", "size", "seq")
+
+        def __init__(self, mon_path: str, text: str, due: float):
+            self.mon_path = mon_path
+            self.text = text
+            self.due = due
+            self.size = None
+            self.seq = 0
+
+    def __init__(self, handler: Callable[[str, str], Any], delay: float = 3, workers: int = 2,
+                 max_pending: int = 50000, name: str = "监控事件"):
+        """
+        :param handler: 处理函数，参数为 (event_path, mon_path)
+        :param delay: 静默窗口秒数，同时也是文件大小稳定检查间隔
+        :param workers: 处理线程数
+        :param max_pending: 最大排队路径数，超出后丢弃新事件
+        :param name: 日志名称
+        """
+        self._handler = handler
+        self._delay = max(float(delay), 0.1)
+        self._workers = max(int(workers), 1)
+        self._max_pending = max_pending
+        self._name = name
+        self._pending: Dict[str, EventDebouncer._Pending] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="event-debounce")
+        self._slots = threading.BoundedSemaphore(self._workers * 2)
+        self._running = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.vanished = 0
+        self.dropped = 0
+        self._last_drop_log = 0.0
+        self._thread = threading.Thread(target=self.__loop, name="event-debounce-dispatcher", daemon=True)
+        self._thread.start()
+
+    def put(self, event_path: str, mon_path: str, text: str = ""):
+        """
+        登记一个事件，仅操作内存，不阻塞监控线程
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                return
+            pending = self._pending.get(event_path)
+            if pending:
+                # 重复事件，重新计时
+                pending.due = now + self._delay
+                pending.seq += 1
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                if now - self._last_drop_log > 60:
+                    self._last_drop_log = now
+                    logger.warn(f"{self._name}队列已满，丢弃事件：{event_path}，{self}")
+                return
+            self._pending[event_path] = self._Pending(mon_path=mon_path, text=text, due=now + self._delay)
+            self.queued += 1
+            self._cond.notify()
+
+    def __loop(self):
+        """
+        分发线程：取出静默窗口已结束的路径，检查文件大小是否稳定
+        """
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [(path, pending.seq, pending.size) for path, pending in self._pending.items()
+                       if pending.due <= now]
+                if not due:
+                    wait = min((p.due for p in self._pending.values()), default=now + 60) - now
+                    self._cond.wait(timeout=min(max(wait, 0.05), 60))
+                    continue
+            for path, seq, size in due:
+                if self._stopped:
+                    return
+                try:
+                    current = os.stat(path).st_size
+                except OSError:
+                    current = None
+                ready = False
+                with self._cond:
+                    pending = self._pending.get(path)
+                    if not pending or pending.seq != seq:
+                        # 检查期间又有新事件，等待下一个窗口
+                        continue
+                    if current is None:
+                        self._pending.pop(path, None)
+                        self.vanished += 1
+                        continue
+                    if size is not None and current == size:
+                        self._pending.pop(path, None)
+                        ready = True
+                    else:
+                        # 首次检查或大小仍在变化
+                        pending.size = current
+                        pending.due = time.monotonic() + self._delay
+                if ready:
+                    self.__dispatch(path, pending.mon_path, pending.text)
+
+    def __dispatch(self, event_path: str, mon_path: str, text: str):
+        """
+        提交到处理线程池，线程池繁忙时阻塞分发线程
+        """
+        while not self._slots.acquire(timeout=1):
+            if self._stopped:
+                return
+        if self._stopped:
+            self._slots.release()
+            return
+        with self._cond:
+            self._running += 1
+            self.dispatched += 1
+
+        def _run():
+            try:
+                logger.debug(f"{self._name}：{text} {event_path}")
+                self._handler(event_path, mon_path)
+            except Exception as e:
+                logger.error(f"{self._name}处理 {event_path} 出错：{str(e)}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                self._slots.release()
+
+        try:
+            self._executor.submit(_run)
+        except RuntimeError:
+            with self._cond:
+                self._running -= 1
+            self._slots.release()
+
+    @property
+    def depth(self) -> int:
+        """
+        等待中及处理中的事件数
+        """
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def stop(self):
+        """
+        停止分发，丢弃未处理事件
+        """
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"{self._name}队列已停止，{self}")
+
+    def __str__(self):
+        return (f"排队 {len(self._pending)}，处理中 {self._running}，累计 {self.queued}，"
+                f"合并 {self.coalesced}，分发 {self.dispatched}，已消失 {self.vanished}，丢弃 {self.dropped}")
+
+
+class DirMtimePoller(threading.Thread):
+    """
+    按目录mtime增量轮询的监控器，用于网络共享及FUSE挂载目录
+    目录内新增、删除、重命名条目会改变该目录的mtime，mtime未变化的目录不再列出内容，也不stat其中的文件；
+    部分FUSE挂载不可靠更新目录mtime，每隔 full_every 轮做一次完整列目录校正
+    """
+
+    def __init__(self, path: str, handler: FileSystemEventHandler, interval: float = 10, full_every: int = 30,
+                 desc: str = ""):
+        super().__init__(name=f"mtime-poller:{path}", daemon=True)
+        self._root = path
+        self._desc = desc
+        self._handler = handler
+        self._interval = interval
+        self._full_every = max(int(full_every), 1)
+        self._stopped = threading.Event()
+        # 目录 -> (mtime, 文件名集合, 子目录名集合)
+        self._dirs: Dict[str, Tuple[int, set, set]] = {}
+        self.file_count = 0
+        self.scan_cost = 0.0
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._dirs)
+
+    def snapshot(self):
+        """
+        建立初始快照，不触发事件
+        """
+        start = time.time()
+        self.__poll(full=True, emit=False)
+        self.scan_cost = time.time() - start
+        self.file_count = sum(len(rec[1]) for rec in self._dirs.values())
+
+    def run(self):
+        try:
+            self.snapshot()
+            logger.info(f"{self._root} 使用目录轮询（{self._desc}），间隔 {self._interval} 秒，"
+                        f"监控目录数 {self.watch_count}，文件数 {self.file_count}，"
+                        f"初始扫描耗时 {self.scan_cost:.2f} 秒")
+        except Exception as e:
+            logger.error(f"{self._root} 初始扫描出错：{str(e)}")
+        rounds = 0
+        while not self._stopped.wait(self._interval):
+            rounds += 1
+            try:
+                start = time.time()
+                listed = self.__poll(full=rounds % self._full_every == 0, emit=True)
+                logger.debug(f"{self._root} 轮询完成，目录 {len(self._dirs)}，"
+                             f"重新列出 {listed}，耗时 {time.time() - start:.2f} 秒")
+            except Exception as e:
+                logger.error(f"{self._root} 轮询出错：{str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+
+    def __poll(self, full: bool, emit: bool) -> int:
+        """
+        遍历目录树，仅列出mtime变化的目录
+        :return: 重新列出的目录数
+        """
+        listed = 0
+        stack = [self._root]
+        while stack and not self._stopped.is_set():
+            dir_path = stack.pop()
+            record = self._dirs.get(dir_path)
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            if record and record[0] == mtime and not full:
+                stack.extend(os.path.join(dir_path, name) for name in record[2])
+                continue
+            files, subdirs = set(), set()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.add(entry.name)
+                            else:
+                                files.add(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            listed += 1
+            self._dirs[dir_path] = (mtime, files, subdirs)
+            if record:
+                for name in record[2] - subdirs:
+                    self.__forget(os.path.join(dir_path, name))
+            if emit:
+                for name in files - (record[1] if record else set()):
+                    self._handler.on_created(FileCreatedEvent(os.path.join(dir_path, name)))
+            stack.extend(os.path.join(dir_path, name) for name in subdirs)
+        return listed
+
+    def __forget(self, dir_path: str):
+        """
+        移除已消失目录及其子目录的记录
+        """
+        prefix = dir_path + os.sep
+        for path in [p for p in self._dirs if p == dir_path or p.startswith(prefix)]:
+            self._dirs.pop(path, None)
+
+
+class MonitorObserver:
+    """
+    监控器选择：本地文件系统使用系统原生监控（inotify），网络共享及FUSE挂载使用目录mtime轮询
+    """
+
+    # 需要轮询的文件系统类型，fuse.* 均视为远程挂载
+    REMOTE_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "9p", "afs", "ceph",
+                       "glusterfs", "davfs", "sshfs", "fuse"}
+
+    @staticmethod
+    def fs_type(path: str) -> Optional[str]:
+        """
+        获取路径所在挂载点的文件系统类型
+        """
+        try:
+            real_path = os.path.realpath(path)
+            matched, fs_type = "", None
+            with open("/proc/mounts", "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 3:
+                        continue
+                    mount_point = parts[1].replace("\\040", " ")
+                    if (real_path == mount_point
+                        or real_path.startswith(mount_point.rstrip("/") + "/")) \
+                            and len(mount_point) >= len(matched):
+                        matched, fs_type = mount_point, parts[2]
+            return fs_type
+        except Exception as e:
+            logger.debug(f"获取 {path} 文件系统类型失败：{str(e)}")
+            return None
+
+    @classmethod
+    def is_remote(cls, path: str) -> bool:
+        """
+        是否网络共享或FUSE挂载
+        """
+        fs_type = cls.fs_type(path)
+        if not fs_type:
+            return False
+        return fs_type in cls.REMOTE_FS_TYPES or (fs_type.startswith("fuse.") and fs_type != "fuseblk")
+
+    @staticmethod
+    def __inotify_watch_count(observer) -> Optional[int]:
+        """
+        原生监控的watch数，取不到时返回None
+        """
+        try:
+            count = 0
+            for emitter in observer.emitters:
+                count += len(emitter._inotify._inotify._wd_for_path)
+            return count
+        except Exception:
+            return None
+
+    @classmethod
+    def start(cls, path: str, handler: FileSystemEventHandler, mode: str = "auto", interval: float = 10):
+        """
+        启动目录监控
+        :param path: 监控目录
+        :param handler: 事件处理类
+        :param mode: fast 原生监控 / compatibility 轮询 / auto 按文件系统自动选择
+        :param interval: 轮询间隔（秒）
+        :return: 已启动的监控器，需调用 stop/join 停止
+        """
+        if mode == "compatibility" or (mode == "auto" and cls.is_remote(path)):
+            return cls.__start_polling(path, handler, interval)
+        observer = None
+        try:
+            start = time.time()
+            observer = Observer(timeout=10)
+            observer.schedule(handler, path=path, recursive=True)
+            observer.daemon = True
+            observer.start()
+            watches = cls.__inotify_watch_count(observer)
+            logger.info(f"{path} 使用原生监控（{cls.fs_type(path) or '未知文件系统'}），"
+                        f"监控数 {watches if watches is not None else '未知'}，"
+                        f"启动耗时 {time.time() - start:.2f} 秒")
+            return observer
+        except Exception as e:
+            if observer:
+                try:
+                    observer.stop()
+                except Exception:
+                    pass
+            err_msg = str(e)
+            if "inotify" in err_msg and "reached" in err_msg:
+                logger.warn(f"{path} 原生监控数已达上限：{err_msg}，改用轮询，可在宿主机上（不是docker容器内）执行以下命令后重启："
+                            + """
+                            echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
+                            echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
+                            sudo sysctl -p
+                            """)
+            else:
+                logger.warn(f"{path} 原生监控启动失败：{err_msg}，改用轮询")
+            return cls.__start_polling(path, handler, interval)
+
+    @classmethod
+    def __start_polling(cls, path: str, handler: FileSystemEventHandler, interval: float):
+        # 初始扫描在轮询线程中进行，不阻塞插件启动
+        poller = DirMtimePoller(path=path, handler=handler, interval=interval,
+                                desc=cls.fs_type(path) or "未知文件系统")
+        poller.start()
+        return poller
+
+
 class FileMonitorHandler(FileSystemEventHandler):
     """
     目录监控响应类
@@ -63,7 +759,7 @@ class CloudLinkMonitor(_PluginBase):
     # 插件图标
     plugin_icon = "Linkease_A.png"
     # 插件版本
-    plugin_version = "2.5.10"
+    plugin_version = "2.6.2"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -103,12 +799,34 @@ class CloudLinkMonitor(_PluginBase):
     _monitor_dirs = ""
     _exclude_keywords = ""
     _interval: int = 10
+    # 流水线各阶段并发数
+    _recognize_workers: int = 2
+    _transfer_workers: int = 2
+    _post_workers: int = 2
+    # 监控事件静默窗口（秒）
+    _event_delay: int = 3
+    # 监控事件防抖队列
+    _debouncer: Optional[EventDebouncer] = None
     # 存储源目录与目的目录关系
     _dirconf: Dict[str, Optional[Path]] = {}
     # 存储源目录转移方式
     _transferconf: Dict[str, Optional[str]] = {}
     _overwrite_mode: Dict[str, Optional[str]] = {}
     _medias = {}
+    # 文件路径分类器
+    _classifier: Optional[PathClassifier] = None
+    # 媒体识别结果缓存
+    _media_cache: Optional[RecognizeCache] = None
+    # 集信息缓存
+    _episodes_cache: Optional[RecognizeCache] = None
+    # 流水线：识别 -> 转移 -> 刮削通知
+    _recognize_stage: Optional[PipelineStage] = None
+    _transfer_stage: Optional[PipelineStage] = None
+    _post_stage: Optional[PipelineStage] = None
+    # 处理中的文件
+    _processing: set = set()
+    # 目的存储卷转移锁
+    _volume_locks: Dict[Any, threading.Lock] = {}
     # 退出事件
     _event = threading.Event()
 
@@ -120,6 +838,8 @@ class CloudLinkMonitor(_PluginBase):
         self.mediaChain = MediaChain()
         self.storagechain = StorageChain()
         self.filetransfer = FileManagerModule()
+        self._media_cache = RecognizeCache()
+        self._episodes_cache = RecognizeCache()
         # 清空配置
         self._dirconf = {}
         self._transferconf = {}
@@ -139,10 +859,17 @@ class CloudLinkMonitor(_PluginBase):
             self._monitor_dirs = config.get("monitor_dirs") or ""
             self._exclude_keywords = config.get("exclude_keywords") or ""
             self._interval = config.get("interval") or 10
+            self._recognize_workers = int(config.get("recognize_workers") or 2)
+            self._transfer_workers = int(config.get("transfer_workers") or 2)
+            self._post_workers = int(config.get("post_workers") or 2)
+            self._event_delay = int(config.get("event_delay") or 3)
             self._cron = config.get("cron")
             self._size = config.get("size") or 0
             self._softlink = config.get("softlink")
             self._strm = config.get("strm")
+        # 预编译媒体扩展名及过滤关键字
+        self._classifier = PathClassifier(media_exts=settings.RMT_MEDIAEXT,
+                                          exclude_keywords=self._exclude_keywords)
 
         # 停止现有任务
         self.stop_service()
@@ -150,6 +877,13 @@ class CloudLinkMonitor(_PluginBase):
         if self._enabled or self._onlyonce:
             # 定时服务管理器
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+            # 启动转移流水线
+            self.__start_pipeline()
+            if self._enabled:
+                # 监控事件合并、等待文件写入完成后再进入流水线
+                self._debouncer = EventDebouncer(
+                    handler=lambda path, mon: self.__handle_file(event_path=path, mon_path=mon),
+                    delay=self._event_delay, workers=self._recognize_workers, name="目录监控事件")
             if self._notify:
                 # 追加入库消息统一发送服务
                 self._scheduler.add_job(self.send_msg, trigger='interval', seconds=15)
@@ -211,16 +945,11 @@ class CloudLinkMonitor(_PluginBase):
                         pass
 
                     try:
-                        if self._mode == "compatibility":
-                            # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
-                            observer = PollingObserver(timeout=10)
-                        else:
-                            # 内部处理系统操作类型选择最优解
-                            observer = Observer(timeout=10)
+                        # 兼容模式按目录mtime轮询，性能模式使用原生监控，自动模式按文件系统类型选择
+                        observer = MonitorObserver.start(path=mon_path,
+                                                         handler=FileMonitorHandler(mon_path, self),
+                                                         mode=self._mode)
                         self._observer.append(observer)
-                        observer.schedule(FileMonitorHandler(mon_path, self), path=mon_path, recursive=True)
-                        observer.daemon = True
-                        observer.start()
                         logger.info(f"{mon_path} 的云盘实时监控服务启动")
                     except Exception as e:
                         err_msg = str(e)
@@ -254,6 +983,42 @@ class CloudLinkMonitor(_PluginBase):
                 self._scheduler.print_jobs()
                 self._scheduler.start()
 
+    def __start_pipeline(self):
+        """
+        启动转移流水线，各阶段之间为有界队列
+        """
+        self._processing = set()
+        self._volume_locks = {}
+        self._post_stage = PipelineStage(name="刮削通知", handler=self.__post_job,
+                                         workers=self._post_workers, on_done=self.__finish_job)
+        self._transfer_stage = PipelineStage(name="转移", handler=self.__transfer_job,
+                                             workers=self._transfer_workers, next_stage=self._post_stage,
+                                             on_done=self.__finish_job)
+        self._recognize_stage = PipelineStage(name="识别", handler=self.__recognize_job,
+                                              workers=self._recognize_workers, next_stage=self._transfer_stage,
+                                              on_done=self.__finish_job)
+        logger.info(f"转移流水线启动，识别 {self._recognize_workers} 线程，"
+                    f"转移 {self._transfer_workers} 线程，刮削通知 {self._post_workers} 线程")
+
+    def __stop_pipeline(self):
+        """
+        停止转移流水线
+        """
+        for stage in [self._recognize_stage, self._transfer_stage, self._post_stage]:
+            if stage:
+                stage.stop()
+        self._recognize_stage = None
+        self._transfer_stage = None
+        self._post_stage = None
+
+    def __wait_pipeline(self):
+        """
+        等待流水线中的任务全部处理完成
+        """
+        for stage in [self._recognize_stage, self._transfer_stage, self._post_stage]:
+            if stage:
+                stage.join()
+
     def __update_config(self):
         """
         更新配置
@@ -267,6 +1032,10 @@ class CloudLinkMonitor(_PluginBase):
             "monitor_dirs": self._monitor_dirs,
             "exclude_keywords": self._exclude_keywords,
             "interval": self._interval,
+            "recognize_workers": self._recognize_workers,
+            "transfer_workers": self._transfer_workers,
+            "post_workers": self._post_workers,
+            "event_delay": self._event_delay,
             "history": self._history,
             "softlink": self._softlink,
             "cron": self._cron,
@@ -299,6 +1068,8 @@ class CloudLinkMonitor(_PluginBase):
         立即运行一次，全量同步目录中所有文件
         """
         logger.info("开始全量同步云盘实时监控目录 ...")
+        # 流水线未启动时（如插件未启用时API调用）同步处理，流水线中途停止时不再处理
+        inline = self._recognize_stage is None
         # 遍历所有监控目录
         for mon_path in self._dirconf.keys():
             logger.info(f"开始处理监控目录 {mon_path} ...")
@@ -306,9 +1077,14 @@ class CloudLinkMonitor(_PluginBase):
             logger.info(f"监控目录 {mon_path} 共发现 {len(list_files)} 个文件")
             # 遍历目录下所有文件
             for file_path in list_files:
+                if self._event.is_set():
+                    logger.info("全量同步云盘实时监控目录已停止")
+                    return
                 logger.info(f"开始处理文件 {file_path} ...")
-                self.__handle_file(event_path=str(file_path), mon_path=mon_path)
-        logger.info("全量同步云盘实时监控目录完成！")
+                self.__handle_file(event_path=str(file_path), mon_path=mon_path, inline=inline)
+        # 等待流水线处理完成
+        self.__wait_pipeline()
+        logger.info(f"全量同步云盘实时监控目录完成！识别缓存{self._media_cache}，集信息缓存{self._episodes_cache}")
 
     def event_handler(self, event, mon_path: str, text: str, event_path: str):
         """
@@ -321,283 +1097,434 @@ class CloudLinkMonitor(_PluginBase):
         if not event.is_directory:
             # 文件发生变化
             logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            if self._debouncer:
+                self._debouncer.put(event_path=event_path, mon_path=mon_path, text=text)
+            else:
+                self.__handle_file(event_path=event_path, mon_path=mon_path)
 
-    def __handle_file(self, event_path: str, mon_path: str):
+    def __handle_file(self, event_path: str, mon_path: str, inline: bool = False):
         """
-        同步一个文件
+        同步一个文件，过滤后依次进入识别、转移、刮削通知流水线
         :param event_path: 事件文件路径
         :param mon_path: 监控目录
+        :param inline: 流水线未启动时是否同步处理，否则视为插件正在停止并放弃
         """
-        file_path = Path(event_path)
         try:
-            if not file_path.exists():
-                return
-            # 全程加锁
-            with lock:
-                transfer_history = self.transferhis.get_by_src(event_path)
-                if transfer_history:
-                    logger.info("文件已处理过：%s" % event_path)
-                    return
-
-                # 回收站及隐藏的文件不处理
-                if event_path.find('/@Recycle/') != -1 \
-                        or event_path.find('/#recycle/') != -1 \
-                        or event_path.find('/.') != -1 \
-                        or event_path.find('/@eaDir') != -1:
-                    logger.debug(f"{event_path} 是回收站或隐藏的文件")
-                    return
-
-                # 命中过滤关键字不处理
-                if self._exclude_keywords:
-                    for keyword in self._exclude_keywords.split("\n"):
-                        if keyword and re.findall(keyword, event_path):
-                            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
-                            return
-
-                # 整理屏蔽词不处理
-                transfer_exclude_words = self.systemconfig.get(SystemConfigKey.TransferExcludeWords)
-                if transfer_exclude_words:
-                    for keyword in transfer_exclude_words:
-                        if not keyword:
-                            continue
-                        if keyword and re.search(r"%s" % keyword, event_path, re.IGNORECASE):
-                            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
-                            return
+            job = self.__filter_file(event_path=event_path, mon_path=mon_path)
+        except Exception as e:
+            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+            return
+        if not job:
+            return
 
-                # 不是媒体文件不处理
-                if file_path.suffix not in settings.RMT_MEDIAEXT:
-                    logger.debug(f"{event_path} 不是媒体文件")
-                    return
+        recognize_stage = self._recognize_stage
+        if recognize_stage:
+            recognize_stage.put(job)
+            return
+        if not inline:
+            # 流水线已停止，停止过程中仍在运行的监控线程提交的文件直接放弃
+            logger.debug(f"转移流水线已停止，跳过处理 {event_path}")
+            self.__finish_job(job)
+            return
 
-                # 判断是不是蓝光目录
-                if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
-                    # 截取BDMV前面的路径
-                    blurray_dir = event_path[:event_path.find("BDMV")]
-                    file_path = Path(blurray_dir)
-                    logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
-                    # 查询历史记录，已转移的不处理
-                    if self.transferhis.get_by_src(str(file_path)):
-                        logger.info(f"{file_path} 已整理过")
-                        return
-
-                # 元数据
-                file_meta = MetaInfoPath(file_path)
-                if not file_meta.name:
-                    logger.error(f"{file_path.name} 无法识别有效信息")
-                    return
+        # 流水线未启动（如插件未启用时API调用），同步处理
+        origin_job = job
+        try:
+            for handler in [self.__recognize_job, self.__transfer_job, self.__post_job]:
+                job = handler(job)
+                if not job:
+                    break
+        except Exception as e:
+            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+        finally:
+            self.__finish_job(origin_job)
 
-                # 判断文件大小
-                if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024 ** 3:
-                    logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
-                    return
+    def __filter_file(self, event_path: str, mon_path: str) -> Optional[dict]:
+        """
+        过滤阶段：过滤规则、历史记录、元数据、文件大小
+        :return: 待识别任务，不处理时返回None
+        """
+        file_path = Path(event_path)
+        # 回收站及隐藏的文件不处理
+        if self._classifier.is_ignored(event_path):
+            logger.debug(f"{event_path} 是回收站或隐藏的文件")
+            return None
+
+        # 不是媒体文件不处理
+        if not self._classifier.is_media(event_path):
+            logger.debug(f"{event_path} 不是媒体文件")
+            return None
+
+        # 命中过滤关键字不处理
+        keyword = self._classifier.exclude_keyword(event_path)
+        if keyword:
+            logger.info(f"{event_path} 命中过滤关键字 {keyword}，不处理")
+            return None
+
+        # 整理屏蔽词不处理，屏蔽词变化时才重新编译
+        self._classifier.set_exclude_words(self.systemconfig.get(SystemConfigKey.TransferExcludeWords))
+        keyword = self._classifier.exclude_word(event_path)
+        if keyword:
+            logger.info(f"{event_path} 命中整理屏蔽词 {keyword}，不处理")
+            return None
+
+        if not file_path.exists():
+            return None
+
+        # 判断是不是蓝光目录
+        if re.search(r"BDMV[/\\]STREAM", event_path, re.IGNORECASE):
+            # 截取BDMV前面的路径
+            blurray_dir = event_path[:event_path.find("BDMV")]
+            file_path = Path(blurray_dir)
+            logger.info(f"{event_path} 是蓝光目录，更正文件路径为：{str(file_path)}")
+
+        # 同一文件（蓝光目录）同时只处理一次
+        with lock:
+            if str(file_path) in self._processing:
+                logger.debug(f"{file_path} 正在处理中")
+                return None
+            self._processing.add(str(file_path))
+
+        job = {
+            "event_path": event_path,
+            "mon_path": mon_path,
+            "file_path": file_path,
+        }
+        try:
+            transfer_history = self.transferhis.get_by_src(event_path)
+            if transfer_history:
+                logger.info("文件已处理过：%s" % event_path)
+                self.__finish_job(job)
+                return None
+
+            # 查询历史记录，已转移的不处理
+            if str(file_path) != event_path and self.transferhis.get_by_src(str(file_path)):
+                logger.info(f"{file_path} 已整理过")
+                self.__finish_job(job)
+                return None
+
+            # 元数据
+            file_meta = MetaInfoPath(file_path)
+            if not file_meta.name:
+                logger.error(f"{file_path.name} 无法识别有效信息")
+                self.__finish_job(job)
+                return None
+
+            # 判断文件大小
+            if self._size and float(self._size) > 0 and file_path.stat().st_size < float(self._size) * 1024 ** 3:
+                logger.info(f"{file_path} 文件大小小于监控文件大小，不处理")
+                self.__finish_job(job)
+                return None
+
+            # 查找这个文件项
+            file_item = self.storagechain.get_file_item(storage="local", path=file_path)
+            if not file_item:
+                logger.warn(f"{file_path.name} 未找到对应的文件")
+                self.__finish_job(job)
+                return None
+        except Exception:
+            self.__finish_job(job)
+            raise
+
+        job.update({
+            "file_meta": file_meta,
+            "file_item": file_item,
+            # 查询转移目的目录
+            "target": self._dirconf.get(mon_path),
+            # 查询转移方式
+            "transfer_type": self._transferconf.get(mon_path),
+        })
+        return job
 
-                # 查询转移目的目录
-                target: Path = self._dirconf.get(mon_path)
-                # 查询转移方式
-                transfer_type = self._transferconf.get(mon_path)
+    def __recognize_job(self, job: dict) -> Optional[dict]:
+        """
+        识别阶段：识别媒体信息、获取集信息、确定转移目的目录
+        """
+        mon_path = job.get("mon_path")
+        file_path: Path = job.get("file_path")
+        file_meta = job.get("file_meta")
+        transfer_type = job.get("transfer_type")
+
+        # 识别媒体信息
+        mediainfo: MediaInfo = self.__recognize_media(file_path=file_path, file_meta=file_meta)
+        if not mediainfo:
+            logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
+            # 新增转移成功历史记录
+            his = self.transferhis.add_fail(
+                fileitem=job.get("file_item"),
+                mode=transfer_type,
+                meta=file_meta
+            )
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.Manual,
+                    title=f"{file_path.name} 未识别到媒体信息，无法入库！\n"
+                          f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
+                )
+            return None
+
+        # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
+        if not settings.SCRAP_FOLLOW_TMDB:
+            transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
+                                                                   mtype=mediainfo.type.value)
+            if transfer_history:
+                mediainfo.title = transfer_history.title
+        logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
+
+        # 获取集数据
+        if mediainfo.type == MediaType.TV:
+            episodes_info = self.__get_episodes(tmdbid=mediainfo.tmdb_id,
+                                                season=1 if file_meta.begin_season is None else file_meta.begin_season)
+        else:
+            episodes_info = None
+
+        # 查询转移目的目录
+        target_dir = DirectoryHelper().get_dir(mediainfo, src_path=Path(mon_path))
+        if not target_dir or not target_dir.library_path or not target_dir.download_path.startswith(mon_path):
+            target_dir = TransferDirectoryConf()
+            target_dir.library_path = job.get("target")
+            target_dir.transfer_type = transfer_type
+            target_dir.scraping = self._scrape
+            target_dir.renaming = True
+            target_dir.notify = False
+            target_dir.overwrite_mode = self._overwrite_mode.get(mon_path) or 'never'
+            target_dir.library_storage = "local"
+            target_dir.library_category_folder = self._category
+        else:
+            target_dir.transfer_type = transfer_type
+            target_dir.scraping = self._scrape
+
+        if not target_dir.library_path:
+            logger.error(f"未配置监控目录 {mon_path} 的目的目录")
+            return None
+
+        job.update({
+            "mediainfo": mediainfo,
+            "episodes_info": episodes_info,
+            "target_dir": target_dir,
+        })
+        return job
 
-                # 查找这个文件项
-                file_item = self.storagechain.get_file_item(storage="local", path=file_path)
-                if not file_item:
-                    logger.warn(f"{event_path.name} 未找到对应的文件")
-                    return
-                # 识别媒体信息
-                mediainfo: MediaInfo = self.chain.recognize_media(meta=file_meta)
-                if not mediainfo:
-                    logger.warn(f'未识别到媒体信息，标题：{file_meta.name}')
-                    # 新增转移成功历史记录
-                    his = self.transferhis.add_fail(
-                        fileitem=file_item,
-                        mode=transfer_type,
-                        meta=file_meta
-                    )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{file_path.name} 未识别到媒体信息，无法入库！\n"
-                                  f"回复：```\n/redo {his.id} [tmdbid]|[类型]\n``` 手动识别转移。"
-                        )
-                    return
+    def __transfer_job(self, job: dict) -> Optional[dict]:
+        """
+        转移阶段：同一目的存储卷串行转移，不同存储卷并行
+        """
+        file_path: Path = job.get("file_path")
+        file_meta = job.get("file_meta")
+        file_item = job.get("file_item")
+        mediainfo: MediaInfo = job.get("mediainfo")
+        transfer_type = job.get("transfer_type")
+        target_dir = job.get("target_dir")
+
+        # 转移文件
+        with self.__get_volume_lock(target_dir.library_path):
+            transferinfo: TransferInfo = self.chain.transfer(fileitem=file_item,
+                                                             meta=file_meta,
+                                                             mediainfo=mediainfo,
+                                                             target_directory=target_dir,
+                                                             episodes_info=job.get("episodes_info"))
+
+        if not transferinfo:
+            logger.error("文件转移模块运行失败")
+            return None
+
+        if not transferinfo.success:
+            # 转移失败
+            logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
+
+            if self._history:
+                # 新增转移失败历史记录
+                self.transferhis.add_fail(
+                    fileitem=file_item,
+                    mode=transfer_type,
+                    meta=file_meta,
+                    mediainfo=mediainfo,
+                    transferinfo=transferinfo
+                )
+            if self._notify:
+                self.post_message(
+                    mtype=NotificationType.Manual,
+                    title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
+                    text=f"原因：{transferinfo.message or '未知'}",
+                    image=mediainfo.get_message_image()
+                )
+            return None
+
+        if self._history:
+            # 新增转移成功历史记录
+            self.transferhis.add_success(
+                fileitem=file_item,
+                mode=transfer_type,
+                meta=file_meta,
+                mediainfo=mediainfo,
+                transferinfo=transferinfo
+            )
+
+        job["transferinfo"] = transferinfo
+        return job
+
+    def __post_job(self, job: dict) -> None:
+        """
+        刮削通知阶段：刮削、汇总入库消息、联动事件、移动模式清理空目录
+        """
+        mon_path = job.get("mon_path")
+        file_path: Path = job.get("file_path")
+        file_meta = job.get("file_meta")
+        mediainfo: MediaInfo = job.get("mediainfo")
+        transferinfo: TransferInfo = job.get("transferinfo")
+        transfer_type = job.get("transfer_type")
+
+        # 刮削
+        if self._scrape:
+            self.mediaChain.scrape_metadata(fileitem=transferinfo.target_diritem,
+                                            meta=file_meta,
+                                            mediainfo=mediainfo)
 
-                # 如果未开启新增已入库媒体是否跟随TMDB信息变化则根据tmdbid查询之前的title
-                if not settings.SCRAP_FOLLOW_TMDB:
-                    transfer_history = self.transferhis.get_by_type_tmdbid(tmdbid=mediainfo.tmdb_id,
-                                                                           mtype=mediainfo.type.value)
-                    if transfer_history:
-                        mediainfo.title = transfer_history.title
-                logger.info(f"{file_path.name} 识别为：{mediainfo.type.value} {mediainfo.title_year}")
-
-                # 获取集数据
-                if mediainfo.type == MediaType.TV:
-                    episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=mediainfo.tmdb_id,
-                                                                 season=1 if file_meta.begin_season is None else file_meta.begin_season)
-                else:
-                    episodes_info = None
-
-                # 查询转移目的目录
-                target_dir = DirectoryHelper().get_dir(mediainfo, src_path=Path(mon_path))
-                if not target_dir or not target_dir.library_path or not target_dir.download_path.startswith(mon_path):
-                    target_dir = TransferDirectoryConf()
-                    target_dir.library_path = target
-                    target_dir.transfer_type = transfer_type
-                    target_dir.scraping = self._scrape
-                    target_dir.renaming = True
-                    target_dir.notify = False
-                    target_dir.overwrite_mode = self._overwrite_mode.get(mon_path) or 'never'
-                    target_dir.library_storage = "local"
-                    target_dir.library_category_folder = self._category
+        """
+        {
+            "title_year season": {
+                "files": [
+                    {
+                        "path":,
+                        "mediainfo":,
+                        "file_meta":,
+                        "transferinfo":
+                    }
+                ],
+                "time": "2023-08-24 23:23:23.332"
+            }
+        }
+        """
+        if self._notify:
+            # 发送消息汇总
+            with lock:
+                media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
+                if media_list:
+                    media_files = media_list.get("files") or []
+                    if media_files:
+                        file_exists = False
+                        for file in media_files:
+                            if str(file_path) == file.get("path"):
+                                file_exists = True
+                                break
+                        if not file_exists:
+                            media_files.append({
+                                "path": str(file_path),
+                                "mediainfo": mediainfo,
+                                "file_meta": file_meta,
+                                "transferinfo": transferinfo
+                            })
+                    else:
+                        media_files = [
+                            {
+                                "path": str(file_path),
+                                "mediainfo": mediainfo,
+                                "file_meta": file_meta,
+                                "transferinfo": transferinfo
+                            }
+                        ]
+                    media_list = {
+                        "files": media_files,
+                        "time": datetime.datetime.now()
+                    }
                 else:
-                    target_dir.transfer_type = transfer_type
-                    target_dir.scraping = self._scrape
-
-                if not target_dir.library_path:
-                    logger.error(f"未配置监控目录 {mon_path} 的目的目录")
-                    return
-
-                # 转移文件
-                transferinfo: TransferInfo = self.chain.transfer(fileitem=file_item,
-                                                                 meta=file_meta,
-                                                                 mediainfo=mediainfo,
-                                                                 target_directory=target_dir,
-                                                                 episodes_info=episodes_info)
-
-                if not transferinfo:
-                    logger.error("文件转移模块运行失败")
-                    return
-
-                if not transferinfo.success:
-                    # 转移失败
-                    logger.warn(f"{file_path.name} 入库失败：{transferinfo.message}")
-
-                    if self._history:
-                        # 新增转移失败历史记录
-                        self.transferhis.add_fail(
-                            fileitem=file_item,
-                            mode=transfer_type,
-                            meta=file_meta,
-                            mediainfo=mediainfo,
-                            transferinfo=transferinfo
-                        )
-                    if self._notify:
-                        self.post_message(
-                            mtype=NotificationType.Manual,
-                            title=f"{mediainfo.title_year}{file_meta.season_episode} 入库失败！",
-                            text=f"原因：{transferinfo.message or '未知'}",
-                            image=mediainfo.get_message_image()
-                        )
-                    return
-
-                if self._history:
-                    # 新增转移成功历史记录
-                    self.transferhis.add_success(
-                        fileitem=file_item,
-                        mode=transfer_type,
-                        meta=file_meta,
-                        mediainfo=mediainfo,
-                        transferinfo=transferinfo
-                    )
-
-                # 刮削
-                if self._scrape:
-                    self.mediaChain.scrape_metadata(fileitem=transferinfo.target_diritem,
-                                                    meta=file_meta,
-                                                    mediainfo=mediainfo)
-                """
-                {
-                    "title_year season": {
+                    media_list = {
                         "files": [
                             {
-                                "path":,
-                                "mediainfo":,
-                                "file_meta":,
-                                "transferinfo":
+                                "path": str(file_path),
+                                "mediainfo": mediainfo,
+                                "file_meta": file_meta,
+                                "transferinfo": transferinfo
                             }
                         ],
-                        "time": "2023-08-24 23:23:23.332"
+                        "time": datetime.datetime.now()
                     }
-                }
-                """
-                if self._notify:
-                    # 发送消息汇总
-                    media_list = self._medias.get(mediainfo.title_year + " " + file_meta.season) or {}
-                    if media_list:
-                        media_files = media_list.get("files") or []
-                        if media_files:
-                            file_exists = False
-                            for file in media_files:
-                                if str(file_path) == file.get("path"):
-                                    file_exists = True
-                                    break
-                            if not file_exists:
-                                media_files.append({
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                })
-                        else:
-                            media_files = [
-                                {
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                }
-                            ]
-                        media_list = {
-                            "files": media_files,
-                            "time": datetime.datetime.now()
-                        }
-                    else:
-                        media_list = {
-                            "files": [
-                                {
-                                    "path": str(file_path),
-                                    "mediainfo": mediainfo,
-                                    "file_meta": file_meta,
-                                    "transferinfo": transferinfo
-                                }
-                            ],
-                            "time": datetime.datetime.now()
-                        }
-                    self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
-
-                if self._refresh:
-                    # 广播事件
-                    self.eventmanager.send_event(EventType.TransferComplete, {
-                        'meta': file_meta,
-                        'mediainfo': mediainfo,
-                        'transferinfo': transferinfo
-                    })
-
-                if self._softlink:
-                    # 通知实时软连接生成
-                    self.eventmanager.send_event(EventType.PluginAction, {
-                        'file_path': str(transferinfo.target_item.path),
-                        'action': 'softlink_file'
-                    })
-
-                if self._strm:
-                    # 通知Strm助手生成
-                    self.eventmanager.send_event(EventType.PluginAction, {
-                        'file_path': str(transferinfo.target_item.path),
-                        'action': 'cloudstrm_file'
-                    })
-
-                # 移动模式删除空目录
-                if transfer_type == "move":
-                    for file_dir in file_path.parents:
-                        if len(str(file_dir)) <= len(str(Path(mon_path))):
-                            # 重要，删除到监控目录为止
-                            break
-                        files = SystemUtils.list_files(file_dir, settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
-                        if not files:
-                            logger.warn(f"移动模式，删除空目录：{file_dir}")
-                            shutil.rmtree(file_dir, ignore_errors=True)
+                self._medias[mediainfo.title_year + " " + file_meta.season] = media_list
+
+        if self._refresh:
+            # 广播事件
+            self.eventmanager.send_event(EventType.TransferComplete, {
+                'meta': file_meta,
+                'mediainfo': mediainfo,
+                'transferinfo': transferinfo
+            })
+
+        if self._softlink:
+            # 通知实时软连接生成
+            self.eventmanager.send_event(EventType.PluginAction, {
+                'file_path': str(transferinfo.target_item.path),
+                'action': 'softlink_file'
+            })
+
+        if self._strm:
+            # 通知Strm助手生成
+            self.eventmanager.send_event(EventType.PluginAction, {
+                'file_path': str(transferinfo.target_item.path),
+                'action': 'cloudstrm_file'
+            })
+
+        # 移动模式删除空目录
+        if transfer_type == "move":
+            for file_dir in file_path.parents:
+                if len(str(file_dir)) <= len(str(Path(mon_path))):
+                    # 重要，删除到监控目录为止
+                    break
+                files = SystemUtils.list_files(file_dir, settings.RMT_MEDIAEXT + settings.DOWNLOAD_TMPEXT)
+                if not files:
+                    logger.warn(f"移动模式，删除空目录：{file_dir}")
+                    shutil.rmtree(file_dir, ignore_errors=True)
+
+    def __finish_job(self, job: Optional[dict]):
+        """
+        任务结束，释放处理中标记
+        """
+        if not job:
+            return
+        with lock:
+            self._processing.discard(str(job.get("file_path")))
 
-        except Exception as e:
-            logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
+    def __get_volume_lock(self, path: Any) -> threading.Lock:
+        """
+        获取目的目录所在存储卷的转移锁
+        """
+        volume = str(path)
+        for parent in [Path(path), *Path(path).parents]:
+            try:
+                volume = os.stat(parent).st_dev
+                break
+            except OSError:
+                continue
+        with lock:
+            volume_lock = self._volume_locks.get(volume)
+            if not volume_lock:
+                volume_lock = threading.Lock()
+                self._volume_locks[volume] = volume_lock
+            return volume_lock
+
+    def __recognize_media(self, file_path: Path, file_meta: MetaInfoPath) -> Optional[MediaInfo]:
+        """
+        识别媒体信息，同目录同标题年份季的文件复用识别结果
+        """
+        key = (str(file_path.parent), file_meta.name, file_meta.year, file_meta.type, file_meta.begin_season)
+        mediainfo = self._media_cache.get(key)
+        if mediainfo:
+            logger.debug(f"{file_path.name} 使用缓存的识别结果：{mediainfo.title_year}，{self._media_cache}")
+            return mediainfo
+        mediainfo = self.chain.recognize_media(meta=file_meta)
+        self._media_cache.put(key, mediainfo)
+        return mediainfo
+
+    def __get_episodes(self, tmdbid: int, season: int) -> Any:
+        """
+        获取季集信息，同一季复用
+        """
+        key = (tmdbid, season)
+        episodes_info = self._episodes_cache.get(key)
+        if episodes_info:
+            return episodes_info
+        episodes_info = self.tmdbchain.tmdb_episodes(tmdbid=tmdbid, season=season)
+        self._episodes_cache.put(key, episodes_info)
+        return episodes_info
 
     def send_msg(self):
         """
@@ -660,7 +1587,8 @@ class CloudLinkMonitor(_PluginBase):
                                                              transferinfo=transferinfo,
                                                              season_episode=season_episode)
                 # 发送完消息，移出key
-                del self._medias[medis_title_year_season]
+                with lock:
+                    self._medias.pop(medis_title_year_season, None)
                 continue
 
     def get_state(self) -> bool:
@@ -910,7 +1838,8 @@ class CloudLinkMonitor(_PluginBase):
                                             'label': '监控模式',
                                             'items': [
                                                 {'title': '兼容模式', 'value': 'compatibility'},
-                                                {'title': '性能模式', 'value': 'fast'}
+                                                {'title': '性能模式', 'value': 'fast'},
+                                                {'title': '自动模式', 'value': 'auto'}
                                             ]
                                         }
                                     }
@@ -978,6 +1907,79 @@ class CloudLinkMonitor(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'recognize_workers',
+                                            'label': '识别线程数',
+                                            'placeholder': '2'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'transfer_workers',
+                                            'label': '转移线程数',
+                                            'placeholder': '2'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'post_workers',
+                                            'label': '刮削通知线程数',
+                                            'placeholder': '2'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'event_delay',
+                                            'label': '监控事件静默时间（秒）',
+                                            'placeholder': '3'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -1042,6 +2044,7 @@ class CloudLinkMonitor(_PluginBase):
                                             'type': 'info',
                                             'variant': 'tonal',
                                             'text': '入库消息延迟默认10s，如网络较慢可酌情调大，有助于发送统一入库消息。'
+                                                    '同一目的存储卷的文件依次转移，不同存储卷并行转移。'
                                         }
                                     }
                                 ]
@@ -1107,6 +2110,10 @@ class CloudLinkMonitor(_PluginBase):
             "monitor_dirs": "",
             "exclude_keywords": "",
             "interval": 10,
+            "recognize_workers": 2,
+            "transfer_workers": 2,
+            "post_workers": 2,
+            "event_delay": 3,
             "cron": "",
             "size": 0
         }
@@ -1126,10 +2133,16 @@ class CloudLinkMonitor(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._debouncer:
+            self._debouncer.stop()
+            self._debouncer = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
                 self._event.set()
+                # 先停止流水线，全量同步无需等待剩余任务
+                self.__stop_pipeline()
                 self._scheduler.shutdown()
                 self._event.clear()
             self._scheduler = None
+        self.__stop_pipeline()
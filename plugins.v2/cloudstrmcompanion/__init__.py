@@ -1,20 +1,24 @@
+import hashlib
 import json
 import os
 import re
 import shutil
+import sqlite3
 import threading
 import time
 import traceback
 import urllib.parse
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Callable
 
 import pytz
 import requests
 from apscheduler.schedulers.background import BackgroundScheduler
-from watchdog.events import FileSystemEventHandler
-from watchdog.observers.polling import PollingObserver
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent
+from watchdog.observers import Observer
 
 from app.core.config import settings
 from app.core.event import eventmanager, Event
@@ -30,6 +34,752 @@ from app.utils.string import StringUtils
 lock = threading.Lock()
 
 
+class ScanProgress:
+    """
+    全量执行进度统计
+    """
+
+    def __init__(self, log_step: int = 1000):
+        self.total = 0
+        self.done = 0
+        self.start_time = time.time()
+        self._log_step = log_step
+        self._cond = threading.Condition()
+
+    def add(self):
+        """
+        登记一个待处理文件
+        """
+        with self._cond:
+            self.total += 1
+
+    def finish(self):
+        """
+        完成一个文件，按步长输出进度
+        """
+        with self._cond:
+            self.done += 1
+            if self.done % self._log_step == 0:
+                logger.info(f"全量执行进度：{self}")
+            self._cond.notify_all()
+
+    def wait(self):
+        """
+        等待已登记的文件全部处理完成
+        """
+        with self._cond:
+            self._cond.wait_for(lambda: self.done >= self.total)
+
+    @property
+    def speed(self) -> float:
+        """
+        处理速度（文件/秒）
+        """
+        elapsed = time.time() - self.start_time
+        return self.done / elapsed if elapsed > 0 else 0.0
+
+    def __str__(self):
+        return (f"已处理 {self.done}/{self.total} 个文件，"
+                f"耗时 {time.time() - self.start_time:.1f} 秒，速度 {self.speed:.1f} 个/秒")
+
+
+class StrmManifest:
+    """
+    strm生成清单，记录源文件大小、修改时间、目标文件及strm内容摘要，用于增量执行
+    """
+
+    def __init__(self, db_path: str, commit_step: int = 500):
+        self._lock = threading.Lock()
+        self._commit_step = commit_step
+        self._uncommitted = 0
+        self._closed = False
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("CREATE TABLE IF NOT EXISTS manifest ("
+                           "source TEXT PRIMARY KEY, "
+                           "mon_path TEXT NOT NULL, "
+                           "size INTEGER, "
+                           "mtime REAL, "
+                           "target TEXT, "
+                           "content_hash TEXT)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_manifest_mon_path ON manifest (mon_path)")
+        self._conn.commit()
+
+    def load(self, mon_path: str) -> Dict[str, Tuple[int, float, str, Optional[str]]]:
+        """
+        读取监控目录下的全部记录
+        :return: {源文件: (大小, 修改时间, 目标文件, strm内容摘要)}
+        """
+        with self._lock:
+            rows = self._conn.execute("SELECT source, size, mtime, target, content_hash FROM manifest "
+                                      "WHERE mon_path = ?", (mon_path,)).fetchall()
+        return {row[0]: (row[1], row[2], row[3], row[4]) for row in rows}
+
+    def upsert(self, source: str, mon_path: str, size: int, mtime: float, target: str,
+               content_hash: Optional[str] = None):
+        """
+        新增或更新一条记录
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.execute("INSERT OR REPLACE INTO manifest (source, mon_path, size, mtime, target, content_hash) "
+                               "VALUES (?, ?, ?, ?, ?, ?)", (source, mon_path, size, mtime, target, content_hash))
+            self._uncommitted += 1
+            if self._uncommitted >= self._commit_step:
+                self._conn.commit()
+                self._uncommitted = 0
+
+    def remove(self, sources: List[str]):
+        """
+        删除记录
+        """
+        with self._lock:
+            self._conn.executemany("DELETE FROM manifest WHERE source = ?", [(source,) for source in sources])
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def commit(self):
+        """
+        提交未落盘的记录
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.commit()
+            self._uncommitted = 0
+
+    def close(self):
+        """
+        关闭数据库
+        """
+        with self._lock:
+            if self._closed:
+                return
+            self._conn.commit()
+            self._conn.close()
+            self._closed = True
+
+    @staticmethod
+    def content_hash(content: Optional[str]) -> Optional[str]:
+        """
+        strm内容摘要
+        """
+        if content is None:
+            return None
+        return hashlib.md5(content.encode("utf-8")).hexdigest()
+
+
+class DirListingCache:
+    """
+    目录文件列表缓存，有效期内同一目录只列举一次，减少网盘挂载目录的远程列举次数
+    """
+
+    def __init__(self, ttl: float = 30, max_dirs: int = 2048):
+        self._ttl = ttl
+        self._max_dirs = max_dirs
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, dir_path: str, names: List[str]):
+        """
+        写入目录文件列表，如全量遍历时os.walk已获取的列表
+        """
+        with self._lock:
+            self._entries[dir_path] = (time.monotonic(), list(names))
+            self._entries.move_to_end(dir_path)
+            while len(self._entries) > self._max_dirs:
+                self._entries.popitem(last=False)
+
+    def listdir(self, dir_path: str) -> List[str]:
+        """
+        获取目录文件列表，缓存过期时重新列举
+        """
+        with self._lock:
+            entry = self._entries.get(dir_path)
+            if entry and time.monotonic() - entry[0] < self._ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            names = os.listdir(dir_path)
+        except (FileNotFoundError, NotADirectoryError):
+            names = []
+        self.put(dir_path, names)
+        return names
+
+    def same_stem_files(self, file_path: str) -> List[Path]:
+        """
+        获取同目录下同名的文件（nfo、jpg等），等同于 parent.glob(f"{stem}.*")
+        """
+        path = Path(file_path)
+        prefix = f"{path.stem}."
+        return [path.parent / name for name in self.listdir(str(path.parent))
+                if name.startswith(prefix) and not name.startswith(".")]
+
+    def exists(self, file_path: str) -> bool:
+        """
+        判断文件是否在目录列表中
+        """
+        path = Path(file_path)
+        return path.name in self.listdir(str(path.parent))
+
+    def invalidate(self, file_path: str):
+        """
+        文件变化时使所在目录的缓存失效
+        """
+        with self._lock:
+            self._entries.pop(str(Path(file_path).parent), None)
+            self._entries.pop(str(file_path), None)
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class PathClassifier:
+    """
+    文件路径分类器，插件初始化时预编译扩展名集合及过滤规则，处理文件时快速分类
+    """
+    # 分类结果
+    IGNORED = "ignored"
+    EXCLUDED = "excluded"
+    MEDIA = "media"
+    SUBTITLE = "subtitle"
+    OTHER = "other"
+    UNKNOWN = "unknown"
+
+    # 回收站及隐藏的文件
+    _ignore_re = re.compile(r"/@Recycle|/#recycle|/\.|/@eaDir")
+    _subtitle_exts = frozenset([".srt", ".ass", ".ssa", ".sub"])
+
+    def __init__(self, media_exts: Any = None, other_exts: Any = None, exclude_keywords: Any = None):
+        """
+        :param media_exts: 媒体文件扩展名，逗号分隔字符串或列表
+        :param other_exts: 非媒体文件扩展名，逗号分隔字符串或列表
+        :param exclude_keywords: 过滤关键字（区分大小写），换行分隔字符串或列表
+        """
+        self.media_exts = self.__parse_exts(media_exts)
+        self.other_exts = self.__parse_exts(other_exts)
+        # SystemUtils.exits_files 等需要列表参数
+        self.media_ext_list = list(self.media_exts)
+        self._keywords: List[Tuple[str, Any]] = []
+        self._keywords_re = None
+        self._exclude_words: Tuple[str, ...] = ()
+        self._exclude_words_list: List[Tuple[str, Any]] = []
+        self._exclude_words_re = None
+        if isinstance(exclude_keywords, str):
+            exclude_keywords = exclude_keywords.split("\n")
+        self._keywords, self._keywords_re = self.__compile(exclude_keywords or [], flags=0)
+
+    @staticmethod
+    def __parse_exts(exts: Any) -> frozenset:
+        """
+        解析扩展名配置
+        """
+        if not exts:
+            return frozenset()
+        if isinstance(exts, str):
+            exts = exts.split(",")
+        return frozenset(ext.strip().lower() for ext in exts if ext and ext.strip())
+
+    @staticmethod
+    def __compile(keywords: Any, flags: int) -> Tuple[List[Tuple[str, Any]], Any]:
+        """
+        逐个编译关键字（跳过无效正则），并合并为一个正则用于快速判断
+        """
+        compiled = []
+        for keyword in keywords:
+            if not keyword:
+                continue
+            try:
+                compiled.append((keyword, re.compile(keyword, flags)))
+            except re.error as e:
+                logger.warn(f"过滤关键字 {keyword} 不是有效的正则表达式：{str(e)}")
+        if not compiled:
+            return compiled, None
+        try:
+            combined = re.compile("|".join(f"(?:{keyword})" for keyword, _ in compiled), flags)
+        except re.error:
+            # 关键字间存在同名分组等冲突时，逐个匹配
+            combined = None
+        return compiled, combined
+
+    def set_exclude_words(self, words: Any):
+        """
+        设置整理屏蔽词（忽略大小写），内容未变化时不重复编译
+        """
+        words = tuple(words or ())
+        if words == self._exclude_words:
+            return
+        self._exclude_words_list, self._exclude_words_re = self.__compile(words, flags=re.IGNORECASE)
+        self._exclude_words = words
+
+    @staticmethod
+    def suffix(path: Any) -> str:
+        """
+        小写扩展名
+        """
+        return os.path.splitext(str(path))[1].lower()
+
+    def is_ignored(self, path: Any) -> bool:
+        """
+        是否回收站或隐藏的文件
+        """
+        return self._ignore_re.search(str(path)) is not None
+
+    def is_media(self, path: Any) -> bool:
+        """
+        是否媒体文件
+        """
+        return self.suffix(path) in self.media_exts
+
+    def is_other(self, path: Any) -> bool:
+        """
+        是否配置的非媒体文件
+        """
+        return self.suffix(path) in self.other_exts
+
+    def is_subtitle(self, path: Any) -> bool:
+        """
+        是否字幕文件
+        """
+        return self.suffix(path) in self._subtitle_exts
+
+    @staticmethod
+    def __match(path: str, compiled: List[Tuple[str, Any]], combined: Any) -> Optional[str]:
+        """
+        先用合并正则快速判断，命中后再找出具体关键字
+        """
+        if not compiled:
+            return None
+        if combined is not None and not combined.search(path):
+            return None
+        for keyword, pattern in compiled:
+            if pattern.search(path):
+                return keyword
+        return None
+
+    def exclude_keyword(self, path: Any) -> Optional[str]:
+        """
+        命中的过滤关键字
+        """
+        return self.__match(str(path), self._keywords, self._keywords_re)
+
+    def exclude_word(self, path: Any) -> Optional[str]:
+        """
+        命中的整理屏蔽词
+        """
+        return self.__match(str(path), self._exclude_words_list, self._exclude_words_re)
+
+    def classify(self, path: Any) -> str:
+        """
+        路径分类：回收站/隐藏、命中过滤、媒体、字幕、其他、未知
+        """
+        path = str(path)
+        if self._ignore_re.search(path):
+            return self.IGNORED
+        if self.exclude_keyword(path) or self.exclude_word(path):
+            return self.EXCLUDED
+        suffix = self.suffix(path)
+        if suffix in self.media_exts:
+            return self.MEDIA
+        if suffix in self._subtitle_exts:
+            return self.SUBTITLE
+        if suffix in self.other_exts:
+            return self.OTHER
+        return self.UNKNOWN
+
+
+class EventDebouncer:
+    """
+    目录监控事件防抖队列
+    监控线程只负责登记路径，同一路径在静默窗口内的重复事件合并为一次；
+    窗口结束后检查文件大小，大小仍在变化（下载/复制中）则继续等待，稳定后再分发给处理线程池
+    """
+
+    class _Pending:
+        __slots__ = ("mon_path", "text", "due", "size", "seq")
+
+        def __init__(self, mon_path: str, text: str, due: float):
+            self.mon_path = mon_path
+            self.text = text
+            self.due = due
+            self.size = None
+            self.seq = 0
+
+    def __init__(self, handler: Callable[[str, str], Any], delay: float = 3, workers: int = 2,
+                 max_pending: int = 50000, name: str = "监控事件"):
+        """
+        :param handler: 处理函数，参数为 (event_path, mon_path)
+        :param delay: 静默窗口秒数，同时也是文件大小稳定检查间隔
+        :param workers: 处理线程数
+        :param max_pending: 最大排队路径数，超出后丢弃新事件
+        :param name: 日志名称
+        """
+        self._handler = handler
+        self._delay = max(float(delay), 0.1)
+        self._workers = max(int(workers), 1)
+        self._max_pending = max_pending
+        self._name = name
+        self._pending: Dict[str, EventDebouncer._Pending] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="event-debounce")
+        self._slots = threading.BoundedSemaphore(self._workers * 2)
+        self._running = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.vanished = 0
+        self.dropped = 0
+        self._last_drop_log = 0.0
+        self._thread = threading.Thread(target=self.__loop, name="event-debounce-dispatcher", daemon=True)
+        self._thread.start()
+
+    def put(self, event_path: str, mon_path: str, text: str = ""):
+        """
+        登记一个事件，仅操作内存，不阻塞监控线程
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                return
+            pending = self._pending.get(event_path)
+            if pending:
+                # 重复事件，重新计时
+                pending.due = now + self._delay
+                pending.seq += 1
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                if now - self._last_drop_log > 60:
+                    self._last_drop_log = now
+                    logger.warn(f"{self._name}队列已满，丢弃事件：{event_path}，{self}")
+                return
+            self._pending[event_path] = self._Pending(mon_path=mon_path, text=text, due=now + self._delay)
+            self.queued += 1
+            self._cond.notify()
+
+    def __loop(self):
+        """
+        分发线程：取出静默窗口已结束的路径，检查文件大小是否稳定
+        """
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [(path, pending.seq, pending.size) for path, pending in self._pending.items()
+                       if pending.due <= now]
+                if not due:
+                    wait = min((p.due for p in self._pending.values()), default=now + 60) - now
+                    self._cond.wait(timeout=min(max(wait, 0.05), 60))
+                    continue
+            for path, seq, size in due:
+                if self._stopped:
+                    return
+                try:
+                    current = os.stat(path).st_size
+                except OSError:
+                    current = None
+                ready = False
+                with self._cond:
+                    pending = self._pending.get(path)
+                    if not pending or pending.seq != seq:
+                        # 检查期间又有新事件，等待下一个窗口
+                        continue
+                    if current is None:
+                        self._pending.pop(path, None)
+                        self.vanished += 1
+                        continue
+                    if size is not None and current == size:
+                        self._pending.pop(path, None)
+                        ready = True
+                    else:
+                        # 首次检查或大小仍在变化
+                        pending.size = current
+                        pending.due = time.monotonic() + self._delay
+                if ready:
+                    self.__dispatch(path, pending.mon_path, pending.text)
+
+    def __dispatch(self, event_path: str, mon_path: str, text: str):
+        """
+        提交到处理线程池，线程池繁忙时阻塞分发线程
+        """
+        while not self._slots.acquire(timeout=1):
+            if self._stopped:
+                return
+        if self._stopped:
+            self._slots.release()
+            return
+        with self._cond:
+            self._running += 1
+            self.dispatched += 1
+
+        def _run():
+            try:
+                logger.debug(f"{self._name}：{text} {event_path}")
+                self._handler(event_path, mon_path)
+            except Exception as e:
+                logger.error(f"{self._name}处理 {event_path} 出错：{str(e)}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                self._slots.release()
+
+        try:
+            self._executor.submit(_run)
+        except RuntimeError:
+            with self._cond:
+                self._running -= 1
+            self._slots.release()
+
+    @property
+    def depth(self) -> int:
+        """
+        等待中及处理中的事件数
+        """
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def stop(self):
+        """
+        停止分发，丢弃未处理事件
+        """
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"{self._name}队列已停止，{self}")
+
+    def __str__(self):
+        return (f"排队 {len(self._pending)}，处理中 {self._running}，累计 {self.queued}，"
+                f"合并 {self.coalesced}，分发 {self.dispatched}，已消失 {self.vanished}，丢弃 {self.dropped}")
+
+
+class DirMtimePoller(threading.Thread):
+    """
+    按目录mtime增量轮询的监控器，用于网络共享及FUSE挂载目录
+    目录内新增、删除、重命名条目会改变该目录的mtime，mtime未变化的目录不再列出内容，也不stat其中的文件；
+    部分FUSE挂载不可靠更新目录mtime，每隔 full_every 轮做一次完整列目录校正
+    """
+
+    def __init__(self, path: str, handler: FileSystemEventHandler, interval: float = 10, full_every: int = 30,
+                 desc: str = ""):
+        super().__init__(name=f"mtime-poller:{path}", daemon=True)
+        self._root = path
+        self._desc = desc
+        self._handler = handler
+        self._interval = interval
+        self._full_every = max(int(full_every), 1)
+        self._stopped = threading.Event()
+        # 目录 -> (mtime, 文件名集合, 子目录名集合)
+        self._dirs: Dict[str, Tuple[int, set, set]] = {}
+        self.file_count = 0
+        self.scan_cost = 0.0
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._dirs)
+
+    def snapshot(self):
+        """
+        建立初始快照，不触发事件
+        """
+        start = time.time()
+        self.__poll(full=True, emit=False)
+        self.scan_cost = time.time() - start
+        self.file_count = sum(len(rec[1]) for rec in self._dirs.values())
+
+    def run(self):
+        try:
+            self.snapshot()
+            logger.info(f"{self._root} 使用目录轮询（{self._desc}），间隔 {self._interval} 秒，"
+                        f"监控目录数 {self.watch_count}，文件数 {self.file_count}，"
+                        f"初始扫描耗时 {self.scan_cost:.2f} 秒")
+        except Exception as e:
+            logger.error(f"{self._root} 初始扫描出错：{str(e)}")
+        rounds = 0
+        while not self._stopped.wait(self._interval):
+            rounds += 1
+            try:
+                start = time.time()
+                listed = self.__poll(full=rounds % self._full_every == 0, emit=True)
+                logger.debug(f"{self._root} 轮询完成，目录 {len(self._dirs)}，"
+                             f"重新列出 {listed}，耗时 {time.time() - start:.2f} 秒")
+            except Exception as e:
+                logger.error(f"{self._root} 轮询出错：{str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+
+    def __poll(self, full: bool, emit: bool) -> int:
+        """
+        遍历目录树，仅列出mtime变化的目录
+        :return: 重新列出的目录数
+        """
+        listed = 0
+        stack = [self._root]
+        while stack and not self._stopped.is_set():
+            dir_path = stack.pop()
+            record = self._dirs.get(dir_path)
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            if record and record[0] == mtime and not full:
+                stack.extend(os.path.join(dir_path, name) for name in record[2])
+                continue
+            files, subdirs = set(), set()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.add(entry.name)
+                            else:
+                                files.add(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            listed += 1
+            self._dirs[dir_path] = (mtime, files, subdirs)
+            if record:
+                for name in record[2] - subdirs:
+                    self.__forget(os.path.join(dir_path, name))
+            if emit:
+                for name in files - (record[1] if record else set()):
+                    self._handler.on_created(FileCreatedEvent(os.path.join(dir_path, name)))
+            stack.extend(os.path.join(dir_path, name) for name in subdirs)
+        return listed
+
+    def __forget(self, dir_path: str):
+        """
+        移除已消失目录及其子目录的记录
+        """
+        prefix = dir_path + os.sep
+        for path in [p for p in self._dirs if p == dir_path or p.startswith(prefix)]:
+            self._dirs.pop(path, None)
+
+
+class MonitorObserver:
+    """
+    监控器选择：本地文件系统使用系统原生监控（inotify），网络共享及FUSE挂载使用目录mtime轮询
+    """
+
+    # 需要轮询的文件系统类型，fuse.* 均视为远程挂载
+    REMOTE_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "9p", "afs", "ceph",
+                       "glusterfs", "davfs", "sshfs", "fuse"}
+
+    @staticmethod
+    def fs_type(path: str) -> Optional[str]:
+        """
+        获取路径所在挂载点的文件系统类型
+        """
+        try:
+            real_path = os.path.realpath(path)
+            matched, fs_type = "", None
+            with open("/proc/mounts", "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 3:
+                        continue
+                    mount_point = parts[1].replace("\\040", " ")
+                    if (real_path == mount_point
+                        or real_path.startswith(mount_point.rstrip("/") + "/")) \
+                            and len(mount_point) >= len(matched):
+                        matched, fs_type = mount_point, parts[2]
+            return fs_type
+        except Exception as e:
+            logger.debug(f"获取 {path} 文件系统类型失败：{str(e)}")
+            return None
+
+    @classmethod
+    def is_remote(cls, path: str) -> bool:
+        """
+        是否网络共享或FUSE挂载
+        """
+        fs_type = cls.fs_type(path)
+        if not fs_type:
+            return False
+        return fs_type in cls.REMOTE_FS_TYPES or (fs_type.startswith("fuse.") and fs_type != "fuseblk")
+
+    @staticmethod
+    def __inotify_watch_count(observer) -> Optional[int]:
+        """
+        原生监控的watch数，取不到时返回None
+        """
+        try:
+            count = 0
+            for emitter in observer.emitters:
+                count += len(emitter._inotify._inotify._wd_for_path)
+            return count
+        except Exception:
+            return None
+
+    @classmethod
+    def start(cls, path: str, handler: FileSystemEventHandler, mode: str = "auto", interval: float = 10):
+        """
+        启动目录监控
+        :param path: 监控目录
+        :param handler: 事件处理类
+        :param mode: fast 原生监控 / compatibility 轮询 / auto 按文件系统自动选择
+        :param interval: 轮询间隔（秒）
+        :return: 已启动的监控器，需调用 stop/join 停止
+        """
+        if mode == "compatibility" or (mode == "auto" and cls.is_remote(path)):
+            return cls.__start_polling(path, handler, interval)
+        observer = None
+        try:
+            start = time.time()
+            observer = Observer(timeout=10)
+            observer.schedule(handler, path=path, recursive=True)
+            observer.daemon = True
+            observer.start()
+            watches = cls.__inotify_watch_count(observer)
+            logger.info(f"{path} 使用原生监控（{cls.fs_type(path) or '未知文件系统'}），"
+                        f"监控数 {watches if watches is not None else '未知'}，"
+                        f"启动耗时 {time.time() - start:.2f} 秒")
+            return observer
+        except Exception as e:
+            if observer:
+                try:
+                    observer.stop()
+                except Exception:
+                    pass
+            err_msg = str(e)
+            if "inotify" in err_msg and "reached" in err_msg:
+                logger.warn(f"{path} 原生监控数已达上限：{err_msg}，改用轮询，可在宿主机上（不是docker容器内）执行以下命令后重启："
+                            + """
+                            echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
+                            echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
+                            sudo sysctl -p
+                            """)
+            else:
+                logger.warn(f"{path} 原生监控启动失败：{err_msg}，改用轮询")
+            return cls.__start_polling(path, handler, interval)
+
+    @classmethod
+    def __start_polling(cls, path: str, handler: FileSystemEventHandler, interval: float):
+        # 初始扫描在轮询线程中进行，不阻塞插件启动
+        poller = DirMtimePoller(path=path, handler=handler, interval=interval,
+                                desc=cls.fs_type(path) or "未知文件系统")
+        poller.start()
+        return poller
+
+
 class FileMonitorHandler(FileSystemEventHandler):
     """
     目录监控响应类
@@ -57,7 +807,7 @@ class CloudStrmCompanion(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/cloudcompanion.png"
     # 插件版本
-    plugin_version = "1.3.4"
+    plugin_version = "1.4.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -91,11 +841,20 @@ class CloudStrmCompanion(_PluginBase):
     _rmt_mediaext = None
     _other_mediaext = None
     _interval: int = 10
+    _scan_workers: int = 4
+    # 监控事件静默窗口（秒）
+    _event_delay: int = 3
+    # 通知Emby刷新合并间隔（秒）及单次最多路径数
+    _refresh_window: int = 5
+    _refresh_batch: int = 100
     _mediaservers = None
     mediaserver_helper = None
     _emby_paths = {}
     _path_replacements = {}  # 新增：路径替换规则属性
     _cloud_files_json = "cloud_files.json"
+    _manifest_db = "strm_manifest.db"
+    # strm生成清单
+    _manifest: Optional[StrmManifest] = None
     _headers = {
         "User-Agent": "Mozilla/5.0 (Macintosh; Intel Mac OS X 11_2_0) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/88.0.4324.192 Safari/537.36",
         "Cookie": "",
@@ -103,6 +862,23 @@ class CloudStrmCompanion(_PluginBase):
 
     # 定时器
     _scheduler: Optional[BackgroundScheduler] = None
+    # 文件处理线程池
+    _executor: Optional[ThreadPoolExecutor] = None
+    # 监控事件防抖队列
+    _debouncer: Optional[EventDebouncer] = None
+    # 线程池排队上限
+    _pending: Optional[threading.BoundedSemaphore] = None
+    # 目标目录锁，按目录哈希分段，数量固定
+    _dir_locks: List[threading.Lock] = [threading.Lock() for _ in range(64)]
+    # 源目录文件列表缓存
+    _listing_cache: Optional[DirListingCache] = None
+    # 文件路径分类器
+    _classifier: Optional[PathClassifier] = None
+    # 待通知Emby刷新的路径
+    _refresh_paths: List[str] = []
+    _refresh_lock = threading.Lock()
+    # Emby媒体服务器缓存
+    _emby_servers: Optional[dict] = None
     # 退出事件
     _event = threading.Event()
 
@@ -114,12 +890,22 @@ class CloudStrmCompanion(_PluginBase):
         self._category_conf = {}
         self._path_replacements = {}  # 新增：清空路径替换规则
         self._cloud_files_json = os.path.join(self.get_data_path(), self._cloud_files_json)
+        self._manifest_db = os.path.join(self.get_data_path(), self._manifest_db)
         self.mediaserver_helper = MediaServerHelper()
+        self._listing_cache = DirListingCache(ttl=30)
 
         if config:
             self._enabled = config.get("enabled")
             self._onlyonce = config.get("onlyonce")
             self._interval = config.get("interval") or 10
+            try:
+                self._scan_workers = max(1, int(config.get("scan_workers") or 4))
+            except (ValueError, TypeError):
+                logger.warn(f"处理线程数配置错误：{config.get('scan_workers')}，使用默认值 4")
+                self._scan_workers = 4
+            self._event_delay = int(config.get("event_delay") or 3)
+            self._refresh_window = int(config.get("refresh_window") or 5)
+            self._refresh_batch = int(config.get("refresh_batch") or 100)
             self._monitor = config.get("monitor")
             self._cover = config.get("cover")
             self._copy_files = config.get("copy_files")
@@ -142,18 +928,36 @@ class CloudStrmCompanion(_PluginBase):
             if config.get("emby_path"):
                 for path in str(config.get("emby_path")).split(","):
                     self._emby_paths[path.split(":")[0]] = path.split(":")[1]
+        # 预编译扩展名及过滤规则
+        self._classifier = PathClassifier(media_exts=self._rmt_mediaext, other_exts=self._other_mediaext)
 
-        # 停止现有任务
+        # 停止现有任务，待通知的Emby刷新在停止时发送
         self.stop_service()
+        self._refresh_paths = []
 
         if self._enabled or self._onlyonce:
             # 定时服务
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+            # 全量执行线程池
+            self._executor = ThreadPoolExecutor(max_workers=self._scan_workers,
+                                                thread_name_prefix="cloudstrm")
+            self._pending = threading.BoundedSemaphore(self._scan_workers * 4)
+            # 增量执行清单
+            try:
+                self._manifest = StrmManifest(self._manifest_db)
+            except Exception as e:
+                logger.error(f"打开strm生成清单失败：{str(e)}")
+                self._manifest = None
 
             if self._notify:
                 # 追加入库消息统一发送服务
                 self._scheduler.add_job(self.send_msg, trigger='interval', seconds=15)
 
+            if self._refresh_emby and self._mediaservers:
+                # 合并通知Emby刷新
+                self._scheduler.add_job(self.flush_emby_refresh, trigger='interval',
+                                        seconds=self._refresh_window)
+
             # 读取目录配置
             monitor_confs = self._monitor_confs.split("\n")
             if not monitor_confs:
@@ -200,12 +1004,16 @@ class CloudStrmCompanion(_PluginBase):
                 if not monitor:
                     try:
                         if self._monitor:
-                            # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
-                            observer = PollingObserver(timeout=10)
+                            if not self._debouncer:
+                                # 监控事件合并后分发，实时监控不与全量执行抢占线程池
+                                self._debouncer = EventDebouncer(
+                                    handler=lambda path, mon: self.__handle_file(event_path=path, mon_path=mon),
+                                    delay=self._event_delay, workers=self._scan_workers, name="Strm生成监控事件")
+                            # 本地目录使用原生监控，网络共享及FUSE挂载按目录mtime轮询
+                            observer = MonitorObserver.start(path=local_dir,
+                                                             handler=FileMonitorHandler(local_dir, self),
+                                                             mode="auto")
                             self._observer.append(observer)
-                            observer.schedule(FileMonitorHandler(local_dir, self), path=local_dir, recursive=True)
-                            observer.daemon = True
-                            observer.start()
                             logger.info(f"{local_dir} 的Strm生成实时监控服务启动")
                     except Exception as e:
                         err_msg = str(e)
@@ -241,26 +1049,144 @@ class CloudStrmCompanion(_PluginBase):
         """
         全量执行
         """
-        logger.info("开始全量执行")
+        logger.info(f"开始全量执行，处理线程数 {self._scan_workers}")
+        progress = ScanProgress()
+        # 变化统计
+        added, changed, unchanged, removed = 0, 0, 0, 0
         for mon_path in self._strm_dir_conf.keys():
+            # 上次执行记录，遍历过程中移除仍存在的文件，剩余即为已删除的源文件
+            records = self._manifest.load(mon_path) if self._manifest else {}
+            file_count = 0
             # 遍历目录下所有文件
             for root, dirs, files in os.walk(mon_path):
+                if self._event.is_set():
+                    logger.info("全量执行已停止")
+                    break
                 # 如果遇到名为'extrafanart'的文件夹，则跳过处理该文件夹，继续处理其他文件夹
                 if "extrafanart" in dirs:
                     dirs.remove("extrafanart")
+                # 复用遍历结果，同名文件筛选无需再次列举目录
+                self._listing_cache.put(root, files)
                 # 处理文件
                 for file in files:
                     source_file = os.path.join(root, file)
                     # 回收站及隐藏的文件不处理
-                    if (source_file.find("/@Recycle") != -1
-                            or source_file.find("/#recycle") != -1
-                            or source_file.find("/.") != -1
-                            or source_file.find("/@eaDir") != -1):
+                    if self._classifier.is_ignored(source_file):
                         logger.info(f"{source_file} 是回收站或隐藏的文件，跳过处理")
                         continue
 
-                    self.__handle_file(event_path=source_file, mon_path=mon_path)
-        logger.info("全量执行完成")
+                    file_count += 1
+                    record = records.pop(source_file, None)
+                    if record:
+                        # 源文件及strm内容未变化，跳过处理
+                        if not self._cover and self.__is_unchanged(record=record,
+                                                                    source_file=source_file,
+                                                                    mon_path=mon_path):
+                            unchanged += 1
+                            continue
+                        changed += 1
+                    else:
+                        added += 1
+
+                    # 已有记录的文件发生变化，覆盖生成
+                    self.__submit_file(event_path=source_file, mon_path=mon_path, progress=progress,
+                                       cover=bool(record))
+
+            # 清理源文件已删除的strm，目录未遍历到文件时（如挂载失效）不清理
+            if records and file_count and not self._event.is_set():
+                removed += self.__remove_vanished(records)
+        # 等待线程池处理完成
+        progress.wait()
+        self.flush_emby_refresh()
+        if self._manifest:
+            self._manifest.commit()
+        logger.info(f"全量执行完成，{progress}，"
+                    f"新增 {added}，变化 {changed}，未变化 {unchanged}，删除 {removed}，"
+                    f"目录列表缓存命中 {self._listing_cache.hits}，列举 {self._listing_cache.misses}")
+
+    def __is_unchanged(self, record: Tuple[int, float, str, Optional[str]], source_file: str, mon_path: str) -> bool:
+        """
+        判断源文件及strm内容与上次执行记录是否一致
+        :param record: 上次执行记录 (大小, 修改时间, 目标文件, strm内容摘要)
+        :param source_file: 源文件路径
+        :param mon_path: 监控目录
+        """
+        size, mtime, target, content_hash = record
+        try:
+            stat = os.stat(source_file)
+        except OSError:
+            return False
+        if stat.st_size != size or stat.st_mtime != mtime:
+            return False
+        # 目标目录配置变化或目标文件被删除时需重新生成
+        if self.__get_target_file(event_path=source_file, mon_path=mon_path) != target:
+            return False
+        if content_hash is None:
+            return True
+        if not os.path.exists(target):
+            return False
+        # strm格式化配置变化时需重新生成
+        return StrmManifest.content_hash(self.__build_strm_content(event_path=source_file,
+                                                                   mon_path=mon_path)) == content_hash
+
+    def __remove_vanished(self, records: Dict[str, Tuple[int, float, str, Optional[str]]]) -> int:
+        """
+        删除源文件已不存在的strm文件
+        :param records: 源文件已不存在的执行记录
+        :return: 删除的strm文件数
+        """
+        count = 0
+        for source_file, (_, _, target, content_hash) in records.items():
+            # 只删除生成的strm文件，复制的非媒体文件保留
+            if content_hash is None or not target:
+                continue
+            try:
+                if Path(target).exists():
+                    Path(target).unlink()
+                    count += 1
+                    logger.info(f"源文件 {source_file} 已删除，删除strm文件 {target}")
+            except Exception as e:
+                logger.error(f"删除strm文件 {target} 失败：{str(e)}")
+        self._manifest.remove(list(records.keys()))
+        return count
+
+    def __submit_file(self, event_path: str, mon_path: str, progress: Optional[ScanProgress] = None,
+                      cover: bool = False):
+        """
+        提交文件到线程池处理，线程池不可用时同步处理
+        :param event_path: 事件文件路径
+        :param mon_path: 监控目录
+        :param progress: 全量执行进度
+        :param cover: 是否覆盖已存在的strm文件
+        """
+        if progress:
+            progress.add()
+
+        def _done(_=None):
+            if progress:
+                progress.finish()
+
+        if not self._executor:
+            self.__handle_file(event_path=event_path, mon_path=mon_path, cover=cover)
+            _done()
+            return
+
+        # 限制排队数量，避免全量执行时堆积过多任务
+        self._pending.acquire()
+        try:
+            future = self._executor.submit(self.__handle_file, event_path, mon_path, cover)
+        except RuntimeError:
+            # 线程池已关闭
+            self._pending.release()
+            _done()
+            return
+        future.add_done_callback(lambda f: (self._pending.release(), _done(f)))
+
+    def __get_dir_lock(self, dir_path: str) -> threading.Lock:
+        """
+        获取目标目录锁，同一目录串行处理，不同目录并发处理
+        """
+        return self._dir_locks[hash(dir_path) % len(self._dir_locks)]
 
     @eventmanager.register(EventType.PluginAction)
     def strm_one(self, event: Event = None):
@@ -285,6 +1211,7 @@ class CloudStrmCompanion(_PluginBase):
                 return
 
             # 处理单文件
+            self._listing_cache.invalidate(file_path)
             self.__handle_file(event_path=file_path, mon_path=mon_path)
 
     def event_handler(self, event, mon_path: str, text: str, event_path: str):
@@ -301,76 +1228,110 @@ class CloudStrmCompanion(_PluginBase):
 
             # 文件发生变化
             logger.debug("监控到文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            self._listing_cache.invalidate(event_path)
+            if self._debouncer:
+                self._debouncer.put(event_path=event_path, mon_path=mon_path, text=text)
+            else:
+                self.__submit_file(event_path=event_path, mon_path=mon_path)
 
-    def __handle_file(self, event_path: str, mon_path: str):
+    def __handle_file(self, event_path: str, mon_path: str, cover: bool = False):
         """
         同步一个文件
         :param event_path: 事件文件路径
         :param mon_path: 监控目录
+        :param cover: 是否覆盖已存在的strm文件
         """
         try:
-            if not Path(event_path).exists():
+            if self._event.is_set():
                 return
-            # 全程加锁
-            with lock:
-                # 云盘路径
-                cloud_dir = self._cloud_dir_conf.get(mon_path)
-                # 本地strm路径
-                strm_dir = self._strm_dir_conf.get(mon_path)
-                # 格式化配置
-                format_str = self._format_conf.get(mon_path)
-                # 本地strm路径
-                target_file = str(event_path).replace(mon_path, strm_dir)
-                # 云盘文件路径
-                cloud_file = str(event_path).replace(mon_path, cloud_dir)
-
+            try:
+                stat = os.stat(event_path)
+            except FileNotFoundError:
+                return
+            # 本地strm路径
+            strm_dir = self._strm_dir_conf.get(mon_path)
+            # 本地strm路径
+            target_file = str(event_path).replace(mon_path, strm_dir)
+            # 按目标目录加锁
+            with self.__get_dir_lock(str(Path(target_file).parent)):
                 # 只处理媒体文件
-                if Path(event_path).suffix.lower() in [ext.strip() for ext in
-                                                       self._rmt_mediaext.split(",")]:
+                if self._classifier.is_media(event_path):
                     # 生成strm文件内容
-                    strm_content = self.__format_content(format_str=format_str,
-                                                         local_file=event_path,
-                                                         cloud_file=str(cloud_file),
-                                                         uriencode=self._uriencode)
+                    strm_content = self.__build_strm_content(event_path=event_path, mon_path=mon_path)
                     # 生成strm文件
-                    self.__create_strm_file(strm_file=target_file,
-                                            strm_content=strm_content)
+                    strm_file = self.__get_target_file(event_path=event_path, mon_path=mon_path)
+                    if self.__create_strm_file(strm_file=strm_file,
+                                               strm_content=strm_content,
+                                               cover=cover) and self._manifest:
+                        self._manifest.upsert(source=event_path, mon_path=mon_path,
+                                              size=stat.st_size, mtime=stat.st_mtime, target=strm_file,
+                                              content_hash=StrmManifest.content_hash(strm_content))
 
                     # nfo、jpg等同名文件
-                    pattern = Path(event_path).stem.replace('[', '?').replace(']', '?')
-                    files = list(Path(event_path).parent.glob(f"{pattern}.*"))
-                    logger.debug(f"筛选到 {Path(event_path).parent} 下同名文件 {pattern} {files}")
+                    files = self._listing_cache.same_stem_files(event_path)
+                    logger.debug(f"筛选到 {Path(event_path).parent} 下同名文件 {Path(event_path).stem} {files}")
                     for file in files:
                         target_file = str(file).replace(mon_path, strm_dir)
                         self.__handle_other_files(event_path=str(file), target_file=target_file)
 
                     # thumb图片
                     thumb_file = Path(event_path).parent / (Path(event_path).stem + "-thumb.jpg")
-                    if thumb_file.exists():
+                    if self._listing_cache.exists(str(thumb_file)):
                         target_file = str(thumb_file).replace(mon_path, strm_dir)
                         self.__handle_other_files(event_path=str(thumb_file), target_file=target_file)
                 else:
                     self.__handle_other_files(event_path=event_path, target_file=target_file)
+                    if self._manifest:
+                        self._manifest.upsert(source=event_path, mon_path=mon_path,
+                                              size=stat.st_size, mtime=stat.st_mtime, target=target_file)
         except Exception as e:
             logger.error("目录监控发生错误：%s - %s" % (str(e), traceback.format_exc()))
 
+    def __get_target_file(self, event_path: str, mon_path: str) -> str:
+        """
+        源文件对应的目标文件，媒体文件为strm文件，其它文件为复制后的文件
+        :param event_path: 源文件路径
+        :param mon_path: 监控目录
+        """
+        target_file = str(event_path).replace(mon_path, self._strm_dir_conf.get(mon_path))
+        if not self._classifier.is_media(event_path):
+            return target_file
+        return os.path.join(Path(target_file).parent, f"{os.path.splitext(Path(target_file).name)[0]}.strm")
+
+    def __build_strm_content(self, event_path: str, mon_path: str) -> Optional[str]:
+        """
+        生成strm文件内容（含自定义路径替换）
+        :param event_path: 源文件路径
+        :param mon_path: 监控目录
+        """
+        # 云盘文件路径
+        cloud_file = str(event_path).replace(mon_path, self._cloud_dir_conf.get(mon_path))
+        strm_content = self.__format_content(format_str=self._format_conf.get(mon_path),
+                                             local_file=event_path,
+                                             cloud_file=str(cloud_file),
+                                             uriencode=self._uriencode)
+        if not strm_content:
+            return strm_content
+        # 应用自定义路径替换规则
+        for source, target in self._path_replacements.items():
+            if source in strm_content:
+                strm_content = strm_content.replace(source, target)
+                logger.debug(f"应用路径替换规则: {source} -> {target}")
+        return strm_content
+
     def __handle_other_files(self, event_path: str, target_file: str):
         """
         处理非媒体文件
         :param event_path: 事件文件路径
         """
         # 复制非媒体文件
-        if self._copy_files and self._other_mediaext and Path(event_path).suffix.lower() in [ext.strip() for
-                                                                                             ext in
-                                                                                             self._other_mediaext.split(
-                                                                                                 ",")]:
+        if self._copy_files and self._classifier.is_other(event_path):
             os.makedirs(os.path.dirname(target_file), exist_ok=True)
             shutil.copy2(str(event_path), target_file)
             logger.info(f"复制非媒体文件 {str(event_path)} 到 {target_file}")
 
         # 复制字幕文件（独立于copy_files检查）
-        if self._copy_subtitles and Path(event_path).suffix.lower() in ['.srt', '.ass', '.ssa', '.sub']:
+        if self._copy_subtitles and self._classifier.is_subtitle(event_path):
             os.makedirs(os.path.dirname(target_file), exist_ok=True)
             shutil.copy2(str(event_path), target_file)
             logger.info(f"复制字幕文件 {str(event_path)} 到 {target_file}")
@@ -402,7 +1363,7 @@ class CloudStrmCompanion(_PluginBase):
         else:
             return None
 
-    def __create_strm_file(self, strm_file: str, strm_content: str):
+    def __create_strm_file(self, strm_file: str, strm_content: str, cover: bool = False):
 
         """
         生成strm文件
@@ -414,21 +1375,17 @@ class CloudStrmCompanion(_PluginBase):
             # 文件
             if not Path(strm_file).parent.exists():
                 logger.info(f"创建目标文件夹 {Path(strm_file).parent}")
-                os.makedirs(Path(strm_file).parent)
+                os.makedirs(Path(strm_file).parent, exist_ok=True)
 
             # 构造.strm文件路径
             strm_file = os.path.join(Path(strm_file).parent, f"{os.path.splitext(Path(strm_file).name)[0]}.strm")
 
             # 媒体文件
-            if Path(strm_file).exists() and not self._cover:
+            if Path(strm_file).exists() and not (self._cover or cover):
                 logger.info(f"目标文件 {strm_file} 已存在")
-                return
-            # 新增：应用自定义路径替换规则
-            for source, target in self._path_replacements.items():
-                if source in strm_content:
-                    strm_content = strm_content.replace(source, target)
-                    logger.debug(f"应用路径替换规则: {source} -> {target}")
-
+                # 已存在文件内容一致时才视为生成成功，记录到执行清单
+                with open(strm_file, 'r', encoding='utf-8', errors='ignore') as f:
+                    return f.read() == strm_content
             # 写入.strm文件
             with open(strm_file, 'w', encoding='utf-8') as f:
                 f.write(strm_content)
@@ -452,79 +1409,98 @@ class CloudStrmCompanion(_PluginBase):
                     file_meta.tmdbid = tmdbid
 
                 key = f"{file_meta.cn_name} ({file_meta.year}){f' {file_meta.season}' if file_meta.season else ''}"
-                media_list = self._medias.get(key) or {}
-                if media_list:
-                    episodes = media_list.get("episodes") or []
-                    if file_meta.begin_episode:
-                        if episodes:
-                            if int(file_meta.begin_episode) not in episodes:
-                                episodes.append(int(file_meta.begin_episode))
-                        else:
-                            episodes = [int(file_meta.begin_episode)]
-                    media_list = {
-                        "episodes": episodes,
-                        "file_meta": file_meta,
-                        "type": "tv" if file_meta.season else "movie",
-                        "time": datetime.now()
-                    }
-                else:
-                    media_list = {
-                        "episodes": [int(file_meta.begin_episode)] if file_meta.begin_episode else [],
-                        "file_meta": file_meta,
-                        "type": "tv" if file_meta.season else "movie",
-                        "time": datetime.now()
-                    }
-                self._medias[key] = media_list
+                with lock:
+                    media_list = self._medias.get(key) or {}
+                    if media_list:
+                        episodes = media_list.get("episodes") or []
+                        if file_meta.begin_episode:
+                            if episodes:
+                                if int(file_meta.begin_episode) not in episodes:
+                                    episodes.append(int(file_meta.begin_episode))
+                            else:
+                                episodes = [int(file_meta.begin_episode)]
+                        media_list = {
+                            "episodes": episodes,
+                            "file_meta": file_meta,
+                            "type": "tv" if file_meta.season else "movie",
+                            "time": datetime.now()
+                        }
+                    else:
+                        media_list = {
+                            "episodes": [int(file_meta.begin_episode)] if file_meta.begin_episode else [],
+                            "file_meta": file_meta,
+                            "type": "tv" if file_meta.season else "movie",
+                            "time": datetime.now()
+                        }
+                    self._medias[key] = media_list
 
             # 通知emby刷新
             if self._refresh_emby and self._mediaservers:
-                time.sleep(0.1)
-                self.__refresh_emby_file(strm_file)
+                self.__queue_emby_refresh(strm_file)
             return True
         except Exception as e:
             logger.error(f"创建strm文件失败 {strm_file} -> {str(e)}")
         return False
 
-    def __refresh_emby_file(self, strm_file: str):
+    def __queue_emby_refresh(self, strm_file: str):
+        """
+        登记待通知Emby刷新的文件，达到单次上限时立即通知
+        """
+        with self._refresh_lock:
+            self._refresh_paths.append(self.__get_path(paths=self._emby_paths, file_path=strm_file))
+            full = len(self._refresh_paths) >= self._refresh_batch
+        if full:
+            self.flush_emby_refresh()
+
+    def flush_emby_refresh(self):
         """
-        通知emby刷新文件
+        合并通知Emby刷新增量文件，每个媒体服务器一次请求
         """
-        emby_servers = self.mediaserver_helper.get_services(name_filters=self._mediaservers, type_filter="emby")
+        with self._refresh_lock:
+            if not self._refresh_paths:
+                return
+            strm_files = list(dict.fromkeys(self._refresh_paths))
+            self._refresh_paths = []
+
+        emby_servers = self.__get_emby_servers()
         if not emby_servers:
             logger.error("未配置Emby媒体服务器")
             return
 
-        strm_file = self.__get_path(paths=self._emby_paths, file_path=strm_file)
         for emby_name, emby_server in emby_servers.items():
-            emby = emby_server.instance
-            self._EMBY_USER = emby_server.instance.get_user()
-            self._EMBY_APIKEY = emby_server.config.config.get("apikey")
-            self._EMBY_HOST = emby_server.config.config.get("host")
-
-            logger.info(f"开始通知媒体服务器 {emby_name} 刷新增量文件 {strm_file}")
+            logger.info(f"开始通知媒体服务器 {emby_name} 刷新 {len(strm_files)} 个增量文件")
             try:
-                res = emby.post_data(
+                res = emby_server.instance.post_data(
                     url=f'[HOST]emby/Library/Media/Updated?api_key=[APIKEY]&reqformat=json',
                     data=json.dumps({
                         "Updates": [
                             {
                                 "Path": strm_file,
                                 "UpdateType": "Created",
-                            }
+                            } for strm_file in strm_files
                         ]
                     }),
                     headers={
                         "Content-Type": "application/json"
                     }
                 )
-                if res and res.status_code in [200, 204]:
-                    return True
-                else:
-                    logger.error(f"通知媒体服务器 {emby_name} 刷新新增文件 {strm_file} 失败，错误码：{res.status_code}")
-                    return False
+                if not res or res.status_code not in [200, 204]:
+                    logger.error(f"通知媒体服务器 {emby_name} 刷新增量文件失败，"
+                                 f"错误码：{res.status_code if res is not None else '无响应'}")
+                    # 服务器可能已变更，下次重新获取
+                    self._emby_servers = None
             except Exception as err:
-                logger.error(f"通知媒体服务器刷新新增文件失败：{str(err)}")
-            return False
+                logger.error(f"通知媒体服务器 {emby_name} 刷新增量文件失败：{str(err)}")
+                self._emby_servers = None
+
+    def __get_emby_servers(self) -> Optional[dict]:
+        """
+        获取Emby媒体服务器，结果缓存复用
+        """
+        if not self._emby_servers:
+            self._emby_servers = self.mediaserver_helper.get_services(name_filters=self._mediaservers,
+                                                                      type_filter="emby")
+        return self._emby_servers
 
     def __get_path(self, paths, file_path: str):
         """
@@ -797,7 +1773,8 @@ class CloudStrmCompanion(_PluginBase):
                                                image=(
                                                    mediainfo.backdrop_path if mediainfo.backdrop_path else mediainfo.poster_path) if mediainfo else None)
                 # 发送完消息，移出key
-                del self._medias[medis_title_year_season]
+                with lock:
+                    self._medias.pop(medis_title_year_season, None)
                 continue
 
     def send_transfer_message(self, msg_title, file_count, image):
@@ -822,6 +1799,10 @@ class CloudStrmCompanion(_PluginBase):
             "notify": self._notify,
             "monitor": self._monitor,
             "interval": self._interval,
+            "scan_workers": self._scan_workers,
+            "event_delay": self._event_delay,
+            "refresh_window": self._refresh_window,
+            "refresh_batch": self._refresh_batch,
             "copy_files": self._copy_files,
             "copy_subtitles": self._copy_subtitles,
             "refresh_emby": self._refresh_emby,
@@ -1088,6 +2069,79 @@ class CloudStrmCompanion(_PluginBase):
                                         }
                                     }
                                 ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'scan_workers',
+                                            'label': '处理线程数',
+                                            'placeholder': '4'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'refresh_window',
+                                            'label': '刷新媒体库合并间隔（秒）',
+                                            'placeholder': '5'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'refresh_batch',
+                                            'label': '刷新媒体库单次文件数',
+                                            'placeholder': '100'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'event_delay',
+                                            'label': '监控事件静默时间（秒）',
+                                            'placeholder': '3'
+                                        }
+                                    }
+                                ]
                             }
                         ]
                     },
@@ -1311,6 +2365,10 @@ class CloudStrmCompanion(_PluginBase):
             "monitor_confs": "",
             "emby_path": "",
             "interval": 10,
+            "scan_workers": 4,
+            "event_delay": 3,
+            "refresh_window": 5,
+            "refresh_batch": 100,
             "url": "",
             "other_mediaext": ".nfo, .jpg, .png, .json",
             "rmt_mediaext": ".mp4, .mkv, .ts, .iso,.rmvb, .avi, .mov, .mpeg,.mpg, .wmv, .3gp, .asf, .m4v, .flv, .m2ts, .strm,.tp, .f4v",
@@ -1324,6 +2382,13 @@ class CloudStrmCompanion(_PluginBase):
         """
         退出插件
         """
+        # 通知剩余的Emby刷新
+        if self._refresh_paths:
+            try:
+                self.flush_emby_refresh()
+            except Exception as e:
+                logger.error(f"通知Emby刷新失败：{str(e)}")
+        self._emby_servers = None
         if self._observer:
             for observer in self._observer:
                 try:
@@ -1332,6 +2397,9 @@ class CloudStrmCompanion(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._debouncer:
+            self._debouncer.stop()
+            self._debouncer = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
@@ -1339,3 +2407,14 @@ class CloudStrmCompanion(_PluginBase):
                 self._scheduler.shutdown()
                 self._event.clear()
             self._scheduler = None
+        if self._executor:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        if self._manifest:
+            try:
+                self._manifest.close()
+            except Exception as e:
+                logger.debug(f"关闭strm生成清单失败：{str(e)}")
+            self._manifest = None
+        if self._listing_cache:
+            self._listing_cache.clear()
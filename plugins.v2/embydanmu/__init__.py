@@ -1,17 +1,402 @@
+import itertools
 import json
+import os
 import re
+import threading
 import time
+from collections import deque
 from pathlib import Path
-from typing import List, Tuple, Dict, Any
+from typing import List, Tuple, Dict, Any, Optional, Callable
 
 from app.core.event import eventmanager, Event
 from app.helper.mediaserver import MediaServerHelper
 from app.log import logger
 from app.plugins import _PluginBase
-from app.schemas.types import EventType
+from app.schemas.types import EventType, MessageChannel
 from app.utils.http import RequestUtils
 
 
+class EmbyLogTail:
+    """
+    Emby日志增量读取
+    记录已读取的字节偏移，通过HTTP Range只获取新增内容，服务端不支持Range时回退为完整下载后截取；
+    新增行保存在有限长度的内存窗口中，供所有等待中的弹幕检查共用
+    """
+
+    # 首次读取时只获取日志末尾的字节数
+    INITIAL_BYTES = 64 * 1024
+    # 两次读取的最小间隔（秒），间隔内的检查直接使用内存窗口
+    MIN_INTERVAL = 2
+
+    def __init__(self, max_lines: int = 2000):
+        self._lock = threading.Lock()
+        self._lines: deque = deque(maxlen=max_lines)
+        # 累计读取的行数，用作行序号
+        self._seq = 0
+        self._url = None
+        self._offset = None
+        self._partial = b""
+        self._last_fetch = 0.0
+        self.fetched_bytes = 0
+
+    def reset(self, url: Optional[str] = None):
+        """
+        切换日志地址或日志轮转时清空状态
+        """
+        self._url = url
+        self._offset = None
+        self._partial = b""
+        self._last_fetch = 0.0
+        self._lines.clear()
+
+    def mark(self, url: str) -> int:
+        """
+        读取到最新位置并返回当前行序号，之后的匹配只检查该序号之后的行
+        """
+        self.refresh(url, force=True)
+        with self._lock:
+            return self._seq
+
+    def search(self, url: str, patterns: List[re.Pattern], since: Optional[int] = None, last: int = 200) -> List[bool]:
+        """
+        在内存窗口中匹配
+        :param url: 日志地址
+        :param patterns: 预编译的正则
+        :param since: 只匹配该行序号之后的行，为空时匹配最新 last 行
+        :return: 每个正则是否匹配
+        """
+        self.refresh(url)
+        with self._lock:
+            first_seq = self._seq - len(self._lines)
+            skip = max(since - first_seq, 0) if since is not None else max(len(self._lines) - last, 0)
+            lines = list(itertools.islice(self._lines, skip, None))
+        found = [False] * len(patterns)
+        for line in lines:
+            for i, pattern in enumerate(patterns):
+                if not found[i] and pattern.search(line):
+                    found[i] = True
+        return found
+
+    def refresh(self, url: str, force: bool = False):
+        """
+        获取日志新增内容
+        """
+        with self._lock:
+            if url != self._url:
+                self.reset(url)
+            now = time.monotonic()
+            if not force and now - self._last_fetch < self.MIN_INTERVAL:
+                return
+            self._last_fetch = now
+            try:
+                self.__fetch()
+            except Exception as e:
+                logger.error(f"读取Emby日志出错：{str(e)}")
+
+    def __fetch(self, retry: bool = True):
+        if self._offset is None:
+            range_header = f"bytes=-{self.INITIAL_BYTES}"
+        else:
+            range_header = f"bytes={self._offset}-"
+        res = RequestUtils(headers={"Range": range_header}).get_res(self._url)
+        if res is None:
+            logger.info(f"获取Emby日志失败，无法连接Emby！")
+            return
+        with res:
+            total = self.__total_size(res.headers.get("Content-Range"))
+            if res.status_code == 416:
+                # 没有新内容，或日志已轮转变短
+                if total is not None and self._offset is not None and total < self._offset and retry:
+                    self.reset(self._url)
+                    self.__fetch(retry=False)
+                return
+            if res.status_code == 206:
+                data = res.content
+                if self._offset is None:
+                    # 首次读取从日志中间开始，丢弃不完整的第一行
+                    self._offset = total if total is not None else len(data)
+                    data = data[data.find(b"\n") + 1:] if total is None or total > len(data) else data
+                else:
+                    self._offset += len(data)
+            elif res.status_code == 200:
+                # 服务端不支持Range，完整下载后截取新增部分
+                data = res.content
+                if self._offset is None or len(data) < self._offset:
+                    self._partial = b""
+                    self._offset = len(data)
+                    data = data[-self.INITIAL_BYTES:]
+                    data = data[data.find(b"\n") + 1:] if self._offset > len(data) else data
+                else:
+                    data, self._offset = data[self._offset:], len(data)
+            else:
+                logger.info(f"获取Emby日志失败，状态码：{res.status_code}")
+                return
+        self.fetched_bytes += len(data)
+        self.__append(data)
+
+    def __append(self, data: bytes):
+        """
+        按行加入窗口，末尾不完整的行留到下次拼接
+        """
+        if not data:
+            return
+        data = self._partial + data
+        end = data.rfind(b"\n")
+        if end < 0:
+            self._partial = data
+            return
+        self._partial = data[end + 1:]
+        for line in data[:end].decode("utf-8", errors="replace").split("\n"):
+            self._lines.append(line)
+            self._seq += 1
+
+    @staticmethod
+    def __total_size(content_range: Optional[str]) -> Optional[int]:
+        """
+        解析 Content-Range: bytes 0-99/1234 中的总长度
+        """
+        if not content_range or "/" not in content_range:
+            return None
+        total = content_range.rsplit("/", 1)[-1].strip()
+        return int(total) if total.isdigit() else None
+
+
+class DanmuJob:
+    """
+    弹幕下载任务，记录需要等待的目录及应有的弹幕文件
+    """
+
+    def __init__(self, key: str, kind: str, emby_name: str, title: str, dirs: List[str],
+                 expected: Optional[List[str]], total: int, name: str = None, year: Any = None,
+                 log_url: str = None, sources: List[str] = None, channel: Any = None, user: Any = None,
+                 library_id: str = None, library_name: str = None):
+        """
+        :param key: 媒体ID（季或电影）
+        :param kind: season / movie
+        :param dirs: 弹幕文件所在目录（MoviePilot路径）
+        :param expected: 应有的弹幕文件名（不含扩展名），为空时只按数量判断
+        :param total: 应有的弹幕文件数
+        :param library_id: 所属媒体库ID，任务结束后按需重新禁用Danmu插件
+        """
+        self.key = key
+        self.kind = kind
+        self.emby_name = emby_name
+        self.title = title
+        self.dirs = dirs
+        self.expected = set(expected) if expected else None
+        self.total = total
+        self.name = name
+        self.year = year
+        self.log_url = log_url
+        self.sources = sources or []
+        self.channel = channel
+        self.user = user
+        self.library_id = library_id
+        self.library_name = library_name
+        # 通知下载时的日志行序号
+        self.since: Optional[int] = None
+        self.found: set = set()
+        self.state = "pending"
+        self.started = time.monotonic()
+        self.last_progress = self.started
+
+    @property
+    def complete(self) -> bool:
+        return len(self.found) >= self.total
+
+    def update(self, danmu_stems: set) -> bool:
+        """
+        更新已下载的弹幕文件
+        :return: 是否有新增
+        """
+        found = danmu_stems & self.expected if self.expected is not None else danmu_stems
+        added = found - self.found
+        if added:
+            self.found |= added
+            self.last_progress = time.monotonic()
+        return bool(added)
+
+    def to_dict(self) -> dict:
+        return {
+            "key": self.key,
+            "kind": self.kind,
+            "emby_name": self.emby_name,
+            "title": self.title,
+            "dirs": self.dirs,
+            "expected": sorted(self.expected) if self.expected is not None else None,
+            "total": self.total,
+            "name": self.name,
+            "year": self.year,
+            "log_url": self.log_url,
+            "sources": self.sources,
+            "channel": getattr(self.channel, "value", self.channel),
+            "user": self.user,
+            "library_id": self.library_id,
+            "library_name": self.library_name,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "DanmuJob":
+        # 日志行序号只在当前进程的日志读取中有效，不恢复，重启后匹配最新日志窗口
+        data = {key: value for key, value in data.items() if key != "since"}
+        return cls(**data)
+
+
+class DanmuTracker:
+    """
+    弹幕下载完成跟踪
+    由一个共享线程轮询所有等待中任务的目录，同一目录每轮只列出一次；
+    多个季/电影同时等待，按已下载文件判断完成，按日志判断全部失败，长时间无新增则结束等待
+    """
+
+    def __init__(self, check_failed: Callable[[DanmuJob], bool], on_done: Callable[[DanmuJob], Any],
+                 on_change: Callable[[List[DanmuJob]], Any] = None, interval: float = 5, idle_rounds: int = 4,
+                 max_active: int = 4):
+        """
+        :param check_failed: 判断任务是否全部匹配失败
+        :param on_done: 任务结束回调
+        :param on_change: 等待中任务变化回调，用于持久化
+        :param interval: 轮询间隔（秒）
+        :param idle_rounds: 连续无新增的轮数，超过后结束等待
+        :param max_active: 同时等待的任务数
+        """
+        self._check_failed = check_failed
+        self._on_done = on_done
+        self._on_change = on_change
+        self._interval = interval
+        self._idle_timeout = interval * idle_rounds
+        self._max_active = max_active
+        self._jobs: Dict[str, DanmuJob] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._thread = threading.Thread(target=self.__loop, name="danmu-tracker", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def list_danmu(dirs: List[str], cache: Dict[str, set] = None) -> set:
+        """
+        列出目录下的弹幕文件名（不含扩展名）
+        """
+        stems = set()
+        for dir_path in dirs:
+            if cache is not None and dir_path in cache:
+                stems |= cache[dir_path]
+                continue
+            dir_stems = set()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        if entry.name.endswith(".xml"):
+                            dir_stems.add(entry.name[:-4])
+            except OSError:
+                pass
+            if cache is not None:
+                cache[dir_path] = dir_stems
+            stems |= dir_stems
+        return stems
+
+    def submit(self, job: DanmuJob, block: bool = True):
+        """
+        加入等待，同时等待的任务数已满时阻塞
+        """
+        with self._cond:
+            while block and not self._stopped and len(self._jobs) >= self._max_active:
+                self._cond.wait(timeout=1)
+            if self._stopped:
+                return
+            job.started = job.last_progress = time.monotonic()
+            replaced = self._jobs.get(job.key)
+            if replaced:
+                # 同一媒体重复通知，以新任务为准
+                replaced.state = "replaced"
+            self._jobs[job.key] = job
+            self._cond.notify_all()
+        self.__changed()
+
+    def wait(self, jobs: List[DanmuJob]):
+        """
+        等待任务全部结束
+        """
+        with self._cond:
+            while not self._stopped and any(job.state == "pending" for job in jobs):
+                self._cond.wait(timeout=1)
+
+    def pending(self) -> List[DanmuJob]:
+        """
+        等待中的任务
+        """
+        with self._cond:
+            return list(self._jobs.values())
+
+    def __loop(self):
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                if not self._jobs:
+                    self._cond.wait(timeout=self._interval)
+                    continue
+                jobs = list(self._jobs.values())
+            cache: Dict[str, set] = {}
+            for job in jobs:
+                if self._stopped:
+                    return
+                try:
+                    self.__check(job, cache)
+                except Exception as e:
+                    logger.error(f"检查 {job.title} 弹幕出错：{str(e)}")
+                    self.__finish(job, "failed")
+            with self._cond:
+                self._cond.wait(timeout=self._interval)
+
+    def __check(self, job: DanmuJob, cache: Dict[str, set]):
+        if job.update(self.list_danmu(job.dirs, cache)):
+            logger.info(f"{job.title} 已下载弹幕文件 {len(job.found)}/{job.total}")
+        if job.complete:
+            self.__finish(job, "done")
+            return
+        if self._check_failed(job):
+            logger.error(f"{job.title} 解析日志判断已配置弹幕源全部匹配弹幕失败")
+            self.__finish(job, "failed")
+            return
+        now = time.monotonic()
+        deadline = job.started + max(job.total, 3) * self._interval + self._idle_timeout
+        if now - job.last_progress > self._idle_timeout or now > deadline:
+            self.__finish(job, "timeout")
+            return
+        logger.debug(f"{job.title} 弹幕文件未下载完成：{len(job.found)}/{job.total}")
+
+    def __finish(self, job: DanmuJob, state: str):
+        with self._cond:
+            # 已被同一媒体的新任务替换时不再处理
+            if self._jobs.get(job.key) is not job:
+                return
+            self._jobs.pop(job.key)
+            job.state = state
+            self._cond.notify_all()
+        self.__changed()
+        try:
+            self._on_done(job)
+        except Exception as e:
+            logger.error(f"处理 {job.title} 弹幕结果出错：{str(e)}")
+
+    def __changed(self):
+        if not self._on_change:
+            return
+        try:
+            self._on_change(self.pending())
+        except Exception as e:
+            logger.error(f"保存弹幕任务出错：{str(e)}")
+
+    def stop(self):
+        """
+        停止跟踪，未完成的任务保留在持久化数据中，重启后继续
+        """
+        with self._cond:
+            self._stopped = True
+            self._cond.notify_all()
+
+
 class EmbyDanmu(_PluginBase):
     # 插件名称
     plugin_name = "Emby弹幕下载"
@@ -20,7 +405,7 @@ class EmbyDanmu(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/danmu.png"
     # 插件版本
-    plugin_version = "2.0"
+    plugin_version = "2.2"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -45,9 +430,25 @@ class EmbyDanmu(_PluginBase):
     _EMBY_USER = None
     _EMBY_APIKEY = None
     _paths = {}
+    # Emby日志增量读取
+    _emby_log: Optional[EmbyLogTail] = None
+    # 通知下载弹幕时的日志行序号
+    _log_marks: Dict[str, int] = {}
+    # 弹幕源匹配失败正则
+    _failed_patterns: Dict[tuple, List[re.Pattern]] = {}
+    # 弹幕下载完成跟踪
+    _tracker: Optional[DanmuTracker] = None
+    # 媒体库Danmu插件启用、禁用锁
+    _library_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
+        # 停止现有任务
+        self.stop_service()
+
         self._library_task = {}
+        self._log_marks = {}
+        self._failed_patterns = {}
+        self._emby_log = EmbyLogTail()
         self.mediaserver_helper = MediaServerHelper()
 
         # 读取配置
@@ -61,6 +462,12 @@ class EmbyDanmu(_PluginBase):
                 for path in str(self._dirs).split("\n"):
                     self._paths[path.split(":")[0]] = path.split(":")[1]
 
+        if self._enabled:
+            self._tracker = DanmuTracker(check_failed=self.__check_all_failed_by_log,
+                                         on_done=self.__on_danmu_done,
+                                         on_change=self.__save_danmu_jobs)
+            self.__resume_danmu_jobs()
+
     @eventmanager.register(EventType.PluginAction)
     def danmu(self, event: Event = None):
         if not self._enabled:
@@ -188,6 +595,8 @@ class EmbyDanmu(_PluginBase):
                     _library_task.append(library_name)
                 self._library_task[library_id] = _library_task
 
+                # 本次命令等待中的弹幕任务
+                jobs: List[DanmuJob] = []
                 try:
                     # 获取媒体库媒体列表
                     if is_special_library:
@@ -215,6 +624,7 @@ class EmbyDanmu(_PluginBase):
                                     logger.info(f"{emby_name} 找到媒体：{item.get('Name')}，ID：{item.get('Id')}")
 
                                     # 电视剧弹幕
+                                    media_title = f"{library_name} {library_item_name}"
                                     seasons = self.__get_items(item.get("Id"))
                                     if len(seasons) == 1:
                                         season_item = seasons[0]
@@ -224,55 +634,11 @@ class EmbyDanmu(_PluginBase):
                                             break
 
                                         # 通知Danmu插件获取弹幕
-                                        season_id = season_item.get("Id")
-                                        # 判断本地弹幕是否存在
-                                        danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                               only_check=True)
-                                        if season_item_cnt == danmu_cnt:
-                                            logger.info(
-                                                f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                              userid=event.event_data.get("user"))
-                                            if is_special_library:
-                                                continue
-                                            else:
-                                                break
-
-                                        danmu_flag = self.__download_danmu(season_id)
-                                        if danmu_flag:
-                                            logger.info(
-                                                f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                              userid=event.event_data.get("user"))
-                                            danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                   only_check=False)
-                                            if danmu_cnt == 0:
-                                                logger.error(
-                                                    f"{emby_name} {library_name} {library_item_name} Emby已配置弹幕源全部匹配弹幕失败")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {library_item_name} Emby已配置弹幕源全部匹配弹幕失败",
-                                                                  userid=event.event_data.get("user"))
-                                            else:
-                                                if season_item_cnt == danmu_cnt:
-                                                    logger.info(
-                                                        f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                                else:
-                                                    logger.error(
-                                                        f"{emby_name} {library_name} {library_item_name} 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                        else:
-                                            logger.error(
-                                                f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕失败")
-                                            self.post_message(channel=event.event_data.get("channel"),
-                                                              title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season_item.get('IndexNumber')}季 的弹幕失败",
-                                                              userid=event.event_data.get("user"))
+                                        if self.__process_season(event=event, emby_name=emby_name,
+                                                                 media_title=media_title, season=season_item,
+                                                                 library_id=library_id, library_name=library_name,
+                                                                 jobs=jobs) and not is_special_library:
+                                            break
                                     else:
                                         for season in seasons:
                                             # 指定季度则只获取指定季度的弹幕
@@ -280,109 +646,19 @@ class EmbyDanmu(_PluginBase):
                                                 found_item = False
                                                 if season.get("IndexNumber") == library_item_season:
                                                     found_item = True
-                                                    season_id = season.get("Id")
-                                                    # 判断本地弹幕是否存在
-                                                    danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                           only_check=True)
-                                                    if season_item_cnt == danmu_cnt:
-                                                        logger.info(
-                                                            f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                                          userid=event.event_data.get("user"))
-                                                        if is_special_library:
-                                                            continue
-                                                        else:
-                                                            break
-
-                                                    # 通知Danmu插件获取弹幕
-                                                    danmu_flag = self.__download_danmu(season_id)
-                                                    if danmu_flag:
-                                                        logger.info(
-                                                            f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                                          userid=event.event_data.get("user"))
-                                                        danmu_cnt, season_item_cnt = self.__check_danmu_exists(
-                                                            season_id,
-                                                            only_check=False)
-                                                        if danmu_cnt == 0:
-                                                            logger.error(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败",
-                                                                              userid=event.event_data.get("user"))
-                                                        else:
-                                                            if season_item_cnt == danmu_cnt:
-                                                                logger.info(
-                                                                    f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                                self.post_message(
-                                                                    channel=event.event_data.get("channel"),
-                                                                    title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                    userid=event.event_data.get("user"))
-                                                            else:
-                                                                logger.error(
-                                                                    f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                                self.post_message(
-                                                                    channel=event.event_data.get("channel"),
-                                                                    title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                    userid=event.event_data.get("user"))
-                                                    else:
-                                                        logger.error(
-                                                            f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败",
-                                                                          userid=event.event_data.get("user"))
+                                                    self.__process_season(event=event, emby_name=emby_name,
+                                                                          media_title=media_title, season=season,
+                                                                          library_id=library_id,
+                                                                          library_name=library_name,
+                                                                          jobs=jobs)
                                                     break
                                             else:
                                                 # 未指定季度则获取全部季度的弹幕
-                                                season_id = season.get("Id")
-                                                # 判断本地弹幕是否存在
-                                                danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                       only_check=True)
-                                                if season_item_cnt == danmu_cnt:
-                                                    logger.info(
-                                                        f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部存在：{danmu_cnt}/{season_item_cnt}",
-                                                                      userid=event.event_data.get("user"))
-                                                    continue
-
-                                                # 通知Danmu插件获取弹幕
-                                                danmu_flag = self.__download_danmu(season_id)
-                                                if danmu_flag:
-                                                    logger.info(
-                                                        f"{emby_name} 已通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} 开始通知Emby下载 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕，异步执行，请耐心等候执行完成消息",
-                                                                      userid=event.event_data.get("user"))
-                                                    danmu_cnt, season_item_cnt = self.__check_danmu_exists(season_id,
-                                                                                                           only_check=False)
-                                                    if danmu_cnt == 0:
-                                                        logger.error(
-                                                            f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败")
-                                                        self.post_message(channel=event.event_data.get("channel"),
-                                                                          title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 Emby已配置弹幕源全部匹配弹幕失败",
-                                                                          userid=event.event_data.get("user"))
-                                                    else:
-                                                        if season_item_cnt == danmu_cnt:
-                                                            logger.info(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件已全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                              userid=event.event_data.get("user"))
-                                                        else:
-                                                            logger.error(
-                                                                f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}")
-                                                            self.post_message(channel=event.event_data.get("channel"),
-                                                                              title=f"{emby_name} {library_name} {library_item_name} 第{season.get('IndexNumber')}季 弹幕文件未全部下载完成：{danmu_cnt}/{season_item_cnt}",
-                                                                              userid=event.event_data.get("user"))
-                                                else:
-                                                    logger.error(
-                                                        f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败")
-                                                    self.post_message(channel=event.event_data.get("channel"),
-                                                                      title=f"{emby_name} 通知弹幕插件获取 {library_name} {library_item_name} 第{season.get('IndexNumber')}季 的弹幕失败",
-                                                                      userid=event.event_data.get("user"))
+                                                self.__process_season(event=event, emby_name=emby_name,
+                                                                      media_title=media_title, season=season,
+                                                                      library_id=library_id,
+                                                                      library_name=library_name,
+                                                                      jobs=jobs)
                             else:
                                 # 电影弹幕
                                 matches = re.findall(r'^(.*?)(?= ?\(\d{4}\)?|$)', item.get("Name"), re.MULTILINE)
@@ -417,35 +693,22 @@ class EmbyDanmu(_PluginBase):
                                             self.post_message(channel=event.event_data.get("channel"),
                                                               title=f"{emby_name} 开始通知Emby下载 {library_name} {item.get('Name')} 弹幕，异步执行，请耐心等候执行完成消息",
                                                               userid=event.event_data.get("user"))
-                                            retry_cnt = 3
-                                            while len(
-                                                    list(parent_path.glob(
-                                                        danmu_path_pattern))) == 0 and retry_cnt > 0:
-                                                # 解析日志判断是否全部失败
-                                                if self.__check_all_failed_by_log(item_name=item_info.get("Name"),
-                                                                                  item_year=item_info.get(
-                                                                                      "ProductionYear")):
-                                                    logger.error(
-                                                        f"{emby_name} 解析日志判断已配置弹幕源全部匹配弹幕失败")
-                                                    retry_cnt = -1
-                                                else:
-                                                    logger.warn(
-                                                        f"{emby_name} {parent_path} 下未找到弹幕文件：{danmu_path_pattern}，等待5秒后重试 ({retry_cnt}次)")
-                                                    retry_cnt -= 1
-                                                    time.sleep(5)
-
-                                            if len(list(parent_path.glob(danmu_path_pattern))) >= 1:
-                                                logger.info(
-                                                    f"{emby_name} {parent_path} 下已找到弹幕文件：{danmu_path_pattern}")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {item.get('Name')} 下载弹幕文件成功",
-                                                                  userid=event.event_data.get("user"))
-                                            else:
-                                                logger.error(
-                                                    f"{emby_name} {parent_path} 下未找到弹幕文件：{danmu_path_pattern}")
-                                                self.post_message(channel=event.event_data.get("channel"),
-                                                                  title=f"{emby_name} {library_name} {item.get('Name')} 已配置弹幕源全部匹配弹幕失败",
-                                                                  userid=event.event_data.get("user"))
+                                            self.__track_danmu(DanmuJob(key=movie_id,
+                                                                        kind="movie",
+                                                                        emby_name=emby_name,
+                                                                        title=f"{library_name} {item.get('Name')}",
+                                                                        dirs=[str(parent_path)],
+                                                                        expected=None,
+                                                                        total=1,
+                                                                        name=item_info.get("Name"),
+                                                                        year=item_info.get("ProductionYear"),
+                                                                        log_url=self.__get_emby_log_url(),
+                                                                        sources=self._danmu_source,
+                                                                        channel=event.event_data.get("channel"),
+                                                                        user=event.event_data.get("user"),
+                                                                        library_id=library_id,
+                                                                        library_name=library_name),
+                                                               jobs=jobs)
                                         else:
                                             logger.error(
                                                 f"{emby_name} 通知弹幕插件获取 {library_name} {item.get('Name')} {movie_id} 的弹幕失败")
@@ -462,38 +725,34 @@ class EmbyDanmu(_PluginBase):
                     logger.error(
                         f"{emby_name} {library_name} {library_item_name if not is_special_library else ''} 获取弹幕任务出错：{str(e)}")
 
+                # 等待已通知的弹幕下载完成
+                if jobs:
+                    logger.info(f"{emby_name} {library_name} 等待 {len(jobs)} 个弹幕任务完成")
+                    self._tracker.wait(jobs)
+
                 # 判断当前媒体库是否有其他任务在执行
-                if not is_special_library:
-                    self._library_task[library_id].remove(library_item_name)
-                else:
-                    self._library_task[library_id].remove(library_name)
-                if len(self._library_task[library_id]) == 0 and self._disabled:
-                    # 关闭弹幕插件
-                    logger.info(
-                        f"{emby_name} {library_name} {library_item_name if not is_special_library else ''} 获取弹幕任务完成，关闭弹幕插件")
-                    # 禁用媒体库的Danmu插件
-                    library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
-                    library_disabled_subtitle_fetchers.append("Danmu")
-                    library_options.update({
-                        "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
-                    })
-                    update_flag = self.__update_library(library_id, library_options)
-                    if update_flag:
-                        logger.info(f"{emby_name} 已禁用媒体库：{library_name} Danmu插件")
+                with self._library_lock:
+                    if not is_special_library:
+                        self._library_task[library_id].remove(library_item_name)
                     else:
-                        logger.error(f"{emby_name} 禁用媒体库：{library_name} Danmu插件失败")
+                        self._library_task[library_id].remove(library_name)
+                logger.info(
+                    f"{emby_name} {library_name} {library_item_name if not is_special_library else ''} 获取弹幕任务完成")
+                # 关闭弹幕插件，仍有弹幕任务等待时由任务结束回调关闭
+                self.__disable_danmu_fetcher(emby_name=emby_name, library_id=library_id, library_name=library_name)
 
     def get_state(self) -> bool:
         return self._enabled
 
-    def __get_librarys(self) -> list:
+    def __get_librarys(self, host: str = None, apikey: str = None) -> list:
         """
         获取媒体库信息
+        :param host: Emby地址，为空时使用当前处理的媒体服务器
         """
-        if not self._EMBY_HOST or not self._EMBY_APIKEY:
+        host, apikey = host or self._EMBY_HOST, apikey or self._EMBY_APIKEY
+        if not host or not apikey:
             return []
-        req_url = f"%semby/Library/VirtualFolders/Query?api_key=%s" % (
-            self._EMBY_HOST, self._EMBY_APIKEY)
+        req_url = f"%semby/Library/VirtualFolders/Query?api_key=%s" % (host, apikey)
         try:
             with RequestUtils().get_res(req_url) as res:
                 if res:
@@ -516,18 +775,19 @@ class EmbyDanmu(_PluginBase):
         # 未匹配到路径，返回原路径
         return file_path
 
-    def __update_library(self, library_id, library_options) -> bool:
+    def __update_library(self, library_id, library_options, host: str = None, apikey: str = None) -> bool:
         """
         获取媒体库信息
+        :param host: Emby地址，为空时使用当前处理的媒体服务器
         """
-        if not self._EMBY_HOST or not self._EMBY_APIKEY:
+        host, apikey = host or self._EMBY_HOST, apikey or self._EMBY_APIKEY
+        if not host or not apikey:
             return False
         headers = {
             'accept': '*/*',
             'Content-Type': 'application/json'
         }
-        req_url = f"%semby/Library/VirtualFolders/LibraryOptions?api_key=%s" % (
-            self._EMBY_HOST, self._EMBY_APIKEY)
+        req_url = f"%semby/Library/VirtualFolders/LibraryOptions?api_key=%s" % (host, apikey)
         res = RequestUtils(headers=headers).post(url=req_url,
                                                  data=json.dumps({"Id": library_id, "LibraryOptions": library_options}))
         if res and res.status_code == 204:
@@ -541,10 +801,10 @@ class EmbyDanmu(_PluginBase):
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
             return []
         if nameStartsWith:
-            req_url = f"%semby/Users/%s/Items?ParentId=%s&api_key=%s&NameStartsWith=%s" % (
+            req_url = f"%semby/Users/%s/Items?ParentId=%s&Fields=Path&api_key=%s&NameStartsWith=%s" % (
                 self._EMBY_HOST, self._EMBY_USER, parent_id, self._EMBY_APIKEY, nameStartsWith)
         else:
-            req_url = f"%semby/Users/%s/Items?ParentId=%s&api_key=%s" % (
+            req_url = f"%semby/Users/%s/Items?ParentId=%s&Fields=Path&api_key=%s" % (
                 self._EMBY_HOST, self._EMBY_USER, parent_id, self._EMBY_APIKEY)
         logger.debug(f"开始获取媒体列表：{req_url}")
         try:
@@ -569,10 +829,10 @@ class EmbyDanmu(_PluginBase):
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
             return []
         if nameStartsWith:
-            req_url = f"%semby/Items?ParentId=%s&api_key=%s&NameStartsWith=%s" % (
+            req_url = f"%semby/Items?ParentId=%s&Fields=Path&api_key=%s&NameStartsWith=%s" % (
                 self._EMBY_HOST, parent_id, self._EMBY_APIKEY, nameStartsWith)
         else:
-            req_url = f"%semby/Items?ParentId=%s&api_key=%s" % (
+            req_url = f"%semby/Items?ParentId=%s&Fields=Path&api_key=%s" % (
                 self._EMBY_HOST, parent_id, self._EMBY_APIKEY)
         logger.debug(f"开始获取媒体列表488：{req_url}")
         try:
@@ -594,6 +854,10 @@ class EmbyDanmu(_PluginBase):
             return False
         req_url = f"%sapi/danmu/%s?option=Refresh&api_key=%s" % (
             self._EMBY_HOST, item_id, self._EMBY_APIKEY)
+        # 记录通知前的日志位置，检查时只匹配之后的日志
+        log_url = self.__get_emby_log_url()
+        if log_url:
+            self._log_marks[item_id] = self._emby_log.mark(log_url)
         try:
             with RequestUtils().get_res(req_url) as res:
                 if res:
@@ -620,47 +884,171 @@ class EmbyDanmu(_PluginBase):
                 logger.info(f"获取媒体详情失败，无法连接Emby！")
                 return {}
 
-    def __check_danmu_exists(self, season_id: str, only_check: bool):
+    def __season_job(self, event: Event, emby_name: str, title: str, season_id: str,
+                     library_id: str = None, library_name: str = None) -> Optional[DanmuJob]:
         """
-        检查媒体是否有弹幕
+        生成季弹幕任务，按每集文件名确定应有的弹幕文件
         """
         season_items = self.__get_items(season_id)
+        if not season_items:
+            logger.error(f"{emby_name} 获取 {title} 的剧集列表失败")
+            return None
         item_info = self.__get_item_info(season_items[0].get("Id"))
-        item_path = item_info.get("Path")
-        parent_path = Path(self.__get_path(str(Path(item_path).parent)))
-        logger.info(f"开始检查路径 {parent_path} 下是是否有弹幕文件")
-        # 检查是否有弹幕文件
-        danmu_path_pattern = "*.xml"
-
-        if only_check:
-            return len(list(parent_path.glob(danmu_path_pattern))), len(season_items)
+        item_paths = [item.get("Path") for item in season_items]
+        if all(item_paths):
+            dirs = sorted({self.__get_path(str(Path(item_path).parent)) for item_path in item_paths})
+            expected = [Path(item_path).stem for item_path in item_paths]
         else:
-            retry_cnt = len(season_items)
-            _downloaded_danmu_files = []
-            # 没有新增弹幕充实3次直接跳过
-            _no_incre_cnt = 0
-            while len(_downloaded_danmu_files) < len(season_items) and retry_cnt > 0 and _no_incre_cnt <= 3:
-                # 解析日志判断是否全部失败
-                if self.__check_all_failed_by_log(item_name=item_info.get("SeriesName"),
-                                                  item_year=item_info.get("ProductionYear")):
-                    logger.error(f"解析日志判断已配置弹幕源全部匹配弹幕失败")
-                    retry_cnt = -1
-                else:
-                    danmu_files = list(parent_path.glob(danmu_path_pattern))
-                    _no_incre_cnt += 1
-                    for danmu_file in danmu_files:
-                        if danmu_file.name not in _downloaded_danmu_files:
-                            _downloaded_danmu_files.append(danmu_file.name)
-                            logger.info(f"已下载弹幕文件：{danmu_file.name}")
-                            _no_incre_cnt = 0
-                    # 判断是否完成任务
-                    if len(_downloaded_danmu_files) != len(season_items):
-                        logger.warn(
-                            f"{parent_path} 下弹幕文件：{danmu_path_pattern} 未下载完成，等待5秒后重试 ({retry_cnt}次)")
-                        retry_cnt -= 1
-                        time.sleep(5)
-
-            return len(_downloaded_danmu_files), len(season_items)
+            # 未返回每集路径时按数量判断
+            dirs = [self.__get_path(str(Path(item_info.get("Path")).parent))]
+            expected = None
+        return DanmuJob(key=season_id,
+                        kind="season",
+                        emby_name=emby_name,
+                        title=title,
+                        dirs=dirs,
+                        expected=expected,
+                        total=len(season_items),
+                        name=item_info.get("SeriesName"),
+                        year=item_info.get("ProductionYear"),
+                        log_url=self.__get_emby_log_url(),
+                        sources=self._danmu_source,
+                        channel=event.event_data.get("channel"),
+                        user=event.event_data.get("user"),
+                        library_id=library_id,
+                        library_name=library_name)
+
+    def __process_season(self, event: Event, emby_name: str, media_title: str, season: dict,
+                         jobs: List[DanmuJob], library_id: str = None, library_name: str = None) -> bool:
+        """
+        检查季弹幕，未全部存在时通知Danmu插件下载并加入完成跟踪
+        :return: 弹幕文件是否已全部存在
+        """
+        season_id = season.get("Id")
+        title = f"{media_title} 第{season.get('IndexNumber')}季"
+        job = self.__season_job(event=event, emby_name=emby_name, title=title, season_id=season_id,
+                                library_id=library_id, library_name=library_name)
+        if not job:
+            return False
+        logger.info(f"开始检查路径 {', '.join(job.dirs)} 下是是否有弹幕文件")
+        job.update(DanmuTracker.list_danmu(job.dirs))
+        if job.complete:
+            message = f"{emby_name} {title} 弹幕文件已全部存在：{len(job.found)}/{job.total}"
+            logger.info(message)
+            self.post_message(channel=job.channel, title=message, userid=job.user)
+            return True
+
+        if not self.__download_danmu(season_id):
+            message = f"{emby_name} 通知弹幕插件获取 {title} 的弹幕失败"
+            logger.error(message)
+            self.post_message(channel=job.channel, title=message, userid=job.user)
+            return False
+
+        logger.info(f"{emby_name} 已通知弹幕插件获取 {title} 的弹幕")
+        self.post_message(channel=job.channel,
+                          title=f"{emby_name} 开始通知Emby下载 {title} 弹幕，异步执行，请耐心等候执行完成消息",
+                          userid=job.user)
+        self.__track_danmu(job, jobs=jobs)
+        return False
+
+    def __track_danmu(self, job: DanmuJob, jobs: List[DanmuJob]):
+        """
+        加入完成跟踪，同时等待的任务数已满时阻塞
+        """
+        job.since = self._log_marks.pop(job.key, None)
+        self._tracker.submit(job)
+        jobs.append(job)
+
+    def __on_danmu_done(self, job: DanmuJob):
+        """
+        弹幕任务结束，发送结果
+        """
+        if job.kind == "movie":
+            if job.found:
+                message = f"{job.emby_name} {job.title} 下载弹幕文件成功"
+            else:
+                message = f"{job.emby_name} {job.title} 已配置弹幕源全部匹配弹幕失败"
+        elif not job.found:
+            message = f"{job.emby_name} {job.title} Emby已配置弹幕源全部匹配弹幕失败"
+        elif job.complete:
+            message = f"{job.emby_name} {job.title} 弹幕文件已全部下载完成：{len(job.found)}/{job.total}"
+        else:
+            message = f"{job.emby_name} {job.title} 弹幕文件未全部下载完成：{len(job.found)}/{job.total}"
+        if job.complete:
+            logger.info(message)
+        else:
+            logger.error(message)
+        self.post_message(channel=job.channel, title=message, userid=job.user)
+        # 媒体库没有其他任务时关闭弹幕插件，重启后继续跟踪的任务同样需要关闭
+        if job.library_id:
+            self.__disable_danmu_fetcher(emby_name=job.emby_name, library_id=job.library_id,
+                                         library_name=job.library_name)
+
+    def __disable_danmu_fetcher(self, emby_name: str, library_id: str, library_name: str):
+        """
+        媒体库没有进行中的命令及等待中的弹幕任务时，重新禁用媒体库的Danmu插件
+        """
+        if not self._disabled:
+            return
+        with self._library_lock:
+            if self._library_task.get(library_id):
+                return
+            if self._tracker and any(job.emby_name == emby_name and job.library_id == library_id
+                                     for job in self._tracker.pending()):
+                return
+            emby_server = self.mediaserver_helper.get_services(name_filters=[emby_name],
+                                                               type_filter="emby").get(emby_name)
+            if not emby_server:
+                logger.error(f"未找到媒体服务器 {emby_name}，无法禁用媒体库：{library_name} Danmu插件")
+                return
+            host = emby_server.config.config.get("host")
+            if not host.endswith("/"):
+                host += "/"
+            if not host.startswith("http"):
+                host = "http://" + host
+            apikey = emby_server.config.config.get("apikey")
+            # 重新获取媒体库配置，避免覆盖期间的其他修改
+            library_options = None
+            for library in self.__get_librarys(host=host, apikey=apikey):
+                if library.get("Id") == library_id:
+                    library_options = library.get("LibraryOptions")
+                    break
+            if not library_options:
+                logger.error(f"{emby_name} 未找到媒体库：{library_name}，无法禁用Danmu插件")
+                return
+            library_disabled_subtitle_fetchers = library_options.get("DisabledSubtitleFetchers", [])
+            if "Danmu" in library_disabled_subtitle_fetchers:
+                return
+            # 禁用媒体库的Danmu插件
+            library_disabled_subtitle_fetchers.append("Danmu")
+            library_options.update({
+                "DisabledSubtitleFetchers": library_disabled_subtitle_fetchers,
+            })
+            if self.__update_library(library_id, library_options, host=host, apikey=apikey):
+                logger.info(f"{emby_name} 已禁用媒体库：{library_name} Danmu插件")
+            else:
+                logger.error(f"{emby_name} 禁用媒体库：{library_name} Danmu插件失败")
+
+    def __save_danmu_jobs(self, jobs: List[DanmuJob]):
+        """
+        保存等待中的弹幕任务，重启后继续跟踪
+        """
+        self.save_data("danmu_jobs", [job.to_dict() for job in jobs])
+
+    def __resume_danmu_jobs(self):
+        """
+        继续跟踪上次未完成的弹幕任务
+        """
+        for data in self.get_data("danmu_jobs") or []:
+            try:
+                job = DanmuJob.from_dict(data)
+                if job.channel:
+                    job.channel = MessageChannel(job.channel)
+            except Exception as e:
+                logger.error(f"恢复弹幕任务 {data} 出错：{str(e)}")
+                continue
+            logger.info(f"继续跟踪弹幕任务：{job.emby_name} {job.title}")
+            self._tracker.submit(job, block=False)
 
     def __get_plugins(self) -> list:
         """
@@ -723,46 +1111,40 @@ class EmbyDanmu(_PluginBase):
 
         return [scraper.get("Name") for scraper in scrapers if scraper.get("Enable") == True]
 
-    def __get_emby_log(self) -> str:
+    def __get_emby_log_url(self) -> Optional[str]:
         """
-        获取emby日志 最新200行
+        获取emby日志地址
         """
         if not self._EMBY_HOST or not self._EMBY_APIKEY:
-            return ""
-        req_url = f"%sSystem/Logs/embyserver.txt?api_key=%s" % (
+            return None
+        return f"%sSystem/Logs/embyserver.txt?api_key=%s" % (
             self._EMBY_HOST, self._EMBY_APIKEY)
-        with RequestUtils().get_res(req_url) as res:
-            if res:
-                emby_log = res.text.split("\n")
-                emby_log = emby_log[-200:]
-                return "\n".join(emby_log)
-            else:
-                logger.info(f"获取插件详情失败，无法连接Emby！")
-                return ""
 
-    def __check_all_failed_by_log(self, item_name, item_year) -> bool:
+    def __get_failed_patterns(self, sources: List[str], item_name, item_year) -> List[re.Pattern]:
         """
-        解析emby日志
+        获取各弹幕源匹配失败的正则，按弹幕源依次为 匹配失败、弹幕内容少于1KB
         """
-        emby_log = self.__get_emby_log()
-        if not emby_log:
-            return False
-
-        # 正则解析删除的媒体信息
-        all_matched = True
-        for source in self._danmu_source:
-            pattern = fr'\[{source}\]匹配失败：{item_name} \({item_year}\)'
-            matches = re.findall(pattern, emby_log)
-            if not matches:
-                all_matched = False
-                break
+        key = (tuple(sources), item_name, item_year)
+        patterns = self._failed_patterns.get(key)
+        if patterns is None:
+            name = re.escape(str(item_name))
+            year = re.escape(str(item_year))
+            patterns = []
+            for source in sources:
+                source = re.escape(source)
+                patterns.append(re.compile(fr'\[{source}\]匹配失败：{name} \({year}\)'))
+                patterns.append(re.compile(fr'\[{source}\]弹幕内容少于1KB，忽略处理：.{name}'))
+            self._failed_patterns[key] = patterns
+        return patterns
 
-            pattern = fr'\[{source}\]弹幕内容少于1KB，忽略处理：.{item_name}'
-            matches = re.findall(pattern, emby_log)
-            if not matches:
-                all_matched = False
-                break
-        return all_matched
+    def __check_all_failed_by_log(self, job: DanmuJob) -> bool:
+        """
+        解析emby日志，判断已配置弹幕源是否全部匹配失败，只检查通知下载之后的日志
+        """
+        if not job.log_url or not job.sources:
+            return False
+        patterns = self.__get_failed_patterns(job.sources, job.name, job.year)
+        return all(self._emby_log.search(job.log_url, patterns, since=job.since))
 
     @staticmethod
     def get_command() -> List[Dict[str, Any]]:
@@ -929,4 +1311,9 @@ class EmbyDanmu(_PluginBase):
         pass
 
     def stop_service(self):
-        pass
+        """
+        退出插件
+        """
+        if self._tracker:
+            self._tracker.stop()
+            self._tracker = None
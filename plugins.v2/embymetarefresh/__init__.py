@@ -4,6 +4,7 @@ import re
 import threading
 import time
 import pickle
+from concurrent.futures import ThreadPoolExecutor, Future, CancelledError, wait
 from datetime import datetime, timedelta
 from typing import Optional, Any, List, Dict, Tuple
 from app.core.cache import FileCache
@@ -49,6 +50,201 @@ from app.utils.http import RequestUtils
 from app.utils.string import StringUtils
 
 
+class TokenBucket:
+    """
+    令牌桶限速，多个线程共享
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量（允许的突发数）
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self, stop: threading.Event = None) -> bool:
+        """
+        取得一个令牌，没有可用令牌时等待
+        :param stop: 停止标志，等待期间被设置时返回False
+        """
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return True
+                wait = (1 - self._tokens) / self._rate
+            if stop:
+                if stop.wait(wait):
+                    return False
+            else:
+                time.sleep(wait)
+
+
+class PersonCache:
+    """
+    演职人员翻译缓存，持久化保存
+    persons：Emby服务器 -> 人物ID -> 已写入Emby的中文名、描述、图片来源及处理版本
+    tmdb：TMDB人物ID -> TMDB中的中文名、中文描述及图片
+    """
+
+    # 处理逻辑变化时递增，旧版本记录会重新处理
+    VERSION = 1
+    # 未找到中文信息的记录，超过该时间后重新查询
+    MISS_TTL = 7 * 24 * 3600
+    # 统计项 -> 说明
+    STAT_NAMES = {
+        "emby_get": "Emby人物查询",
+        "tmdb": "TMDB人物查询",
+        "image": "图片上传",
+        "emby_post": "Emby人物更新",
+    }
+
+    def __init__(self, data: dict = None):
+        data = data or {}
+        self._persons: Dict[str, Dict[str, dict]] = data.get("persons") or {}
+        self._tmdb: Dict[str, dict] = data.get("tmdb") or {}
+        self._lock = threading.Lock()
+        # 未保存的变更数
+        self.changes = 0
+        self.stats: Dict[str, int] = {}
+        self.reset_stats()
+
+    def __fresh(self, record: Optional[dict]) -> Optional[dict]:
+        if not record or record.get("version") != self.VERSION:
+            return None
+        if not record.get("name") and time.time() - record.get("time", 0) > self.MISS_TTL:
+            return None
+        return record
+
+    def person(self, server: str, person_id: str) -> Optional[dict]:
+        with self._lock:
+            return self.__fresh(self._persons.get(server, {}).get(str(person_id)))
+
+    def set_person(self, server: str, person_id: str, origin: str, name: str = "", overview: str = "",
+                   image: str = "", tmdbid: str = None):
+        """
+        记录已写入Emby的人物信息，name为空表示未找到中文信息
+        """
+        with self._lock:
+            self._persons.setdefault(server, {})[str(person_id)] = {
+                "origin": origin,
+                "name": name,
+                "overview": overview,
+                "image": image,
+                "tmdbid": str(tmdbid) if tmdbid else None,
+                "version": self.VERSION,
+                "time": int(time.time())
+            }
+            self.changes += 1
+
+    def tmdb(self, tmdbid: str) -> Optional[dict]:
+        with self._lock:
+            return self.__fresh(self._tmdb.get(str(tmdbid)))
+
+    def set_tmdb(self, tmdbid: str, name: str = "", overview: str = "", image: str = ""):
+        with self._lock:
+            self._tmdb[str(tmdbid)] = {
+                "name": name,
+                "overview": overview,
+                "image": image,
+                "version": self.VERSION,
+                "time": int(time.time())
+            }
+            self.changes += 1
+
+    def count(self, key: str, num: int = 1):
+        with self._lock:
+            self.stats[key] = self.stats.get(key, 0) + num
+
+    def reset_stats(self):
+        with self._lock:
+            self.stats = {"hit": 0, "miss": 0}
+            for key in self.STAT_NAMES:
+                self.stats[key] = 0
+                self.stats[f"{key}_saved"] = 0
+
+    def report(self) -> str:
+        """
+        本次运行的统计
+        """
+        with self._lock:
+            stats = dict(self.stats)
+        calls = "，".join(f"{name} {stats[key]} 次（节省 {stats[f'{key}_saved']} 次）"
+                         for key, name in self.STAT_NAMES.items())
+        return f"演职人员缓存命中 {stats['hit']} 人，未命中 {stats['miss']} 人；{calls}"
+
+    def to_dict(self) -> dict:
+        with self._lock:
+            self.changes = 0
+            return {
+                "persons": {server: dict(persons) for server, persons in self._persons.items()},
+                "tmdb": dict(self._tmdb)
+            }
+
+
+class DoubanCast:
+    """
+    豆瓣演职人员索引
+    每个媒体只整理一次：按规范化的中文名及外文名建立索引，饰演角色预先处理
+    """
+
+    # 饰演角色改写，如 "饰 詹姆斯·邦德 James Bond 007"
+    ROLE_REWRITES = [
+        (re.compile(r"饰\s+"), ""),
+        (re.compile("演员"), ""),
+        (re.compile("voice"), "配音"),
+        (re.compile("Director"), "导演"),
+    ]
+    # 名称中的间隔号、点及空白统一处理
+    _name_separators = re.compile(r"[\s·・•.．\-]+")
+
+    def __init__(self, actors: List[dict] = None):
+        self.actors = actors or []
+        # 规范化名称 -> (豆瓣人物, 饰演角色)，同名时保留列表中靠前的人物
+        self._index: Dict[str, Tuple[dict, str]] = {}
+        for actor in self.actors:
+            entry = (actor, self.__rewrite_role(actor.get("character")))
+            for name in (actor.get("latin_name"), actor.get("name")):
+                key = self.normalize(name)
+                if key:
+                    self._index.setdefault(key, entry)
+
+    def __len__(self):
+        return len(self.actors)
+
+    @classmethod
+    def normalize(cls, name: Optional[str]) -> str:
+        if not name:
+            return ""
+        return cls._name_separators.sub(" ", str(name)).strip().casefold()
+
+    @classmethod
+    def __rewrite_role(cls, character: Optional[str]) -> str:
+        if not character:
+            return ""
+        for pattern, repl in cls.ROLE_REWRITES:
+            character = pattern.sub(repl, character)
+        return character
+
+    def find(self, names: List[Optional[str]]) -> Tuple[Optional[dict], str]:
+        """
+        按人物名称查找
+        :return: 豆瓣人物，饰演角色
+        """
+        for name in names:
+            entry = self._index.get(self.normalize(name))
+            if entry:
+                return entry
+        return None, ""
+
+
 class EmbyMetaRefresh(_PluginBase):
     # 插件名称
     plugin_name = "Emby元数据刷新"
@@ -57,7 +253,7 @@ class EmbyMetaRefresh(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/emby-icon.png"
     # 插件版本
-    plugin_version = "2.3.3"
+    plugin_version = "2.6"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -94,6 +290,26 @@ class EmbyMetaRefresh(_PluginBase):
     _tmdb_cache = None
     _episodes_images = []
     _region_name = "embymetarefresh_cache"
+    _person_cache: Optional[PersonCache] = None
+    # 演职人员并发数
+    _people_workers = 4
+    _people_executor: Optional[ThreadPoolExecutor] = None
+    _item_executor: Optional[ThreadPoolExecutor] = None
+    # 各服务限速：(每秒请求数, 突发数)，豆瓣平均5秒一次
+    _rate_limits = {
+        "emby": (30, 30),
+        "tmdb": (20, 20),
+        "douban": (0.2, 1),
+    }
+    _limiters: Dict[str, TokenBucket] = {}
+    # 后台进行中的媒体演员处理
+    _people_pending: List[Future] = []
+    # 豆瓣演职人员缓存：(类型, 标题, 年份, 季) -> (缓存时间, 演职人员索引)，同一剧集的各集只查询一次
+    _douban_cache: Dict[Tuple, Tuple[float, DoubanCast]] = {}
+    _douban_cache_ttl = 6 * 3600
+    # 未取得演职人员的结果只短时间缓存
+    _douban_miss_ttl = 600
+    _douban_lock = threading.Lock()
 
     def init_plugin(self, config: dict = None):
         # 停止现有任务
@@ -106,6 +322,15 @@ class EmbyMetaRefresh(_PluginBase):
             base=Path(f"/tmp/{self._region_name}"),
             ttl=604800
         )
+        self._person_cache = PersonCache(self.get_data("person_cache"))
+        self._douban_cache = {}
+        self._limiters = {backend: TokenBucket(rate=rate, capacity=capacity)
+                          for backend, (rate, capacity) in self._rate_limits.items()}
+        # 演职人员并发处理，媒体的演员处理与媒体刷新同时进行
+        self._people_workers = int((config or {}).get("people_workers") or 4)
+        self._people_executor = ThreadPoolExecutor(max_workers=max(self._people_workers, 1),
+                                                   thread_name_prefix="embymetarefresh-people")
+        self._item_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix="embymetarefresh-item")
 
         if config:
             self._enabled = config.get("enabled")
@@ -176,6 +401,7 @@ class EmbyMetaRefresh(_PluginBase):
                 "mediaservers": self._mediaservers,
                 "interval": self._interval,
                 "exclusiveExtract": self._exclusiveExtract,
+                "people_workers": self._people_workers,
             }
         )
 
@@ -201,6 +427,7 @@ class EmbyMetaRefresh(_PluginBase):
                 self._EMBY_HOST += "/"
             if not self._EMBY_HOST.startswith("http"):
                 self._EMBY_HOST = "http://" + self._EMBY_HOST
+            self._person_cache.reset_stats()
 
             # 判断有无安装神医助手插件
             plugin_config, plugin_id = None, None
@@ -243,10 +470,13 @@ class EmbyMetaRefresh(_PluginBase):
                 logger.info(f"开始刷新媒体库元数据，最近 {self._num} 天内入库媒体：{len(transferhistorys)}个")
                 # 刷新媒体库
                 for transferinfo in transferhistorys:
+                    if self._event.is_set():
+                        break
                     self.__refresh_emby(transferinfo, emby)
                     if self._interval:
                         logger.info(f"等待 {self._interval} 秒后继续刷新")
-                        time.sleep(int(self._interval))
+                        if self._event.wait(int(self._interval)):
+                            break
             else:
                 latest = self.__get_latest_media()
                 if not latest:
@@ -272,6 +502,8 @@ class EmbyMetaRefresh(_PluginBase):
 
                 # 刷新媒体库
                 for item in latest:
+                    if self._event.is_set():
+                        break
                     try:
                         refresh_meta = self._ReplaceAllMetadata
                         refresh_image = self._ReplaceAllImages
@@ -333,7 +565,7 @@ class EmbyMetaRefresh(_PluginBase):
                                                               refresh_image=refresh_image)
                             if self._interval:
                                 logger.info(f"等待 {self._interval} 秒后继续刷新")
-                                time.sleep(int(self._interval))
+                                self._event.wait(int(self._interval))
                         else:
                             logger.info(
                                 f"最新媒体：{'电视剧' if str(item.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item.get('SeriesName'), item.get('ParentIndexNumber'), item.get('IndexNumber'), item.get('Name')) if str(item.get('Type')) == 'Episode' else item.get('Name')} {item.get('Id')} 元数据完整，跳过处理")
@@ -343,9 +575,9 @@ class EmbyMetaRefresh(_PluginBase):
                             logger.info(
                                 f"最新媒体：{'电视剧' if str(item.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item.get('SeriesName'), item.get('ParentIndexNumber'), item.get('IndexNumber'), item.get('Name')) if str(item.get('Type')) == 'Episode' else item.get('Name')} {item.get('Id')} 开始处理演员中文名")
                             key = f"{item.get('Type')}-{item.get('SeriesName') if str(item.get('Type')) == 'Episode' else item.get('Name')}"
-                            peoples = None
                             if key not in handle_items.keys():
-                                peoples = self.__update_people_chi(
+                                # 演员处理在后台进行，不阻塞后续媒体的刷新
+                                peoples = self.__submit_people_chi(
                                     item_id=item.get("SeriesId") if str(item.get('Type')) == 'Episode' else item.get(
                                         "Id"),
                                     title=item.get('SeriesName') if str(item.get('Type')) == 'Episode' else item.get(
@@ -355,16 +587,17 @@ class EmbyMetaRefresh(_PluginBase):
                                         item.get('Type')) == 'Episode' else None,
                                     emby=emby
                                 )
+                            else:
+                                peoples = handle_items[key].get('actors')
 
                             # 是否有演员信息
                             if str(item.get('Type')) == 'Episode':
                                 item_dicts = handle_items.get(key, {})
                                 item_ids = item_dicts.get('itemIds', [])
-                                item_actors = item_dicts.get('actors', [])
                                 item_ids.append(item.get("Id"))
                                 handle_items[key] = {
                                     'itemIds': item_ids,
-                                    'actors': peoples or item_actors
+                                    'actors': peoples
                                 }
                     except Exception as e:
                         logger.error(f"刷新媒体库元数据失败：{str(e)}")
@@ -374,8 +607,14 @@ class EmbyMetaRefresh(_PluginBase):
                 for key, value in handle_items.items():
                     if value:
                         item_ids = value.get('itemIds', [])
-                        item_actors = value.get('actors', [])
+                        item_actors = self.__wait_future(value.get('actors'))
+                        # 演员处理失败、已停止或无演员信息时不更新剧集，避免清空并锁定演员
+                        if not item_actors:
+                            logger.info(f"{key} 未获取到演员信息，跳过 {len(item_ids)} 集的演员更新")
+                            continue
                         for item_id in item_ids:
+                            if self._event.is_set():
+                                break
                             item_info = self.__get_item_info(item_id)
                             if item_actors == item_info.get("People"):
                                 logger.warn(
@@ -386,6 +625,8 @@ class EmbyMetaRefresh(_PluginBase):
                             flag = self.set_iteminfo(itemid=item_info.get("Id"), iteminfo=item_info, emby=emby)
                             logger.info(
                                 f"最新媒体：{'电视剧' if str(item_info.get('Type')) == 'Episode' else '电影'} {'%s S%02dE%02d %s' % (item_info.get('SeriesName'), item_info.get('ParentIndexNumber'), item_info.get('IndexNumber'), item_info.get('Name')) if str(item_info.get('Type')) == 'Episode' else item_info.get('Name')} {item_info.get('Id')} 演员信息完成 {flag}")
+            # 等待后台演员处理完成
+            self.__wait_people_chi()
             if self._exclusiveExtract == "true":
                 try:
                     if plugin_id:
@@ -398,6 +639,9 @@ class EmbyMetaRefresh(_PluginBase):
                 except Exception as e:
                     logger.error(f"关闭 神医助手 独占模式失败：{str(e)}")
 
+            if self._actor_chi:
+                logger.info(f"{emby_name} {self._person_cache.report()}")
+                self.__save_person_cache()
             logger.info(f"刷新 {emby_name} 媒体库元数据完成")
 
     @staticmethod
@@ -457,6 +701,53 @@ class EmbyMetaRefresh(_PluginBase):
             logger.error(f"获取Emby中最新媒体失败：{str(err)}")
             return []
 
+    def __acquire(self, backend: str) -> bool:
+        """
+        按服务限速，服务停止时返回False
+        """
+        limiter = self._limiters.get(backend)
+        if not limiter:
+            return not self._event.is_set()
+        return limiter.acquire(self._event) and not self._event.is_set()
+
+    def __wait_future(self, future: Optional[Future]) -> Any:
+        """
+        等待后台任务结果，任务失败、被取消或服务停止时返回None
+        """
+        if future is None:
+            return None
+        while not self._event.is_set():
+            done, _ = wait([future], timeout=1)
+            if not done:
+                continue
+            try:
+                return future.result()
+            except CancelledError:
+                return None
+            except Exception as err:
+                logger.error(f"演职人员处理失败：{str(err)}")
+                return None
+        future.cancel()
+        return None
+
+    def __submit_people_chi(self, **kwargs) -> Optional[Future]:
+        """
+        在后台处理媒体演员中文名
+        """
+        if self._event.is_set():
+            return None
+        future = self._item_executor.submit(self.__update_people_chi, **kwargs)
+        self._people_pending.append(future)
+        return future
+
+    def __wait_people_chi(self):
+        """
+        等待后台的媒体演员处理全部完成
+        """
+        pending, self._people_pending = self._people_pending, []
+        for future in pending:
+            self.__wait_future(future)
+
     def __update_people_chi(self, item_id, title, type, season=None, emby=None):
         """
         刮削演员中文名
@@ -481,7 +772,7 @@ class EmbyMetaRefresh(_PluginBase):
                     return None
 
                 logger.debug(
-                    f"获取 {title} ({item_info.get('ProductionYear')}) 的豆瓣演员信息 完成，演员：{douban_actors}")
+                    f"获取 {title} ({item_info.get('ProductionYear')}) 的豆瓣演员信息 完成，演员 {len(douban_actors)} 人")
                 peoples = self.__update_peoples(itemid=item_id, iteminfo=item_info,
                                                 douban_actors=douban_actors, emby=emby)
 
@@ -490,7 +781,7 @@ class EmbyMetaRefresh(_PluginBase):
                 logger.info(f"媒体 {title} ({item_info.get('ProductionYear')}) 演员信息无需更新")
         return item_info.get("People")
 
-    def __update_peoples(self, itemid: str, iteminfo: dict, douban_actors, emby):
+    def __update_peoples(self, itemid: str, iteminfo: dict, douban_actors: DoubanCast, emby):
         # 处理媒体项中的人物信息
         """
         "People": [
@@ -505,20 +796,31 @@ class EmbyMetaRefresh(_PluginBase):
         """
         peoples = []
         need_update_people = False
+        # 需处理的人物并发查询，结果按原顺序合并
+        futures: Dict[int, Future] = {}
+        for index, people in enumerate(iteminfo["People"] or []):
+            if not people.get("Name"):
+                continue
+            if StringUtils.is_chinese(people.get("Name")) \
+                    and StringUtils.is_chinese(people.get("Role")):
+                continue
+            futures[index] = self._people_executor.submit(self.__update_people,
+                                                          people=people,
+                                                          douban_actors=douban_actors,
+                                                          emby=emby)
         # 更新当前媒体项人物
-        for people in iteminfo["People"] or []:
+        for index, people in enumerate(iteminfo["People"] or []):
             if self._event.is_set():
+                for future in futures.values():
+                    future.cancel()
                 logger.info(f"演职人员刮削服务停止")
                 return
             if not people.get("Name"):
                 continue
-            if StringUtils.is_chinese(people.get("Name")) \
-                    and StringUtils.is_chinese(people.get("Role")):
+            if index not in futures:
                 peoples.append(people)
                 continue
-            info = self.__update_people(people=people,
-                                        douban_actors=douban_actors,
-                                        emby=emby)
+            info = self.__wait_future(futures[index])
             if info:
                 logger.info(
                     f"更新演职人员 {people.get('Name')} ({people.get('Role')}) 信息：{info.get('Name')} ({info.get('Role')})")
@@ -531,7 +833,7 @@ class EmbyMetaRefresh(_PluginBase):
             'Type') == 'Series' or iteminfo.get(
             'Type') == 'Movie' else f"{iteminfo.get('SeriesName')} ({iteminfo.get('ProductionYear')}) {iteminfo.get('SeasonName')} {iteminfo.get('Name')}"
         # 保存媒体项信息
-        if peoples and need_update_people:
+        if peoples and need_update_people and self.__acquire("emby"):
             iteminfo["People"] = peoples
             iteminfo["LockedFields"].append("Cast")
             flag = self.set_iteminfo(itemid=itemid, iteminfo=iteminfo, emby=emby)
@@ -542,7 +844,7 @@ class EmbyMetaRefresh(_PluginBase):
 
         return iteminfo["People"]
 
-    def __update_people(self, people: dict, douban_actors: list = None, emby=None) -> Optional[dict]:
+    def __update_people(self, people: dict, douban_actors: DoubanCast = None, emby=None) -> Optional[dict]:
         """
         更新人物信息，返回替换后的人物信息
         """
@@ -587,9 +889,39 @@ class EmbyMetaRefresh(_PluginBase):
             elif isinstance(value, list):
                 ret_people[key] = value.copy()
 
+        # 已处理过的人物不再查询和更新Emby，只更新当前媒体中的饰演角色
+        cache = self._person_cache
+        record = cache.person(self._EMBY_HOST, people.get("Id")) if people.get("Id") else None
+        if record and record.get("name") and record.get("name") == people.get("Name"):
+            cache.count("hit")
+            cache.count("emby_get_saved")
+            cache.count("emby_post_saved")
+            if record.get("tmdbid"):
+                cache.count("tmdb_saved")
+            if record.get("image"):
+                cache.count("image_saved")
+            _, character = douban_actors.find([record.get("origin"), record.get("name")]) \
+                if douban_actors else (None, "")
+            if character and character != people.get("Role"):
+                ret_people["Role"] = character
+                return ret_people
+            return None
+        if record and not record.get("name") \
+                and not (douban_actors and douban_actors.find([people.get("Name")])[0]):
+            # 近期未找到中文信息，且本媒体豆瓣演员中也没有
+            cache.count("hit")
+            cache.count("emby_get_saved")
+            if record.get("tmdbid"):
+                cache.count("tmdb_saved")
+            return None
+        cache.count("miss")
+
         try:
             # 查询媒体库人物详情
+            if not self.__acquire("emby"):
+                return None
             personinfo = __get_emby_iteminfo()
+            cache.count("emby_get")
             if not personinfo:
                 logger.warn(f"未找到人物 {people.get('Name')} 的信息")
                 return None
@@ -600,14 +932,29 @@ class EmbyMetaRefresh(_PluginBase):
             update_character = False
             profile_path = None
 
-            # 从TMDB信息中更新人物信息
+            # 从TMDB信息中更新人物信息，同一TMDB人物只查询一次
             person_tmdbid, person_imdbid = __get_peopleid(personinfo)
             if person_tmdbid:
-                person_detail = self.tmdbchain.person_detail(int(person_tmdbid))
-                if person_detail:
-                    cn_name = self.__get_chinese_name(person_detail)
+                tmdb_info = cache.tmdb(person_tmdbid)
+                if tmdb_info:
+                    cache.count("tmdb_saved")
+                else:
+                    if not self.__acquire("tmdb"):
+                        return None
+                    person_detail = self.tmdbchain.person_detail(int(person_tmdbid))
+                    cache.count("tmdb")
+                    if person_detail:
+                        biography = person_detail.biography
+                        tmdb_info = {
+                            "name": self.__get_chinese_name(person_detail),
+                            "overview": biography if biography and StringUtils.is_chinese(biography) else "",
+                            "image": person_detail.profile_path or ""
+                        }
+                        cache.set_tmdb(person_tmdbid, **tmdb_info)
+                if tmdb_info:
+                    cn_name = tmdb_info.get("name")
                     # 图片优先从TMDB获取
-                    profile_path = person_detail.profile_path
+                    profile_path = tmdb_info.get("image")
                     if profile_path:
                         logger.debug(f"{people.get('Name')} 从TMDB获取到图片：{profile_path}")
                         profile_path = f"https://{settings.TMDB_IMAGE_DOMAIN}/t/p/original{profile_path}"
@@ -618,10 +965,9 @@ class EmbyMetaRefresh(_PluginBase):
                         ret_people["Name"] = cn_name
                         updated_name = True
                         # 更新中文描述
-                        biography = person_detail.biography
-                        if biography and StringUtils.is_chinese(biography):
+                        if tmdb_info.get("overview"):
                             logger.debug(f"{people.get('Name')} 从TMDB获取到中文描述")
-                            personinfo["Overview"] = biography
+                            personinfo["Overview"] = tmdb_info.get("overview")
                             updated_overview = True
 
             # 从豆瓣信息中更新人物信息
@@ -652,49 +998,39 @@ class EmbyMetaRefresh(_PluginBase):
                                   or not updated_overview
                                   or not update_character):
                 # 从豆瓣演员中匹配中文名称、角色和简介
-                for douban_actor in douban_actors:
-                    if douban_actor.get("latin_name") == people.get("Name") \
-                            or douban_actor.get("name") == people.get("Name"):
-                        # 名称
-                        if not updated_name:
-                            logger.info(f"{people.get('Name')} 从豆瓣中获取到中文名：{douban_actor.get('name')}")
-                            personinfo["Name"] = douban_actor.get("name")
-                            ret_people["Name"] = douban_actor.get("name")
-                            updated_name = True
-                        # 描述
-                        if not updated_overview:
-                            if douban_actor.get("title"):
-                                logger.info(f"{people.get('Name')} 从豆瓣中获取到中文描述：{douban_actor.get('title')}")
-                                personinfo["Overview"] = douban_actor.get("title")
-                                updated_overview = True
-                        # 饰演角色
-                        if not update_character:
-                            if douban_actor.get("character"):
-                                # "饰 詹姆斯·邦德 James Bond 007"
-                                character = re.sub(r"饰\s+", "",
-                                                   douban_actor.get("character"))
-                                character = re.sub("演员", "",
-                                                   character)
-                                character = re.sub("voice", "配音",
-                                                   character)
-                                character = re.sub("Director", "导演",
-                                                   character)
-                                if character:
-                                    logger.debug(f"{people.get('Name')} 从豆瓣中获取到饰演角色：{character}")
-                                    ret_people["Role"] = character
-                                    update_character = True
-                        # 图片
-                        if not profile_path:
-                            avatar = douban_actor.get("avatar") or {}
-                            if avatar.get("large"):
-                                logger.info(f"{people.get('Name')} 从豆瓣中获取到图片：{avatar.get('large')}")
-                                profile_path = avatar.get("large")
-                        break
+                douban_actor, character = douban_actors.find([people.get("Name")])
+                if douban_actor:
+                    # 名称
+                    if not updated_name:
+                        logger.info(f"{people.get('Name')} 从豆瓣中获取到中文名：{douban_actor.get('name')}")
+                        personinfo["Name"] = douban_actor.get("name")
+                        ret_people["Name"] = douban_actor.get("name")
+                        updated_name = True
+                    # 描述
+                    if not updated_overview:
+                        if douban_actor.get("title"):
+                            logger.info(f"{people.get('Name')} 从豆瓣中获取到中文描述：{douban_actor.get('title')}")
+                            personinfo["Overview"] = douban_actor.get("title")
+                            updated_overview = True
+                    # 饰演角色
+                    if not update_character:
+                        if character:
+                            logger.debug(f"{people.get('Name')} 从豆瓣中获取到饰演角色：{character}")
+                            ret_people["Role"] = character
+                            update_character = True
+                    # 图片
+                    if not profile_path:
+                        avatar = douban_actor.get("avatar") or {}
+                        if avatar.get("large"):
+                            logger.info(f"{people.get('Name')} 从豆瓣中获取到图片：{avatar.get('large')}")
+                            profile_path = avatar.get("large")
 
             # 更新人物图片
-            if profile_path:
+            if profile_path and ("doubanio.com" not in profile_path or self.__acquire("douban")) \
+                    and self.__acquire("emby"):
                 logger.debug(f"更新人物 {people.get('Name')} 的图片：{profile_path}")
                 self.set_item_image(itemid=people.get("Id"), imageurl=profile_path, emby=emby)
+                cache.count("image")
 
             # 锁定人物信息
             if updated_name:
@@ -706,16 +1042,35 @@ class EmbyMetaRefresh(_PluginBase):
 
             # 更新人物信息
             if updated_name or updated_overview or update_character:
+                if not self.__acquire("emby"):
+                    return None
                 logger.debug(f"更新人物 {people.get('Name')} 的信息：{personinfo}")
                 ret = self.set_iteminfo(itemid=people.get("Id"), iteminfo=personinfo, emby=emby)
+                cache.count("emby_post")
                 if ret:
+                    if updated_name:
+                        cache.set_person(self._EMBY_HOST, people.get("Id"), origin=people.get("Name"),
+                                         name=personinfo.get("Name"),
+                                         overview=personinfo.get("Overview") if updated_overview else "",
+                                         image=profile_path or "", tmdbid=person_tmdbid)
                     return ret_people
             else:
                 logger.debug(f"人物 {people.get('Name')} 未找到中文数据")
+                cache.set_person(self._EMBY_HOST, people.get("Id"), origin=people.get("Name"), tmdbid=person_tmdbid)
                 return None
         except Exception as err:
             logger.error(f"更新人物信息失败：{str(err)}")
             return None
+        finally:
+            if cache.changes >= 100:
+                self.__save_person_cache()
+
+    def __save_person_cache(self):
+        """
+        保存演职人员缓存
+        """
+        if self._person_cache and self._person_cache.changes:
+            self.save_data("person_cache", self._person_cache.to_dict())
 
     def __get_strm_assistant_config(self):
         """
@@ -944,27 +1299,39 @@ class EmbyMetaRefresh(_PluginBase):
             logger.error(f"获取人物中文名失败：{err}")
         return ""
 
-    def __get_douban_actors(self, title, imdb_id, type, year, season: int = None) -> List[dict]:
-        """
-        获取豆瓣演员信息
-        """
-        # 随机休眠 3-10 秒
-        sleep_time = 3 + int(time.time()) % 7
-        logger.debug(f"随机休眠 {sleep_time}秒 ...")
-        time.sleep(sleep_time)
-        # 匹配豆瓣信息
-        doubaninfo = self.chain.match_doubaninfo(name=title,
-                                                 imdbid=imdb_id,
-                                                 mtype=type,
-                                                 year=year,
-                                                 season=season)
-        # 豆瓣演员
-        if doubaninfo:
-            doubanitem = self.chain.douban_info(doubaninfo.get("id")) or {}
-            return (doubanitem.get("actors") or []) + (doubanitem.get("directors") or [])
-        else:
-            logger.info(f"未找到豆瓣信息：{title} {year}")
-        return []
+    def __get_douban_actors(self, title, imdb_id, type, year, season: int = None) -> DoubanCast:
+        """
+        获取豆瓣演员信息，同一标题、年份、季的结果缓存，剧集各集共用
+        """
+        key = (str(type), title, str(year), season)
+        # 同一时间只进行一个豆瓣查询，并发的相同查询等待缓存结果
+        with self._douban_lock:
+            cached = self._douban_cache.get(key)
+            if cached and time.time() - cached[0] < (self._douban_cache_ttl if cached[1] else self._douban_miss_ttl):
+                logger.debug(f"使用缓存的豆瓣演员信息：{title} {year}")
+                return cached[1]
+            # 豆瓣请求限速
+            if not self.__acquire("douban"):
+                return DoubanCast()
+            # 匹配豆瓣信息
+            doubaninfo = self.chain.match_doubaninfo(name=title,
+                                                     imdbid=imdb_id,
+                                                     mtype=type,
+                                                     year=year,
+                                                     season=season)
+            # 豆瓣演员
+            if doubaninfo:
+                if not self.__acquire("douban"):
+                    return DoubanCast()
+                doubanitem = self.chain.douban_info(doubaninfo.get("id")) or {}
+                cast = DoubanCast((doubanitem.get("actors") or []) + (doubanitem.get("directors") or []))
+            else:
+                logger.info(f"未找到豆瓣信息：{title} {year}")
+                cast = DoubanCast()
+            self._douban_cache = {k: v for k, v in self._douban_cache.items()
+                                  if time.time() - v[0] < (self._douban_cache_ttl if v[1] else self._douban_miss_ttl)}
+            self._douban_cache[key] = (time.time(), cast)
+            return cast
 
     @staticmethod
     def __need_trans_actor(item):
@@ -979,6 +1346,8 @@ class EmbyMetaRefresh(_PluginBase):
         return False
 
     def __get_item_info(self, item_id):
+        if not self.__acquire("emby"):
+            return {}
         res = RequestUtils().get_res(
             f"{self._EMBY_HOST}/emby/Users/{self._EMBY_USER}/Items/{item_id}?api_key={self._EMBY_APIKEY}")
         if res and res.status_code == 200:
@@ -1016,7 +1385,8 @@ class EmbyMetaRefresh(_PluginBase):
                     self.__refresh_emby_library_by_id(item_id=movie.item_id)
                     logger.info(f"已通知刷新Emby电影：{movie.title} ({movie.year}) item_id:{movie.item_id}")
                     if self._actor_chi:
-                        self.__update_people_chi(item_id=movie.item_id, title=movie.title, type=MediaType.MOVIE)
+                        self.__submit_people_chi(item_id=movie.item_id, title=movie.title, type=MediaType.MOVIE,
+                                                 emby=emby)
             else:
                 item_id = self.__get_emby_series_id_by_name(name=transferinfo.title, year=transferinfo.year)
                 if not item_id or item_id is None:
@@ -1045,8 +1415,8 @@ class EmbyMetaRefresh(_PluginBase):
                 logger.info(
                     f"已通知刷新Emby电视剧：{transferinfo.title} ({transferinfo.year}) {transferinfo.seasons}{transferinfo.episodes} item_id:{episode_item_id}")
                 if self._actor_chi:
-                    self.__update_people_chi(item_id=item_id, title=transferinfo.title, type=MediaType.TV,
-                                             season=season)
+                    self.__submit_people_chi(item_id=item_id, title=transferinfo.title, type=MediaType.TV,
+                                             season=season, emby=emby)
         except Exception as e:
             logger.error(f"刷新Emby出错：{e}")
 
@@ -1418,6 +1788,28 @@ class EmbyMetaRefresh(_PluginBase):
                             }
                         ]
                     },
+                    {
+                        'component': 'VRow',
+                        'content': [
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 4
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'people_workers',
+                                            'label': '演员并发数',
+                                            'placeholder': '同时处理的演职人员数，默认4'
+                                        }
+                                    }
+                                ]
+                            }
+                        ]
+                    },
                     {
                         'component': 'VRow',
                         'content': [
@@ -1475,6 +1867,7 @@ class EmbyMetaRefresh(_PluginBase):
             "mediaservers": [],
             "num": 5,
             "interval": 0,
+            "people_workers": 4,
         }
 
     def get_page(self) -> List[dict]:
@@ -1485,15 +1878,23 @@ class EmbyMetaRefresh(_PluginBase):
         退出插件
         """
         try:
+            # 取消未开始的演职人员处理，进行中的任务在限速等待或下一个人物前退出
+            self._event.set()
+            for executor in [self._item_executor, self._people_executor]:
+                if executor:
+                    executor.shutdown(wait=False, cancel_futures=True)
+            self._item_executor = None
+            self._people_executor = None
+            self._people_pending = []
             if self._scheduler:
                 self._scheduler.remove_all_jobs()
                 if self._scheduler.running:
-                    self._event.set()
                     self._scheduler.shutdown()
-                    self._event.clear()
                 self._scheduler = None
         except Exception as e:
             logger.error("退出插件失败：%s" % str(e))
+        finally:
+            self._event.clear()
 
     @staticmethod
     @db_query
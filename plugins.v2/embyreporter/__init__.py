@@ -1,5 +1,8 @@
+import hashlib
 import os
 import random
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from io import BytesIO
 from pathlib import Path
@@ -24,6 +27,157 @@ from app.utils.string import StringUtils
 cache = Cache()
 
 
+class ArtworkCache:
+    """
+    封面缩略图磁盘缓存，按服务器、媒体ID及图片tag缓存已缩放至榜单尺寸的封面，
+    图片tag随封面更新而变化，tag不变时无需重新下载
+    """
+
+    def __init__(self, cache_dir: str, size: Tuple[int, int] = (108, 159), max_age_days: int = 30):
+        self._cache_dir = cache_dir
+        self._size = size
+        self._max_age = max_age_days * 86400
+        os.makedirs(cache_dir, exist_ok=True)
+
+    def __path(self, server: str, item_id: str, tag: str) -> str:
+        return os.path.join(self._cache_dir, f"{server}_{item_id}_{tag}_{self._size[0]}x{self._size[1]}.jpg")
+
+    def get(self, server: str, item_id: str, tag: Optional[str]) -> Optional[Image.Image]:
+        """
+        读取缓存的缩略图，无图片tag时不使用缓存
+        """
+        if not tag:
+            return None
+        path = self.__path(server, item_id, tag)
+        try:
+            with Image.open(path) as image:
+                image.load()
+                cover = image.copy()
+            # 记录最近使用时间，用于清理
+            os.utime(path)
+            return cover
+        except (FileNotFoundError, OSError):
+            return None
+
+    def put(self, server: str, item_id: str, tag: Optional[str], data: bytes) -> Image.Image:
+        """
+        缩放封面并写入缓存
+        """
+        with Image.open(BytesIO(data)) as image:
+            cover = image.convert("RGB").resize(self._size)
+        if tag:
+            path = self.__path(server, item_id, tag)
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            try:
+                cover.save(tmp_path, format="JPEG", quality=95)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                logger.warn(f"写入封面缓存失败：{str(e)}")
+        return cover
+
+    def prune(self):
+        """
+        清理长期未使用的缩略图
+        """
+        expire = time.time() - self._max_age
+        try:
+            for entry in os.scandir(self._cache_dir):
+                if entry.is_file() and entry.stat().st_mtime < expire:
+                    os.remove(entry.path)
+        except OSError as e:
+            logger.warn(f"清理封面缓存失败：{str(e)}")
+
+
+class ReportRenderer:
+    """
+    观影报告绘制器，字体、遮罩只加载一次，背景与遮罩合成后缓存，可复用绘制多份报告
+    """
+
+    # 名称最大显示宽度
+    NAME_WIDTH = 110
+
+    def __init__(self, res_path: str):
+        bg_dir = os.path.join(res_path, "bg")
+        font_path = os.path.join(res_path, "PingFang Bold.ttf")
+        self.res_path = res_path
+        self._bg_files = [os.path.join(bg_dir, name) for name in sorted(os.listdir(bg_dir))]
+        with Image.open(os.path.join(res_path, "cover-ranks-mask-2.png")) as mask:
+            self._mask = mask.copy()
+        self.font = ImageFont.truetype(font_path, 18)
+        self.font_small = ImageFont.truetype(font_path, 14)
+        self.font_count = ImageFont.truetype(font_path, 8)
+        # 已合成遮罩的背景
+        self._backgrounds: Dict[str, Image.Image] = {}
+
+    def background(self) -> Image.Image:
+        """
+        随机获取已合成遮罩的背景副本
+        """
+        bg_file = self._bg_files[random.randint(0, len(self._bg_files) - 1)]
+        bg = self._backgrounds.get(bg_file)
+        if bg is None:
+            with Image.open(bg_file) as image:
+                bg = image.copy()
+            bg.paste(self._mask, (0, 0), self._mask)
+            self._backgrounds[bg_file] = bg
+        return bg.copy()
+
+    def truncate(self, name: str) -> str:
+        """
+        二分查找超出显示宽度时可保留的最长名称，结果与逐字删除一致
+        """
+        low, high = 0, len(name) - 1
+        while low < high:
+            mid = (low + high + 1) // 2
+            if self.font.getlength(name[:mid]) <= self.NAME_WIDTH:
+                low = mid
+            else:
+                high = mid - 1
+        return name[:low] + ".."
+
+    def render(self, movies: List[tuple], tvshows: List[tuple], show_time: bool = True) -> Image.Image:
+        """
+        绘制一份报告，榜单项为 (名称, 播放时长, 封面)
+        """
+        bg = self.background()
+        text = ImageDraw.Draw(bg)
+        # 电影第一行，剧集第二行
+        for offset_y, ranks in [(0, movies), (331, tvshows)]:
+            for index, (name, duration, cover) in enumerate(ranks):
+                try:
+                    # 名称显示偏移
+                    font_offset_y = 0
+                    temp_font = self.font
+                    # 名称超出长度缩小省略
+                    if self.font.getlength(name) > self.NAME_WIDTH:
+                        temp_font = self.font_small
+                        font_offset_y = 4
+                        name = self.truncate(name)
+                    # 绘制封面
+                    bg.paste(cover, (73 + 145 * index, 379 + offset_y))
+                    # 绘制 播放次数、影片名称
+                    if show_time:
+                        duration_text = StringUtils.str_secends(int(duration))
+                        EmbyReporter.draw_text_psd_style(text,
+                                                         (177 + 145 * index - self.font_count.getlength(duration_text),
+                                                          355 + offset_y),
+                                                         duration_text, self.font_count, 126)
+                    EmbyReporter.draw_text_psd_style(text, (74 + 145 * index, 542 + font_offset_y + offset_y), name,
+                                                     temp_font, 126)
+                except Exception as e:
+                    logger.error(f"绘制 {name} 失败：{str(e)}")
+                    continue
+        return bg
+
+    def render_batch(self, reports: Dict[str, Tuple[List[tuple], List[tuple]]],
+                     show_time: bool = True) -> Dict[str, Image.Image]:
+        """
+        批量绘制报告
+        :param reports: {报告名称: (电影榜单, 剧集榜单)}
+        """
+        return {key: self.render(movies, tvshows, show_time) for key, (movies, tvshows) in reports.items()}
+
+
 class EmbyReporter(_PluginBase):
     # 插件名称
     plugin_name = "Emby观影报告"
@@ -32,7 +186,7 @@ class EmbyReporter(_PluginBase):
     # 插件图标
     plugin_icon = "Pydiocells_A.png"
     # 插件版本
-    plugin_version = "2.1.5"
+    plugin_version = "2.1.8"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -60,6 +214,12 @@ class EmbyReporter(_PluginBase):
     _black_library = None
 
     _scheduler: Optional[BackgroundScheduler] = None
+    # 封面缩略图缓存
+    _artwork_cache: Optional[ArtworkCache] = None
+    # 获取榜单数据及封面的并发数
+    _fetch_workers: int = 8
+    # 报告绘制器
+    _renderer: Optional[ReportRenderer] = None
     mediaserver_helper = None
     PLAYBACK_REPORTING_TYPE_MOVIE = "ItemName"
     PLAYBACK_REPORTING_TYPE_TVSHOWS = "substr(ItemName,0, instr(ItemName, ' - '))"
@@ -71,6 +231,7 @@ class EmbyReporter(_PluginBase):
         # 停止现有任务
         self.stop_service()
         self.mediaserver_helper = MediaServerHelper()
+        self._artwork_cache = ArtworkCache(os.path.join(self.get_data_path(), "artwork"))
 
         if config:
             self._enabled = config.get("enabled")
@@ -136,6 +297,9 @@ class EmbyReporter(_PluginBase):
             logger.error("未配置Emby媒体服务器")
             return
 
+        self._artwork_cache.prune()
+        # 获取各媒体服务器榜单数据
+        reports = {}
         for emby_name, emby_server in emby_servers.items():
             logger.info(f"开始处理媒体服务器 {emby_name}")
             self._EMBY_HOST = emby_server.config.config.get("host")
@@ -146,9 +310,6 @@ class EmbyReporter(_PluginBase):
             if not self._EMBY_HOST.startswith("http"):
                 self._EMBY_HOST = "http://" + self._EMBY_HOST
 
-            # 获取当前时间并格式化
-            current_time = datetime.now().strftime("%Y%m%d%H%M%S")
-
             # 获取数据
             success, movies = self.get_report(types=self.PLAYBACK_REPORTING_TYPE_MOVIE, days=int(self._days),
                                               limit=int(self._cnt))
@@ -162,16 +323,23 @@ class EmbyReporter(_PluginBase):
                 logger.error("获取电视剧数据失败")
             logger.info(f"获取到电视剧 {tvshows}")
 
-            # 绘制海报
-            report_path = self.draw(res_path=self._res_dir,
-                                    movies=movies,
-                                    tvshows=tvshows,
-                                    show_time=self._show_time,
-                                    emby_name=emby_name)
+            reports[emby_name] = {"emby_name": emby_name,
+                                  "host": self._EMBY_HOST,
+                                  "apikey": self._EMBY_APIKEY,
+                                  "user": self._EMBY_USER,
+                                  "movies": movies,
+                                  "tvshows": tvshows}
 
+        # 绘制海报，各媒体服务器的封面一并获取
+        report_paths = self.draw_batch(res_path=self._res_dir, reports=reports, show_time=self._show_time)
+
+        # 获取当前时间并格式化
+        current_time = datetime.now().strftime("%Y%m%d%H%M%S")
+        for emby_name in reports.keys():
+            report_path = report_paths.get(emby_name)
             if not report_path:
-                logger.error("生成海报失败")
-                break
+                logger.error(f"{emby_name} 生成海报失败")
+                continue
 
             # 示例调用
             self.__split_image_by_height(report_path, f"/public/report_{emby_name}", [250, 330, 335])
@@ -608,146 +776,123 @@ class EmbyReporter(_PluginBase):
             logger.error("退出插件失败：%s" % str(e))
 
     def draw(self, res_path, movies, tvshows, show_time=True, emby_name=None):
-        # 默认路径 默认图
-        if not res_path:
-            res_path = os.path.join(Path(__file__).parent, "res")
-        # 绘图文件路径初始化
-        bg_path = os.path.join(res_path, "bg")
-        mask_path = os.path.join(res_path, "cover-ranks-mask-2.png")
-        font_path = os.path.join(res_path, "PingFang Bold.ttf")
-        # 随机调取背景, 路径: res/ranks/bg/...
-        bg_list = os.listdir(bg_path)
-        bg_path = os.path.join(bg_path, bg_list[random.randint(0, len(bg_list) - 1)])
-        # 初始绘图对象
-        bg = Image.open(bg_path)
-        mask = Image.open(mask_path)
-        bg.paste(mask, (0, 0), mask)
-        font = ImageFont.truetype(font_path, 18)
-        font_small = ImageFont.truetype(font_path, 14)
-        font_count = ImageFont.truetype(font_path, 8)
-
-        exists_movies = []
-        for i in movies:
-            try:
-                # 榜单项数据
-                user_id, item_id, item_type, name, count, duration = tuple(i)
-                print(item_type, item_id, name, count, StringUtils.str_secends(int(duration)))
-                # 封面图像获取
-                success, data = self.primary(item_id)
-                if not success:
+        """
+        绘制当前媒体服务器的观影报告
+        """
+        return self.draw_batch(res_path=res_path,
+                               reports={emby_name: {"emby_name": emby_name,
+                                                    "host": self._EMBY_HOST,
+                                                    "apikey": self._EMBY_APIKEY,
+                                                    "user": self._EMBY_USER,
+                                                    "movies": movies,
+                                                    "tvshows": tvshows}},
+                               show_time=show_time).get(emby_name)
+
+    def draw_batch(self, res_path, reports: Dict[str, dict], show_time=True) -> Dict[str, str]:
+        """
+        批量绘制观影报告（如按服务器或按用户），全部榜单并发获取后共用同一绘制器绘制
+        :param res_path: 资源目录
+        :param reports: {报告名称: {emby_name, host, apikey, user, movies: 电影榜单数据, tvshows: 剧集榜单数据}}
+        :param show_time: 是否显示播放时长
+        :return: {报告名称: 报告图片路径}
+        """
+        renderer = self.__get_renderer(res_path)
+
+        # 并发获取全部报告的榜单媒体信息及封面，每个媒体只请求一次
+        start = time.time()
+        prepared = {}
+        with ThreadPoolExecutor(max_workers=self._fetch_workers, thread_name_prefix="emby-report") as executor:
+            futures = {}
+            for key, report in reports.items():
+                server = (report.get("host"), report.get("apikey"), report.get("user"))
+                futures[key] = ([executor.submit(self.__fetch_rank, rank, *server)
+                                 for rank in report.get("movies") or []],
+                                [executor.submit(self.__fetch_rank, rank, *server)
+                                 for rank in report.get("tvshows") or []])
+            for key, (movie_futures, tv_futures) in futures.items():
+                exists_movies = [rank for rank in (future.result() for future in movie_futures) if rank][:5]
+                exists_tvs = [rank for rank in (future.result() for future in tv_futures) if rank][:5]
+                logger.info(f"{reports[key].get('emby_name')} {key} 过滤后未删除电影 {len(exists_movies)} 部，"
+                            f"电视剧 {len(exists_tvs)} 部")
+                # 无可绘制的榜单项时不生成报告，避免覆盖上次报告并推送空白图片
+                if not exists_movies and not exists_tvs:
                     continue
+                prepared[key] = (exists_movies, exists_tvs)
+        fetched = time.time()
 
-                # 过滤电影
-                if self._black_library:
-                    success, info = self.items(user_id, item_id)
-                    if success and info:
-                        if (success and any(black_name for black_name in self._black_library.split(",") if
-                                            black_name in info.get("Path", ""))):
-                            logger.info(f"电影 {name} 已在媒体库黑名单 {self._black_library} 中，已过滤")
-                            continue
-                exists_movies.append(i)
-            except Exception as e:
-                logger.error(str(e))
-                continue
+        report_paths = {}
+        for key, image in renderer.render_batch(prepared, show_time=show_time).items():
+            save_path = f"/public/report_{key}.jpg"
+            if Path(save_path).exists():
+                Path.unlink(Path(save_path))
+            image.save(save_path)
+            report_paths[key] = save_path
+        logger.info(f"绘制观影报告 {len(report_paths)} 份，获取封面耗时 {fetched - start:.2f} 秒，"
+                    f"绘制耗时 {time.time() - fetched:.2f} 秒")
+        return report_paths
 
-        logger.info(f"过滤后未删除电影 {len(exists_movies)} 部")
-        # 合并绘制
-        if len(exists_movies) < 5:
-            for i in range(5 - len(exists_movies) + 1):
-                exists_movies.append({"item_id": i})
-        if len(exists_movies) > 5:
-            exists_movies = exists_movies[:5]
+    def __get_renderer(self, res_path) -> ReportRenderer:
+        """
+        获取绘制器，资源目录不变时复用
+        """
+        # 默认路径 默认图
+        if not res_path:
+            res_path = os.path.join(Path(__file__).parent, "res")
+        if not self._renderer or self._renderer.res_path != res_path:
+            self._renderer = ReportRenderer(res_path)
+        return self._renderer
 
-        exists_tvs = []
-        for i in tvshows:
-            try:
-                # 榜单项数据
-                user_id, item_id, item_type, name, count, duration = tuple(i)
-                print(item_type, item_id, name, count, StringUtils.str_secends(int(duration)))
-                # 图片获取，剧集主封面获取
-                # 获取剧ID
-                success, data = self.items(user_id, item_id)
-                if not success:
-                    continue
-                # 过滤电视剧
-                if self._black_library:
-                    logger.error(f"data: {data.get('Path')}")
-                    if success and any(black_name for black_name in self._black_library.split(",") if
-                                       black_name in data.get("Path", "")):
-                        logger.info(f"电视剧 {name} 已在媒体库黑名单 {self._black_library} 中，已过滤")
-                        continue
-                # 封面图像获取
-                success, data = self.primary(item_id)
-                if not success:
-                    continue
-                exists_tvs.append(i)
-            except Exception as e:
-                print(str(e))
-                continue
-        logger.info(f"过滤后未删除电视剧 {len(exists_tvs)} 部")
-        if len(exists_tvs) > 5:
-            exists_tvs = exists_tvs[:5]
-
-        all_ranks = exists_movies + exists_tvs
-        index, offset_y = (-1, 0)
-        for i in all_ranks:
-            index += 1
-            try:
-                # 榜单项数据
-                user_id, item_id, item_type, name, count, duration = tuple(i)
-                # 图片获取，剧集主封面获取
+    def __fetch_rank(self, rank, host: str = None, apikey: str = None,
+                     user: str = None) -> Optional[Tuple[str, Any, Image.Image]]:
+        """
+        获取单个榜单项的媒体信息及封面缩略图，过滤黑名单媒体库
+        :param host: 榜单所属Emby地址，为空时使用当前处理的媒体服务器
+        :param user: 榜单项未记录用户时使用的用户ID
+        :return: (名称, 播放时长, 封面)，获取失败或被过滤时返回None
+        """
+        try:
+            # 榜单项数据
+            user_id, item_id, item_type, name, count, duration = tuple(rank)
+            success, info = self.items(user_id or user, item_id, host=host, apikey=apikey)
+            if not success or not isinstance(info, dict):
                 if item_type != "Movie":
-                    # 获取剧ID
-                    success, data = self.items(user_id, item_id)
-                    if not success:
-                        index -= 1
-                        continue
-                    item_id = data["SeriesId"]
-                # 封面图像获取
-                success, data = self.primary(item_id)
-                if not success:
-                    if item_type != "Movie":
-                        index -= 1
-                    continue
-                # 剧集Y偏移
-                if index >= 5:
-                    index = 0
-                    offset_y = 331
-                # 名称显示偏移
-                font_offset_y = 0
-                temp_font = font
-                # 名称超出长度缩小省略
-                if font.getlength(name) > 110:
-                    temp_font = font_small
-                    font_offset_y = 4
-                    for i in range(len(name)):
-                        name = name[:len(name) - 1]
-                        if font.getlength(name) <= 110:
-                            break
-                    name += ".."
-                # 绘制封面
-                cover = Image.open(BytesIO(data))
-                cover = cover.resize((108, 159))
-                bg.paste(cover, (73 + 145 * index, 379 + offset_y))
-                # 绘制 播放次数、影片名称
-                text = ImageDraw.Draw(bg)
-                if show_time:
-                    self.draw_text_psd_style(text,
-                                             (177 + 145 * index - font_count.getlength(
-                                                 StringUtils.str_secends(int(duration))),
-                                              355 + offset_y),
-                                             StringUtils.str_secends(int(duration)), font_count, 126)
-                self.draw_text_psd_style(text, (74 + 145 * index, 542 + font_offset_y + offset_y), name, temp_font, 126)
-            except Exception:
-                continue
+                    # 剧集需从单集信息获取剧ID
+                    return None
+                info = {}
+            # 过滤黑名单媒体库
+            if self._black_library and any(black_name for black_name in self._black_library.split(",") if
+                                           black_name in info.get("Path", "")):
+                logger.info(f"{'电影' if item_type == 'Movie' else '电视剧'} {name} "
+                            f"已在媒体库黑名单 {self._black_library} 中，已过滤")
+                return None
+            # 剧集使用剧的主封面
+            if item_type == "Movie":
+                poster_id, tag = item_id, (info.get("ImageTags") or {}).get("Primary")
+            else:
+                poster_id, tag = info.get("SeriesId"), info.get("SeriesPrimaryImageTag")
+                if not poster_id:
+                    return None
+            cover = self.__get_cover(poster_id, tag, host=host)
+            if not cover:
+                return None
+            return name, duration, cover
+        except Exception as e:
+            logger.error(f"获取榜单项 {rank} 失败：{str(e)}")
+            return None
 
-        if index >= 0:
-            save_path = f"/public/report_{emby_name}.jpg"
-            if Path(save_path).exists():
-                Path.unlink(Path(save_path))
-            bg.save(save_path)
-            return save_path
-        return None
+    def __get_cover(self, item_id, tag: Optional[str], host: str = None) -> Optional[Image.Image]:
+        """
+        获取封面缩略图，优先读取磁盘缓存
+        """
+        server = hashlib.md5(str(host or self._EMBY_HOST).encode()).hexdigest()[:8]
+        cover = self._artwork_cache.get(server, item_id, tag)
+        if cover:
+            return cover
+        # 只需榜单尺寸，按2倍尺寸请求即可
+        success, data = self.primary(item_id, width=216, height=318, tag=tag, host=host)
+        if not success:
+            return None
+        return self._artwork_cache.put(server, item_id, tag, data)
 
     @staticmethod
     def draw_text_psd_style(draw, xy, text, font, tracking=0, leading=None, **kwargs):
@@ -788,9 +933,11 @@ class EmbyReporter(_PluginBase):
             x = xy[0]
 
     @cache.memoize(ttl=600)
-    def primary(self, item_id, width=720, height=1440, quality=90, ret_url=False):
+    def primary(self, item_id, width=720, height=1440, quality=90, ret_url=False, tag=None, host=None):
         try:
-            url = self._EMBY_HOST + f"/emby/Items/{item_id}/Images/Primary?maxHeight={height}&maxWidth={width}&quality={quality}"
+            url = (host or self._EMBY_HOST) + f"/emby/Items/{item_id}/Images/Primary?maxHeight={height}&maxWidth={width}&quality={quality}"
+            if tag:
+                url += f"&tag={tag}"
             if ret_url:
                 return url
             resp = RequestUtils().get_res(url=url)
@@ -827,9 +974,9 @@ class EmbyReporter(_PluginBase):
         return True, resp.content
 
     @cache.memoize(ttl=300)
-    def items(self, user_id, item_id):
+    def items(self, user_id, item_id, host=None, apikey=None):
         try:
-            url = f"{self._EMBY_HOST}/emby/Users/{user_id}/Items/{item_id}?api_key={self._EMBY_APIKEY}"
+            url = f"{host or self._EMBY_HOST}/emby/Users/{user_id}/Items/{item_id}?api_key={apikey or self._EMBY_APIKEY}"
             resp = RequestUtils().get_res(url=url)
 
             if resp.status_code != 204 and resp.status_code != 200:
@@ -5,15 +5,15 @@ import shutil
 import threading
 import traceback
 import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
-from typing import List, Tuple, Dict, Any, Optional
+from typing import List, Tuple, Dict, Any, Optional, Callable
 
 import pytz
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileSystemEventHandler, FileCreatedEvent
 from watchdog.observers import Observer
-from watchdog.observers.polling import PollingObserver
 
 from app import schemas
 from app.core.config import settings
@@ -27,6 +27,389 @@ from app.utils.system import SystemUtils
 lock = threading.Lock()
 
 
+class EventDebouncer:
+    """
+    目录监控事件防抖队列
+    监控线程只负责登记路径，同一路径在静默窗口内的重复事件合并为一次；
+    窗口结束后检查文件大小，大小仍在变化（下载/复制中）则继续等待，稳定后再分发给处理线程池
+    """
+
+    class _Pending:
+        __slots__ = ("mon_path", "text", "due", "size", "seq")
+
+        def __init__(self, mon_path: str, text: str, due: float):
+            self.mon_path = mon_path
+            self.text = text
+            self.due = due
+            self.size = None
+            self.seq = 0
+
+    def __init__(self, handler: Callable[[str, str], Any], delay: float = 3, workers: int = 2,
+                 max_pending: int = 50000, name: str = "监控事件"):
+        """
+        :param handler: 处理函数，参数为 (event_path, mon_path)
+        :param delay: 静默窗口秒数，同时也是文件大小稳定检查间隔
+        :param workers: 处理线程数
+        :param max_pending: 最大排队路径数，超出后丢弃新事件
+        :param name: 日志名称
+        """
+        self._handler = handler
+        self._delay = max(float(delay), 0.1)
+        self._workers = max(int(workers), 1)
+        self._max_pending = max_pending
+        self._name = name
+        self._pending: Dict[str, EventDebouncer._Pending] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+        self._executor = ThreadPoolExecutor(max_workers=self._workers, thread_name_prefix="event-debounce")
+        self._slots = threading.BoundedSemaphore(self._workers * 2)
+        self._running = 0
+        self.queued = 0
+        self.coalesced = 0
+        self.dispatched = 0
+        self.vanished = 0
+        self.dropped = 0
+        self._last_drop_log = 0.0
+        self._thread = threading.Thread(target=self.__loop, name="event-debounce-dispatcher", daemon=True)
+        self._thread.start()
+
+    def put(self, event_path: str, mon_path: str, text: str = ""):
+        """
+        登记一个事件，仅操作内存，不阻塞监控线程
+        """
+        now = time.monotonic()
+        with self._cond:
+            if self._stopped:
+                return
+            pending = self._pending.get(event_path)
+            if pending:
+                # 重复事件，重新计时
+                pending.due = now + self._delay
+                pending.seq += 1
+                self.coalesced += 1
+                return
+            if len(self._pending) >= self._max_pending:
+                self.dropped += 1
+                if now - self._last_drop_log > 60:
+                    self._last_drop_log = now
+                    logger.warn(f"{self._name}队列已满，丢弃事件：{event_path}，{self}")
+                return
+            self._pending[event_path] = self._Pending(mon_path=mon_path, text=text, due=now + self._delay)
+            self.queued += 1
+            self._cond.notify()
+
+    def __loop(self):
+        """
+        分发线程：取出静默窗口已结束的路径，检查文件大小是否稳定
+        """
+        while True:
+            with self._cond:
+                if self._stopped:
+                    return
+                now = time.monotonic()
+                due = [(path, pending.seq, pending.size) for path, pending in self._pending.items()
+                       if pending.due <= now]
+                if not due:
+                    wait = min((p.due for p in self._pending.values()), default=now + 60) - now
+                    self._cond.wait(timeout=min(max(wait, 0.05), 60))
+                    continue
+            for path, seq, size in due:
+                if self._stopped:
+                    return
+                try:
+                    current = os.stat(path).st_size
+                except OSError:
+                    current = None
+                ready = False
+                with self._cond:
+                    pending = self._pending.get(path)
+                    if not pending or pending.seq != seq:
+                        # 检查期间又有新事件，等待下一个窗口
+                        continue
+                    if current is None:
+                        self._pending.pop(path, None)
+                        self.vanished += 1
+                        continue
+                    if size is not None and current == size:
+                        self._pending.pop(path, None)
+                        ready = True
+                    else:
+                        # 首次检查或大小仍在变化
+                        pending.size = current
+                        pending.due = time.monotonic() + self._delay
+                if ready:
+                    self.__dispatch(path, pending.mon_path, pending.text)
+
+    def __dispatch(self, event_path: str, mon_path: str, text: str):
+        """
+        提交到处理线程池，线程池繁忙时阻塞分发线程
+        """
+        while not self._slots.acquire(timeout=1):
+            if self._stopped:
+                return
+        if self._stopped:
+            self._slots.release()
+            return
+        with self._cond:
+            self._running += 1
+            self.dispatched += 1
+
+        def _run():
+            try:
+                logger.debug(f"{self._name}：{text} {event_path}")
+                self._handler(event_path, mon_path)
+            except Exception as e:
+                logger.error(f"{self._name}处理 {event_path} 出错：{str(e)}")
+            finally:
+                with self._cond:
+                    self._running -= 1
+                self._slots.release()
+
+        try:
+            self._executor.submit(_run)
+        except RuntimeError:
+            with self._cond:
+                self._running -= 1
+            self._slots.release()
+
+    @property
+    def depth(self) -> int:
+        """
+        等待中及处理中的事件数
+        """
+        with self._cond:
+            return len(self._pending) + self._running
+
+    def stop(self):
+        """
+        停止分发，丢弃未处理事件
+        """
+        with self._cond:
+            self._stopped = True
+            self._pending.clear()
+            self._cond.notify_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"{self._name}队列已停止，{self}")
+
+    def __str__(self):
+        return (f"排队 {len(self._pending)}，处理中 {self._running}，累计 {self.queued}，"
+                f"合并 {self.coalesced}，分发 {self.dispatched}，已消失 {self.vanished}，丢弃 {self.dropped}")
+
+
+class DirMtimePoller(threading.Thread):
+    """
+    按目录mtime增量轮询的监控器，用于网络共享及FUSE挂载目录
+    目录内新增、删除、重命名条目会改变该目录的mtime，mtime未变化的目录不再列出内容，也不stat其中的文件；
+    部分FUSE挂载不可靠更新目录mtime，每隔 full_every 轮做一次完整列目录校正
+    """
+
+    def __init__(self, path: str, handler: FileSystemEventHandler, interval: float = 10, full_every: int = 30,
+                 desc: str = ""):
+        super().__init__(name=f"mtime-poller:{path}", daemon=True)
+        self._root = path
+        self._desc = desc
+        self._handler = handler
+        self._interval = interval
+        self._full_every = max(int(full_every), 1)
+        self._stopped = threading.Event()
+        # 目录 -> (mtime, 文件名集合, 子目录名集合)
+        self._dirs: Dict[str, Tuple[int, set, set]] = {}
+        self.file_count = 0
+        self.scan_cost = 0.0
+
+    @property
+    def watch_count(self) -> int:
+        return len(self._dirs)
+
+    def snapshot(self):
+        """
+        建立初始快照，不触发事件
+        """
+        start = time.time()
+        self.__poll(full=True, emit=False)
+        self.scan_cost = time.time() - start
+        self.file_count = sum(len(rec[1]) for rec in self._dirs.values())
+
+    def run(self):
+        try:
+            self.snapshot()
+            logger.info(f"{self._root} 使用目录轮询（{self._desc}），间隔 {self._interval} 秒，"
+                        f"监控目录数 {self.watch_count}，文件数 {self.file_count}，"
+                        f"初始扫描耗时 {self.scan_cost:.2f} 秒")
+        except Exception as e:
+            logger.error(f"{self._root} 初始扫描出错：{str(e)}")
+        rounds = 0
+        while not self._stopped.wait(self._interval):
+            rounds += 1
+            try:
+                start = time.time()
+                listed = self.__poll(full=rounds % self._full_every == 0, emit=True)
+                logger.debug(f"{self._root} 轮询完成，目录 {len(self._dirs)}，"
+                             f"重新列出 {listed}，耗时 {time.time() - start:.2f} 秒")
+            except Exception as e:
+                logger.error(f"{self._root} 轮询出错：{str(e)}")
+
+    def stop(self):
+        self._stopped.set()
+
+    def __poll(self, full: bool, emit: bool) -> int:
+        """
+        遍历目录树，仅列出mtime变化的目录
+        :return: 重新列出的目录数
+        """
+        listed = 0
+        stack = [self._root]
+        while stack and not self._stopped.is_set():
+            dir_path = stack.pop()
+            record = self._dirs.get(dir_path)
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            if record and record[0] == mtime and not full:
+                stack.extend(os.path.join(dir_path, name) for name in record[2])
+                continue
+            files, subdirs = set(), set()
+            try:
+                with os.scandir(dir_path) as entries:
+                    for entry in entries:
+                        try:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.add(entry.name)
+                            else:
+                                files.add(entry.name)
+                        except OSError:
+                            continue
+            except OSError:
+                self.__forget(dir_path)
+                continue
+            listed += 1
+            self._dirs[dir_path] = (mtime, files, subdirs)
+            if record:
+                for name in record[2] - subdirs:
+                    self.__forget(os.path.join(dir_path, name))
+            if emit:
+                for name in files - (record[1] if record else set()):
+                    self._handler.on_created(FileCreatedEvent(os.path.join(dir_path, name)))
+            stack.extend(os.path.join(dir_path, name) for name in subdirs)
+        return listed
+
+    def __forget(self, dir_path: str):
+        """
+        移除已消失目录及其子目录的记录
+        """
+        prefix = dir_path + os.sep
+        for path in [p for p in self._dirs if p == dir_path or p.startswith(prefix)]:
+            self._dirs.pop(path, None)
+
+
+class MonitorObserver:
+    """
+    监控器选择：本地文件系统使用系统原生监控（inotify），网络共享及FUSE挂载使用目录mtime轮询
+    """
+
+    # 需要轮询的文件系统类型，fuse.* 均视为远程挂载
+    REMOTE_FS_TYPES = {"nfs", "nfs4", "cifs", "smb3", "smbfs", "ncpfs", "9p", "afs", "ceph",
+                       "glusterfs", "davfs", "sshfs", "fuse"}
+
+    @staticmethod
+    def fs_type(path: str) -> Optional[str]:
+        """
+        获取路径所在挂载点的文件系统类型
+        """
+        try:
+            real_path = os.path.realpath(path)
+            matched, fs_type = "", None
+            with open("/proc/mounts", "r", encoding="utf-8") as f:
+                for line in f:
+                    parts = line.split()
+                    if len(parts) < 3:
+                        continue
+                    mount_point = parts[1].replace("\\040", " ")
+                    if (real_path == mount_point
+                        or real_path.startswith(mount_point.rstrip("/") + "/")) \
+                            and len(mount_point) >= len(matched):
+                        matched, fs_type = mount_point, parts[2]
+            return fs_type
+        except Exception as e:
+            logger.debug(f"获取 {path} 文件系统类型失败：{str(e)}")
+            return None
+
+    @classmethod
+    def is_remote(cls, path: str) -> bool:
+        """
+        是否网络共享或FUSE挂载
+        """
+        fs_type = cls.fs_type(path)
+        if not fs_type:
+            return False
+        return fs_type in cls.REMOTE_FS_TYPES or (fs_type.startswith("fuse.") and fs_type != "fuseblk")
+
+    @staticmethod
+    def __inotify_watch_count(observer) -> Optional[int]:
+        """
+        原生监控的watch数，取不到时返回None
+        """
+        try:
+            count = 0
+            for emitter in observer.emitters:
+                count += len(emitter._inotify._inotify._wd_for_path)
+            return count
+        except Exception:
+            return None
+
+    @classmethod
+    def start(cls, path: str, handler: FileSystemEventHandler, mode: str = "auto", interval: float = 10):
+        """
+        启动目录监控
+        :param path: 监控目录
+        :param handler: 事件处理类
+        :param mode: fast 原生监控 / compatibility 轮询 / auto 按文件系统自动选择
+        :param interval: 轮询间隔（秒）
+        :return: 已启动的监控器，需调用 stop/join 停止
+        """
+        if mode == "compatibility" or (mode == "auto" and cls.is_remote(path)):
+            return cls.__start_polling(path, handler, interval)
+        observer = None
+        try:
+            start = time.time()
+            observer = Observer(timeout=10)
+            observer.schedule(handler, path=path, recursive=True)
+            observer.daemon = True
+            observer.start()
+            watches = cls.__inotify_watch_count(observer)
+            logger.info(f"{path} 使用原生监控（{cls.fs_type(path) or '未知文件系统'}），"
+                        f"监控数 {watches if watches is not None else '未知'}，"
+                        f"启动耗时 {time.time() - start:.2f} 秒")
+            return observer
+        except Exception as e:
+            if observer:
+                try:
+                    observer.stop()
+                except Exception:
+                    pass
+            err_msg = str(e)
+            if "inotify" in err_msg and "reached" in err_msg:
+                logger.warn(f"{path} 原生监控数已达上限：{err_msg}，改用轮询，可在宿主机上（不是docker容器内）执行以下命令后重启："
+                            + """
+                            echo fs.inotify.max_user_watches=524288 | sudo tee -a /etc/sysctl.conf
+                            echo fs.inotify.max_user_instances=524288 | sudo tee -a /etc/sysctl.conf
+                            sudo sysctl -p
+                            """)
+            else:
+                logger.warn(f"{path} 原生监控启动失败：{err_msg}，改用轮询")
+            return cls.__start_polling(path, handler, interval)
+
+    @classmethod
+    def __start_polling(cls, path: str, handler: FileSystemEventHandler, interval: float):
+        # 初始扫描在轮询线程中进行，不阻塞插件启动
+        poller = DirMtimePoller(path=path, handler=handler, interval=interval,
+                                desc=cls.fs_type(path) or "未知文件系统")
+        poller.start()
+        return poller
+
+
 class FileMonitorHandler(FileSystemEventHandler):
     """
     目录监控响应类
@@ -62,7 +445,7 @@ class FileSoftLink(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/softlink.png"
     # 插件版本
-    plugin_version = "2.0.6"
+    plugin_version = "2.0.8"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -85,6 +468,10 @@ class FileSoftLink(_PluginBase):
     _force = None
     _size = 0
     _sync_interval = 0
+    # 监控事件静默窗口（秒）
+    _event_delay = 3
+    # 监控事件防抖队列
+    _debouncer: Optional[EventDebouncer] = None
     # 模式 compatibility/fast
     _mode = "compatibility"
     _monitor_dirs = ""
@@ -116,6 +503,7 @@ class FileSoftLink(_PluginBase):
             self._force = config.get("force")
             self._size = config.get("size") or 0
             self._sync_interval = float(config.get("sync_interval"))
+            self._event_delay = int(config.get("event_delay") or 3)
             self._rmt_mediaext = (
                 config.get("rmt_mediaext")
                 or ".mp4, .mkv, .ts, .iso,.rmvb, .avi, .mov, .mpeg,.mpg, .wmv, .3gp, .asf, .m4v, .flv, .m2ts, .strm,.tp, .f4v"
@@ -127,6 +515,14 @@ class FileSoftLink(_PluginBase):
         if self._enabled or self._onlyonce:
             # 定时服务管理器
             self._scheduler = BackgroundScheduler(timezone=settings.TZ)
+            if self._enabled:
+                # 监控事件合并、等待文件写入完成后再处理
+                self._debouncer = EventDebouncer(
+                    handler=lambda path, mon: self.__handle_file(event_path=path, mon_path=mon),
+                    delay=self._event_delay,
+                    workers=1,
+                    name="实时软连接监控事件",
+                )
 
             # 读取目录配置
             monitor_dirs = self._monitor_dirs.split("\n")
@@ -229,18 +625,13 @@ class FileSoftLink(_PluginBase):
         异步开启实时软链接
         """
         try:
-            if str(self._mode) == "compatibility":
-                # 兼容模式，目录同步性能降低且NAS不能休眠，但可以兼容挂载的远程共享目录如SMB
-                observer = PollingObserver(timeout=10)
-            else:
-                # 内部处理系统操作类型选择最优解
-                observer = Observer(timeout=10)
-            self._observer.append(observer)
-            observer.schedule(
-                FileMonitorHandler(source_dir, self), path=source_dir, recursive=True
+            # 兼容模式按目录mtime轮询，性能模式使用原生监控，自动模式按文件系统类型选择
+            observer = MonitorObserver.start(
+                path=source_dir,
+                handler=FileMonitorHandler(source_dir, self),
+                mode=str(self._mode),
             )
-            observer.daemon = True
-            observer.start()
+            self._observer.append(observer)
             logger.info(f"{source_dir} 的实时软链接服务启动")
         except Exception as e:
             err_msg = str(e)
@@ -274,6 +665,7 @@ class FileSoftLink(_PluginBase):
                 "force": self._force,
                 "size": self._size,
                 "sync_interval": self._sync_interval,
+                "event_delay": self._event_delay,
                 "rmt_mediaext": self._rmt_mediaext,
             }
         )
@@ -588,7 +980,10 @@ class FileSoftLink(_PluginBase):
         if not event.is_directory:
             # 文件发生变化
             logger.debug("文件%s：%s" % (text, event_path))
-            self.__handle_file(event_path=event_path, mon_path=mon_path)
+            if self._debouncer:
+                self._debouncer.put(event_path=event_path, mon_path=mon_path, text=text)
+            else:
+                self.__handle_file(event_path=event_path, mon_path=mon_path)
 
     def __handle_file(self, event_path: str, mon_path: str):
         """
@@ -867,6 +1262,7 @@ class FileSoftLink(_PluginBase):
                                                     "value": "compatibility",
                                                 },
                                                 {"title": "性能模式", "value": "fast"},
+                                                {"title": "自动模式", "value": "auto"},
                                                 {
                                                     "title": "不监控",
                                                     "value": "nomonitor",
@@ -918,6 +1314,20 @@ class FileSoftLink(_PluginBase):
                                     }
                                 ],
                             },
+                            {
+                                "component": "VCol",
+                                "props": {"cols": 12, "md": 4},
+                                "content": [
+                                    {
+                                        "component": "VTextField",
+                                        "props": {
+                                            "model": "event_delay",
+                                            "label": "监控事件静默时间（s）",
+                                            "placeholder": "3",
+                                        },
+                                    }
+                                ],
+                            },
                         ],
                     },
                     {
@@ -1037,6 +1447,7 @@ class FileSoftLink(_PluginBase):
             "cron": "",
             "size": 0,
             "sync_interval": 0,
+            "event_delay": 3,
             "url": "",
             "rmt_mediaext": ".mp4, .mkv, .ts, .iso,.rmvb, .avi, .mov, .mpeg,.mpg, .wmv, .3gp, .asf, .m4v, .flv, .m2ts, .strm,.tp, .f4v",
         }
@@ -1056,6 +1467,9 @@ class FileSoftLink(_PluginBase):
                 except Exception as e:
                     print(str(e))
         self._observer = []
+        if self._debouncer:
+            self._debouncer.stop()
+            self._debouncer = None
         if self._scheduler:
             self._scheduler.remove_all_jobs()
             if self._scheduler.running:
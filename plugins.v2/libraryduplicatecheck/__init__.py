@@ -1,9 +1,11 @@
+import json
 import re
 import shutil
 import threading
+import time
 from datetime import datetime, timedelta
 import os
-from collections import defaultdict
+from collections import defaultdict, OrderedDict
 from pathlib import Path
 import pytz
 
@@ -11,7 +13,7 @@ from app.core.config import settings
 from app.helper.mediaserver import MediaServerHelper
 from app.modules.emby import Emby
 from app.plugins import _PluginBase
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Callable
 from app.log import logger
 from apscheduler.schedulers.background import BackgroundScheduler
 from apscheduler.triggers.cron import CronTrigger
@@ -23,6 +25,348 @@ from app.utils.system import SystemUtils
 lock = threading.Lock()
 
 
+class DirListingCache:
+    """
+    目录文件列表缓存，有效期内同一目录只列举一次，减少网盘挂载目录的远程列举次数
+    """
+
+    def __init__(self, ttl: float = 30, max_dirs: int = 2048):
+        self._ttl = ttl
+        self._max_dirs = max_dirs
+        self._lock = threading.Lock()
+        self._entries: OrderedDict = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def put(self, dir_path: str, names: List[str]):
+        """
+        写入目录文件列表，如全量遍历时os.walk已获取的列表
+        """
+        with self._lock:
+            self._entries[dir_path] = (time.monotonic(), list(names))
+            self._entries.move_to_end(dir_path)
+            while len(self._entries) > self._max_dirs:
+                self._entries.popitem(last=False)
+
+    def listdir(self, dir_path: str) -> List[str]:
+        """
+        获取目录文件列表，缓存过期时重新列举
+        """
+        with self._lock:
+            entry = self._entries.get(dir_path)
+            if entry and time.monotonic() - entry[0] < self._ttl:
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        try:
+            names = os.listdir(dir_path)
+        except (FileNotFoundError, NotADirectoryError):
+            names = []
+        self.put(dir_path, names)
+        return names
+
+    def same_stem_files(self, file_path: str) -> List[Path]:
+        """
+        获取同目录下同名的文件（nfo、jpg等），等同于 parent.glob(f"{stem}.*")
+        """
+        path = Path(file_path)
+        prefix = f"{path.stem}."
+        return [path.parent / name for name in self.listdir(str(path.parent))
+                if name.startswith(prefix) and not name.startswith(".")]
+
+    def exists(self, file_path: str) -> bool:
+        """
+        判断文件是否在目录列表中
+        """
+        path = Path(file_path)
+        return path.name in self.listdir(str(path.parent))
+
+    def invalidate(self, file_path: str):
+        """
+        文件变化时使所在目录的缓存失效
+        """
+        with self._lock:
+            self._entries.pop(str(Path(file_path).parent), None)
+            self._entries.pop(str(file_path), None)
+
+    def clear(self):
+        """
+        清空缓存
+        """
+        with self._lock:
+            self._entries.clear()
+
+
+class PathClassifier:
+    """
+    文件路径分类器，插件初始化时预编译扩展名集合及过滤规则，处理文件时快速分类
+    """
+    # 分类结果
+    IGNORED = "ignored"
+    EXCLUDED = "excluded"
+    MEDIA = "media"
+    SUBTITLE = "subtitle"
+    OTHER = "other"
+    UNKNOWN = "unknown"
+
+    # 回收站及隐藏的文件
+    _ignore_re = re.compile(r"/@Recycle|/#recycle|/\.|/@eaDir")
+    _subtitle_exts = frozenset([".srt", ".ass", ".ssa", ".sub"])
+
+    def __init__(self, media_exts: Any = None, other_exts: Any = None, exclude_keywords: Any = None):
+        """
+        :param media_exts: 媒体文件扩展名，逗号分隔字符串或列表
+        :param other_exts: 非媒体文件扩展名，逗号分隔字符串或列表
+        :param exclude_keywords: 过滤关键字（区分大小写），换行分隔字符串或列表
+        """
+        self.media_exts = self.__parse_exts(media_exts)
+        self.other_exts = self.__parse_exts(other_exts)
+        # SystemUtils.exits_files 等需要列表参数
+        self.media_ext_list = list(self.media_exts)
+        self._keywords: List[Tuple[str, Any]] = []
+        self._keywords_re = None
+        self._exclude_words: Tuple[str, ...] = ()
+        self._exclude_words_list: List[Tuple[str, Any]] = []
+        self._exclude_words_re = None
+        if isinstance(exclude_keywords, str):
+            exclude_keywords = exclude_keywords.split("\n")
+        self._keywords, self._keywords_re = self.__compile(exclude_keywords or [], flags=0)
+
+    @staticmethod
+    def __parse_exts(exts: Any) -> frozenset:
+        """
+        解析扩展名配置
+        """
+        if not exts:
+            return frozenset()
+        if isinstance(exts, str):
+            exts = exts.split(",")
+        return frozenset(ext.strip().lower() for ext in exts if ext and ext.strip())
+
+    @staticmethod
+    def __compile(keywords: Any, flags: int) -> Tuple[List[Tuple[str, Any]], Any]:
+        """
+        逐个编译关键字（跳过无效正则），并合并为一个正则用于快速判断
+        """
+        compiled = []
+        for keyword in keywords:
+            if not keyword:
+                continue
+            try:
+                compiled.append((keyword, re.compile(keyword, flags)))
+            except re.error as e:
+                logger.warn(f"过滤关键字 {keyword} 不是有效的正则表达式：{str(e)}")
+        if not compiled:
+            return compiled, None
+        try:
+            combined = re.compile("|".join(f"(?:{keyword})" for keyword, _ in compiled), flags)
+        except re.error:
+            # 关键字间存在同名分组等冲突时，逐个匹配
+            combined = None
+        return compiled, combined
+
+    def set_exclude_words(self, words: Any):
+        """
+        设置整理屏蔽词（忽略大小写），内容未变化时不重复编译
+        """
+        words = tuple(words or ())
+        if words == self._exclude_words:
+            return
+        self._exclude_words_list, self._exclude_words_re = self.__compile(words, flags=re.IGNORECASE)
+        self._exclude_words = words
+
+    @staticmethod
+    def suffix(path: Any) -> str:
+        """
+        小写扩展名
+        """
+        return os.path.splitext(str(path))[1].lower()
+
+    def is_ignored(self, path: Any) -> bool:
+        """
+        是否回收站或隐藏的文件
+        """
+        return self._ignore_re.search(str(path)) is not None
+
+    def is_media(self, path: Any) -> bool:
+        """
+        是否媒体文件
+        """
+        return self.suffix(path) in self.media_exts
+
+    def is_other(self, path: Any) -> bool:
+        """
+        是否配置的非媒体文件
+        """
+        return self.suffix(path) in self.other_exts
+
+    def is_subtitle(self, path: Any) -> bool:
+        """
+        是否字幕文件
+        """
+        return self.suffix(path) in self._subtitle_exts
+
+    @staticmethod
+    def __match(path: str, compiled: List[Tuple[str, Any]], combined: Any) -> Optional[str]:
+        """
+        先用合并正则快速判断，命中后再找出具体关键字
+        """
+        if not compiled:
+            return None
+        if combined is not None and not combined.search(path):
+            return None
+        for keyword, pattern in compiled:
+            if pattern.search(path):
+                return keyword
+        return None
+
+    def exclude_keyword(self, path: Any) -> Optional[str]:
+        """
+        命中的过滤关键字
+        """
+        return self.__match(str(path), self._keywords, self._keywords_re)
+
+    def exclude_word(self, path: Any) -> Optional[str]:
+        """
+        命中的整理屏蔽词
+        """
+        return self.__match(str(path), self._exclude_words_list, self._exclude_words_re)
+
+    def classify(self, path: Any) -> str:
+        """
+        路径分类：回收站/隐藏、命中过滤、媒体、字幕、其他、未知
+        """
+        path = str(path)
+        if self._ignore_re.search(path):
+            return self.IGNORED
+        if self.exclude_keyword(path) or self.exclude_word(path):
+            return self.EXCLUDED
+        suffix = self.suffix(path)
+        if suffix in self.media_exts:
+            return self.MEDIA
+        if suffix in self._subtitle_exts:
+            return self.SUBTITLE
+        if suffix in self.other_exts:
+            return self.OTHER
+        return self.UNKNOWN
+
+
+class MediaFileIndex:
+    """
+    媒体文件索引，每个媒体文件只stat一次，记录为 (大小, 修改时间, 软链接目标)
+    索引按目录持久化，再次检测时目录mtime未变化（无新增、删除、重命名）则直接复用上次记录，不再列举和stat
+    """
+
+    def __init__(self, index_file: str, signature: str = ""):
+        """
+        :param index_file: 索引文件路径
+        :param signature: 媒体扩展名等配置签名，变化后旧索引失效
+        """
+        self._index_file = index_file
+        self._signature = signature
+        # 检测目录 -> {目录: [mtime_ns, {文件名: [大小, 修改时间, 软链接目标]}, [子目录名]]}
+        self._roots: Dict[str, Dict[str, list]] = {}
+        self.dirs = 0
+        self.listed = 0
+        self.__load()
+
+    def __load(self):
+        try:
+            if not os.path.exists(self._index_file):
+                return
+            with open(self._index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("signature") == self._signature:
+                self._roots = data.get("roots") or {}
+        except Exception as e:
+            logger.warn(f"读取媒体文件索引失败，将重新建立：{str(e)}")
+            self._roots = {}
+
+    def save(self):
+        """
+        写入索引文件
+        """
+        try:
+            tmp_file = f"{self._index_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump({"signature": self._signature, "roots": self._roots}, f,
+                          ensure_ascii=False, separators=(",", ":"))
+            os.replace(tmp_file, self._index_file)
+        except Exception as e:
+            logger.error(f"保存媒体文件索引失败：{str(e)}")
+
+    def scan(self, directory: str, is_media: Callable[[str], bool],
+             on_listed: Callable[[str, List[str]], Any] = None) -> Dict[str, Tuple[int, float, Optional[str]]]:
+        """
+        遍历目录，返回媒体文件记录 {文件路径: (大小, 修改时间, 软链接目标)}
+        :param directory: 检测目录
+        :param is_media: 是否媒体文件
+        :param on_listed: 重新列举目录后的回调，参数为 (目录, 文件名列表)
+        """
+        old_dirs = self._roots.get(directory) or {}
+        new_dirs: Dict[str, list] = {}
+        records = {}
+        self.dirs = 0
+        self.listed = 0
+        stack = [directory]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                mtime = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            self.dirs += 1
+            record = old_dirs.get(dir_path)
+            if not record or record[0] != mtime:
+                record = self.__list_dir(dir_path, mtime, is_media, on_listed)
+                if not record:
+                    continue
+                self.listed += 1
+            new_dirs[dir_path] = record
+            for name, (size, file_mtime, link) in record[1].items():
+                records[os.path.join(dir_path, name)] = (size, file_mtime, link)
+            stack.extend(os.path.join(dir_path, name) for name in record[2])
+        self._roots[directory] = new_dirs
+        return records
+
+    @staticmethod
+    def __list_dir(dir_path: str, mtime: int, is_media: Callable[[str], bool],
+                   on_listed: Callable[[str, List[str]], Any] = None) -> Optional[list]:
+        """
+        列举目录，stat其中的媒体文件
+        """
+        files, subdirs, names = {}, [], []
+        try:
+            with os.scandir(dir_path) as entries:
+                for entry in entries:
+                    try:
+                        if entry.is_dir():
+                            # 与os.walk一致，不进入软链接目录
+                            if not entry.is_symlink():
+                                subdirs.append(entry.name)
+                            continue
+                        names.append(entry.name)
+                        if not is_media(entry.name):
+                            continue
+                        is_link = entry.is_symlink()
+                        try:
+                            stat = entry.stat()
+                        except OSError:
+                            if not is_link:
+                                continue
+                            # 失效的软链接
+                            stat = entry.stat(follow_symlinks=False)
+                        files[entry.name] = [stat.st_size, stat.st_mtime,
+                                             os.readlink(entry.path) if is_link else None]
+                    except OSError:
+                        continue
+        except OSError:
+            return None
+        if on_listed:
+            on_listed(dir_path, names)
+        return [mtime, files, subdirs]
+
+
 class LibraryDuplicateCheck(_PluginBase):
     # 插件名称
     plugin_name = "媒体库重复媒体检测"
@@ -31,7 +375,7 @@ class LibraryDuplicateCheck(_PluginBase):
     # 插件图标
     plugin_icon = "https://raw.githubusercontent.com/thsrite/MoviePilot-Plugins/main/icons/libraryduplicate.png"
     # 插件版本
-    plugin_version = "2.0.2"
+    plugin_version = "2.0.5"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -63,9 +407,18 @@ class LibraryDuplicateCheck(_PluginBase):
     _EMBY_APIKEY = None
 
     _scheduler: Optional[BackgroundScheduler] = None
+    # 目录文件列表缓存
+    _listing_cache: Optional[DirListingCache] = None
+    # 文件路径分类器
+    _classifier: Optional[PathClassifier] = None
+    # 媒体文件索引
+    _index_file = "duplicate_index.json"
 
     def init_plugin(self, config: dict = None):
         self.mediaserver_helper = MediaServerHelper()
+        self._index_file = os.path.join(self.get_data_path(), "duplicate_index.json")
+        # 检测期间仅本插件删除文件，缓存有效期可覆盖整次遍历
+        self._listing_cache = DirListingCache(ttl=600, max_dirs=20000)
         if config:
             self._enabled = config.get("enabled")
             self._notify = config.get("notify")
@@ -77,6 +430,8 @@ class LibraryDuplicateCheck(_PluginBase):
             self._rmt_mediaext = config.get(
                 "rmt_mediaext") or ".mp4, .mkv, .ts, .iso,.rmvb, .avi, .mov, .mpeg,.mpg, .wmv, .3gp, .asf, .m4v, .flv, .m2ts, .strm,.tp, .f4v"
             self._mediaservers = config.get("mediaservers") or []
+            # 预编译扩展名
+            self._classifier = PathClassifier(media_exts=self._rmt_mediaext)
 
             self._paths = {}
             self._path_type = {}
@@ -231,21 +586,26 @@ class LibraryDuplicateCheck(_PluginBase):
         delete_duplicate_files = 0
         delete_cloud_files = 0
 
-        # Traverse the directory and subdirectories
-        for root, _, files in os.walk(directory):
-            for file in files:
-                file_path = os.path.join(root, file)
-                # Check the file extension
-                if (Path(str(file_path)).exists() or os.path.islink(file_path)) and Path(file).suffix.lower() in [
-                    ext.strip() for ext in self._rmt_mediaext.split(",")]:
-                    video_name = Path(file).stem.split('-')[0].rstrip()
-                    if str(path_mediatpye) == '电视剧':
-                        # 使用正则表达式匹配
-                        match = re.search(r"S\d+E\d+", Path(file).stem)
-                        if match:
-                            video_name += f" {match.group(0)}"
-                    logger.info(f'Scan file -> {file} -> {video_name}')
-                    video_files[video_name].append(file_path)
+        # 遍历目录，每个媒体文件只stat一次，目录未变化时复用上次索引
+        start = time.time()
+        index = MediaFileIndex(index_file=self._index_file,
+                               signature=",".join(sorted(self._classifier.media_ext_list)))
+        # 复用遍历结果，删除时筛选同名文件无需再次列举目录
+        records = index.scan(directory=directory, is_media=self._classifier.is_media,
+                             on_listed=self._listing_cache.put)
+        index.save()
+        for file_path in records:
+            file_stem = Path(file_path).stem
+            video_name = file_stem.split('-')[0].rstrip()
+            if str(path_mediatpye) == '电视剧':
+                # 使用正则表达式匹配
+                match = re.search(r"S\d+E\d+", file_stem)
+                if match:
+                    video_name += f" {match.group(0)}"
+            logger.debug(f'Scan file -> {file_path} -> {video_name}')
+            video_files[video_name].append(file_path)
+        logger.info(f"{directory} 遍历完成，目录 {index.dirs} 个，重新列举 {index.listed} 个，"
+                    f"媒体文件 {len(records)} 个，耗时 {time.time() - start:.2f} 秒")
 
         logger.info("\n================== RESULT ==================\n")
 
@@ -257,25 +617,30 @@ class LibraryDuplicateCheck(_PluginBase):
             # Find and handle duplicate video files
             for name, paths in sorted_video_files:
                 if len(paths) > 1:
+                    # 索引仅用于筛选候选，删除前重新stat，避免文件原地改写后使用过期的大小、修改时间
+                    group = self.__restat_files(paths)
+                    paths = [path for path in paths if path in group]
+                    if len(paths) < 2:
+                        logger.debug(f"'{name}' 重复文件已不存在，跳过处理")
+                        continue
                     duplicate_files += len(paths)
                     logger.info(f"Duplicate video files for '{name}':")
                     for path in paths:
-                        if Path(path).exists() or os.path.islink(path):
-                            logger.info(f"  {path} 文件大小：{os.path.getsize(path)}，创建时间：{os.path.getmtime(path)}")
-                        else:
-                            logger.info(f"  {path} 文件已被删除")
+                        size, mtime, _ = group[path]
+                        logger.info(f"  {path} 文件大小：{size}，创建时间：{mtime}")
 
                     # Decide which file to keep based on criteria (e.g., file size or creation date)
                     logger.info(f"文件保留规则：{str(retain_type)}")
-                    keep_file = self.__choose_file_to_keep(paths, retain_type)
+                    keep_file = self.__choose_file_to_keep(paths, group, retain_type)
                     logger.info(f"本地保留文件: {keep_file}")
                     if self._delete_softlink:
-                        keep_cloud_file = os.readlink(str(keep_file))
+                        keep_cloud_file = group[keep_file][2] if keep_file else None
                         logger.info(f"云盘保留文件: {keep_cloud_file}")
 
                     # Delete the other duplicate files (if needed)
                     for path in paths:
-                        if (Path(path).exists() or os.path.islink(path)) and str(path) != str(keep_file):
+                        # 前面删除同名文件时可能已被删除
+                        if os.path.lexists(path) and str(path) != str(keep_file):
                             delete_duplicate_files += 1
                             self.__delete_duplicate_file(duplicate_file=path,
                                                          paths=paths,
@@ -283,7 +648,7 @@ class LibraryDuplicateCheck(_PluginBase):
                                                          file_type="监控")
                             if self._delete_softlink:
                                 # 同步删除软连接源目录
-                                cloud_file = os.readlink(path)
+                                cloud_file = group[path][2]
                                 if cloud_file and Path(cloud_file).exists():
                                     delete_cloud_files += 1
                                     self.__delete_duplicate_file(duplicate_file=cloud_file,
@@ -291,7 +656,7 @@ class LibraryDuplicateCheck(_PluginBase):
                                                                  keep_file=keep_cloud_file,
                                                                  file_type="云盘")
                 else:
-                    logger.info(f"'{name}' No Duplicate video files.")
+                    logger.debug(f"'{name}' No Duplicate video files.")
 
             return duplicate_files, delete_duplicate_files, delete_cloud_files
 
@@ -301,13 +666,11 @@ class LibraryDuplicateCheck(_PluginBase):
         """
         cloud_file_path = Path(duplicate_file)
         # 删除文件、nfo、jpg等同名文件
-        pattern = cloud_file_path.stem.replace('[', '?').replace(']', '?')
-        files = list(cloud_file_path.parent.glob(f"{pattern}.*"))
-        logger.info(f"筛选 {cloud_file_path.parent} 下同名文件 {pattern}.* {len(files)}个")
+        files = self._listing_cache.same_stem_files(str(cloud_file_path))
+        logger.info(f"筛选 {cloud_file_path.parent} 下同名文件 {cloud_file_path.stem}.* {len(files)}个")
         media_files = []
         for file in files:
-            if Path(file).suffix.lower() in [ext.strip() for ext in
-                                             self._rmt_mediaext.split(",")]:
+            if self._classifier.is_media(file):
                 media_files.append(Path(file).stem)
 
         media_files = list(set(media_files))
@@ -317,6 +680,7 @@ class LibraryDuplicateCheck(_PluginBase):
                 if str(file) != str(keep_file):
                     if str(self._retain_type) != "仅检查":
                         Path(file).unlink()
+                        self._listing_cache.invalidate(str(file))
                         logger.info(f"{file_type}文件 {file} 已删除")
                     else:
                         logger.warning(f"{file_type}文件 {file} 将被删除")
@@ -325,15 +689,17 @@ class LibraryDuplicateCheck(_PluginBase):
                 if str(file) != str(keep_file):
                     if str(self._retain_type) != "仅检查":
                         Path(file).unlink()
+                        self._listing_cache.invalidate(str(file))
                         logger.info(f"{file_type}文件 {file} 已删除")
                     else:
                         logger.warning(f"{file_type}文件 {file} 将被删除")
 
             # 删除thumb图片
             thumb_file = cloud_file_path.parent / (cloud_file_path.stem + "-thumb.jpg")
-            if thumb_file.exists():
+            if self._listing_cache.exists(str(thumb_file)):
                 if str(self._retain_type) != "仅检查":
                     thumb_file.unlink()
+                    self._listing_cache.invalidate(str(thumb_file))
                     logger.info(f"{file_type}文件 {thumb_file} 已删除")
                 else:
                     logger.warning(f"{file_type}文件 {thumb_file} 将被删除")
@@ -345,14 +711,12 @@ class LibraryDuplicateCheck(_PluginBase):
         删除目录及其子目录
         """
         # 判断当前媒体父路径下是否有媒体文件，如有则无需遍历父级
-        if not SystemUtils.exits_files(path.parent, [ext.strip() for ext in
-                                                     self._rmt_mediaext.split(",")]):
+        if not SystemUtils.exits_files(path.parent, self._classifier.media_ext_list):
             # 判断父目录是否为空, 为空则删除
             for parent_path in path.parents:
                 if str(parent_path.parent) != str(path.root):
                     # 父目录非根目录，才删除父目录
-                    if not SystemUtils.exits_files(parent_path, [ext.strip() for ext in
-                                                                 self._rmt_mediaext.split(",")]):
+                    if not SystemUtils.exits_files(parent_path, self._classifier.media_ext_list):
                         if parent_path.exists():
                             # 当前路径下没有媒体文件则删除
                             if str(self._retain_type) != "仅检查":
@@ -362,28 +726,53 @@ class LibraryDuplicateCheck(_PluginBase):
                                 logger.warning(f"{file_type}目录 {parent_path} 将被删除")
 
     @staticmethod
-    def __choose_file_to_keep(paths, retain_type):
+    def __restat_files(paths: List[str]) -> Dict[str, Tuple[int, float, Optional[str]]]:
+        """
+        重新获取文件的大小、修改时间及软链接目标，已不存在的文件不返回
+        """
+        records = {}
+        for path in paths:
+            try:
+                is_link = os.path.islink(path)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    if not is_link:
+                        continue
+                    # 失效的软链接
+                    stat = os.lstat(path)
+                records[path] = (stat.st_size, stat.st_mtime, os.readlink(path) if is_link else None)
+            except OSError:
+                continue
+        return records
+
+    @staticmethod
+    def __choose_file_to_keep(paths, records, retain_type):
+        """
+        根据删除前重新获取的大小、修改时间选择保留文件
+        """
         checked = None
         checked_path = None
 
         for path in paths:
+            size, mtime, _ = records[path]
             if str(retain_type) == "保留体积最小":
-                selected = os.path.getsize(path)
+                selected = size
                 if checked is None or selected < checked:
                     checked = selected
                     checked_path = path
             elif str(retain_type) == "保留体积最大":
-                selected = os.path.getsize(path)
+                selected = size
                 if checked is None or selected > checked:
                     checked = selected
                     checked_path = path
             elif str(retain_type) == "保留创建最早":
-                selected = os.path.getmtime(path)
+                selected = mtime
                 if checked is None or selected < checked:
                     checked = selected
                     checked_path = path
             elif str(retain_type) == "保留创建最晚":
-                selected = os.path.getmtime(path)
+                selected = mtime
                 if checked is None or selected > checked:
                     checked = selected
                     checked_path = path
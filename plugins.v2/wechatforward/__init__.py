@@ -1,18 +1,446 @@
 import json
 import re
+import threading
 import time
-from datetime import datetime
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
 
+from sqlalchemy.orm import Session
+
+from app import schemas
+from app.core.config import settings
+from app.db import db_query
 from app.db.models.subscribehistory import SubscribeHistory
 from app.db.subscribe_oper import SubscribeOper
 from app.plugins import _PluginBase
-from app.core.event import eventmanager
+from app.core.event import eventmanager, Event
 from app.schemas.types import EventType, MessageChannel, MediaType
 from app.utils.http import RequestUtils
-from typing import Any, List, Dict, Tuple, Optional
+from typing import Any, List, Dict, Tuple, Optional, Callable
 from app.log import logger
 
 
+class HistoryStore:
+    """
+    转发历史存储
+    按天分区的 JSON Lines 文件，发送成功只追加一行；过期清理直接删除整天的分区文件
+    """
+
+    def __init__(self, path: Path, keep_days: int = 7):
+        self._path = path
+        self._keep_days = max(int(keep_days), 1)
+        self._lock = threading.Lock()
+        self._pruned_day = None
+        self._path.mkdir(parents=True, exist_ok=True)
+
+    def __partition(self, day: str) -> Path:
+        return self._path / f"{day}.jsonl"
+
+    def __partitions(self) -> List[Path]:
+        """
+        所有分区，按日期倒序
+        """
+        return sorted(self._path.glob("*.jsonl"), reverse=True)
+
+    def append(self, record: dict):
+        """
+        追加一条记录，记录的 time 字段格式为 %Y-%m-%d %H:%M:%S
+        """
+        day = str(record.get("time") or "")[:10] or datetime.now().strftime('%Y-%m-%d')
+        line = json.dumps(record, ensure_ascii=False) + "\n"
+        with self._lock:
+            with open(self.__partition(day), "a", encoding="utf-8") as f:
+                f.write(line)
+            if self._pruned_day != day:
+                self.__prune()
+                self._pruned_day = day
+
+    def extend(self, records: List[dict]):
+        """
+        批量追加，用于导入旧历史
+        """
+        by_day: Dict[str, List[str]] = {}
+        for record in records:
+            day = str(record.get("time") or "")[:10]
+            if not day:
+                continue
+            by_day.setdefault(day, []).append(json.dumps(record, ensure_ascii=False) + "\n")
+        with self._lock:
+            for day, lines in by_day.items():
+                with open(self.__partition(day), "a", encoding="utf-8") as f:
+                    f.writelines(lines)
+            self.__prune()
+
+    def __prune(self):
+        """
+        删除保留天数之前的分区
+        """
+        oldest = (datetime.now() - timedelta(days=self._keep_days)).strftime('%Y-%m-%d')
+        for partition in self.__partitions():
+            if partition.stem < oldest:
+                try:
+                    partition.unlink()
+                    logger.debug(f"删除过期转发历史 {partition.name}")
+                except OSError as e:
+                    logger.error(f"删除过期转发历史 {partition.name} 失败：{str(e)}")
+
+    def query(self, page: int = 1, count: int = 50) -> Tuple[List[dict], bool]:
+        """
+        分页查询，按时间倒序，只读取覆盖该页的分区
+        :return: 记录列表，是否还有下一页
+        """
+        skip = max(int(page) - 1, 0) * count
+        records: List[dict] = []
+        for partition in self.__partitions():
+            try:
+                with open(partition, "r", encoding="utf-8") as f:
+                    lines = f.readlines()
+            except OSError:
+                continue
+            for line in reversed(lines):
+                if not line.strip():
+                    continue
+                if skip > 0:
+                    skip -= 1
+                    continue
+                if len(records) >= count:
+                    return records, True
+                try:
+                    records.append(json.loads(line))
+                except ValueError:
+                    continue
+        return records, False
+
+    def empty(self) -> bool:
+        return not self.__partitions()
+
+
+class TokenBucket:
+    """
+    令牌桶限速
+    """
+
+    def __init__(self, rate: float, capacity: int):
+        """
+        :param rate: 每秒补充的令牌数
+        :param capacity: 桶容量（允许的突发数）
+        """
+        self._rate = rate
+        self._capacity = capacity
+        self._tokens = float(capacity)
+        self._updated = time.monotonic()
+
+    def __refill(self):
+        now = time.monotonic()
+        self._tokens = min(self._capacity, self._tokens + (now - self._updated) * self._rate)
+        self._updated = now
+
+    def wait_time(self) -> float:
+        """
+        距离有可用令牌的秒数
+        """
+        self.__refill()
+        return 0 if self._tokens >= 1 else (1 - self._tokens) / self._rate
+
+    def take(self):
+        self.__refill()
+        self._tokens -= 1
+
+
+class SendQueue:
+    """
+    消息发送队列
+    事件处理只负责入队；每个应用独立的队列和发送线程，按企业微信接收人频率限制（30次/分钟、1000次/小时）限速；
+    排队中的相同消息合并为一条；失败由队列延迟重试，不在发送线程中递归
+    """
+
+    # 企业微信每应用对同一成员的发送频率限制：(每秒补充令牌数, 容量)
+    RATE_LIMITS = [(30 / 60, 30), (1000 / 3600, 1000)]
+    # 最大重试次数
+    MAX_RETRY = 3
+
+    class _Task:
+        __slots__ = ("appid", "key", "message", "enqueued", "due", "retry")
+
+        def __init__(self, appid: Any, key: str, message: dict):
+            self.appid = appid
+            self.key = key
+            self.message = message
+            self.enqueued = time.monotonic()
+            self.due = self.enqueued
+            self.retry = 0
+
+    class _AppState:
+        def __init__(self):
+            self.queue: deque = deque()
+            self.threads: List[threading.Thread] = []
+            self.sending = 0
+            self.sent = 0
+            self.failed = 0
+            self.retried = 0
+            self.coalesced = 0
+            self.latencies: deque = deque(maxlen=100)
+
+    def __init__(self, sender: Callable[[Any, dict], Optional[bool]], workers: int = 2):
+        """
+        :param sender: 发送函数，参数为 (appid, message)，返回 True 成功 / False 失败不重试 / None 需要重试
+        :param workers: 每个应用的发送线程数
+        """
+        self._sender = sender
+        self._workers = max(int(workers), 1)
+        self._apps: Dict[Any, SendQueue._AppState] = {}
+        # 排队中的消息，用于合并相同消息
+        self._pending: set = set()
+        # (appid, 接收人) -> 令牌桶
+        self._buckets: Dict[tuple, List[TokenBucket]] = {}
+        self._cond = threading.Condition()
+        self._stopped = False
+
+    def put(self, appid: Any, message: dict) -> bool:
+        """
+        消息入队，不阻塞
+        :param message: 企业微信消息体 req_json 及历史记录字段 title、text、userid（接收人）
+        :return: 是否入队，相同消息排队中时合并返回False
+        """
+        key = f"{appid}:{json.dumps(message, ensure_ascii=False, sort_keys=True)}"
+        with self._cond:
+            if self._stopped:
+                return False
+            app = self._apps.get(appid)
+            if not app:
+                app = self._apps[appid] = self._AppState()
+            if key in self._pending:
+                app.coalesced += 1
+                return False
+            self._pending.add(key)
+            app.queue.append(self._Task(appid=appid, key=key, message=message))
+            while len(app.threads) < self._workers:
+                thread = threading.Thread(target=self.__worker, args=(appid, app),
+                                          name=f"wechat-send-{appid}-{len(app.threads)}", daemon=True)
+                app.threads.append(thread)
+                thread.start()
+            self._cond.notify_all()
+            return True
+
+    def __next(self, appid: Any, app: "SendQueue._AppState") -> Optional["SendQueue._Task"]:
+        """
+        取出下一条已到期且未超过频率限制的消息，没有时等待
+        """
+        with self._cond:
+            while not self._stopped:
+                now = time.monotonic()
+                wait = 60.0
+                for task in app.queue:
+                    if task.due > now:
+                        wait = min(wait, task.due - now)
+                        continue
+                    buckets = self.__buckets(appid, task.message.get("userid"))
+                    limited = max(bucket.wait_time() for bucket in buckets)
+                    if limited > 0:
+                        wait = min(wait, limited)
+                        continue
+                    for bucket in buckets:
+                        bucket.take()
+                    app.queue.remove(task)
+                    self._pending.discard(task.key)
+                    app.sending += 1
+                    return task
+                self._cond.wait(timeout=max(wait, 0.05))
+            return None
+
+    def __buckets(self, appid: Any, touser: str) -> List[TokenBucket]:
+        key = (appid, touser)
+        buckets = self._buckets.get(key)
+        if not buckets:
+            buckets = self._buckets[key] = [TokenBucket(rate=rate, capacity=capacity)
+                                            for rate, capacity in self.RATE_LIMITS]
+        return buckets
+
+    def __worker(self, appid: Any, app: "SendQueue._AppState"):
+        while True:
+            task = self.__next(appid, app)
+            if not task:
+                return
+            try:
+                result = self._sender(appid, task.message)
+            except Exception as e:
+                logger.error(f"转发 配置 {appid} 消息 {task.message.get('title')} 异常：{str(e)}")
+                result = None
+            with self._cond:
+                app.sending -= 1
+                if result is None and task.retry < self.MAX_RETRY and not self._stopped:
+                    # 延迟重试：2、4、8秒
+                    task.retry += 1
+                    task.due = time.monotonic() + 2 ** task.retry
+                    app.retried += 1
+                    if task.key not in self._pending:
+                        self._pending.add(task.key)
+                        app.queue.append(task)
+                    self._cond.notify_all()
+                elif result:
+                    app.sent += 1
+                    app.latencies.append(time.monotonic() - task.enqueued)
+                else:
+                    app.failed += 1
+
+    def stats(self) -> Dict[Any, dict]:
+        """
+        各应用的队列状态
+        """
+        with self._cond:
+            return {
+                appid: {
+                    "depth": len(app.queue),
+                    "sending": app.sending,
+                    "sent": app.sent,
+                    "failed": app.failed,
+                    "retried": app.retried,
+                    "coalesced": app.coalesced,
+                    "latency_avg": sum(app.latencies) / len(app.latencies) if app.latencies else 0,
+                    "latency_max": max(app.latencies) if app.latencies else 0,
+                }
+                for appid, app in self._apps.items()
+            }
+
+    def stop(self):
+        """
+        停止发送，丢弃排队中的消息
+        """
+        with self._cond:
+            self._stopped = True
+            dropped = sum(len(app.queue) for app in self._apps.values())
+            for app in self._apps.values():
+                app.queue.clear()
+            self._pending.clear()
+            self._cond.notify_all()
+        if dropped:
+            logger.warn(f"消息发送队列已停止，丢弃未发送消息 {dropped} 条")
+
+
+class SubscriberIndex:
+    """
+    订阅用户索引
+    已完成订阅：按 名称、年份、季 直接查询订阅历史中最近一次完成的记录；
+    订阅中的电视剧：(用户, 名称, 年份) -> 订阅ID，命中后按ID确认订阅仍在进行中；
+    首次查询时全量建立，之后由订阅事件增量更新
+    """
+
+    # 已完成订阅消息标题：名称 (年份) [S季] 已完成订阅
+    COMPLETED_TITLE = re.compile(r'^(?P<name>.+) \((?P<year>\d+)\)(?: S(?P<season>\d+))? 已完成订阅$')
+    # 标题中的年份
+    YEAR = re.compile(r' \((\d+)\)')
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._active: Dict[tuple, set] = {}
+        self._built = False
+
+    def __ensure(self):
+        with self._lock:
+            if self._built:
+                return
+            start = time.time()
+            active = {}
+            for subscribe in SubscribeOper().list() or []:
+                if subscribe.type == MediaType.TV.value and subscribe.username:
+                    active.setdefault((str(subscribe.username), subscribe.name, str(subscribe.year)),
+                                      set()).add(subscribe.id)
+            self._active = active
+            self._built = True
+            logger.info(f"订阅用户索引已建立，订阅中 {len(active)} 条，耗时 {time.time() - start:.2f} 秒")
+
+    def add_subscribe(self, subscribe):
+        """
+        新增订阅
+        """
+        if not subscribe or subscribe.type != MediaType.TV.value or not subscribe.username:
+            return
+        with self._lock:
+            if self._built:
+                self._active.setdefault((str(subscribe.username), subscribe.name, str(subscribe.year)),
+                                        set()).add(subscribe.id)
+
+    def complete_subscribe(self, subscribe_id: int, subscribe_info: dict):
+        """
+        订阅完成，移出订阅中
+        """
+        if not subscribe_info:
+            return
+        with self._lock:
+            if not self._built:
+                return
+            ids = self._active.get((str(subscribe_info.get("username")), subscribe_info.get("name"),
+                                    str(subscribe_info.get("year"))))
+            if ids:
+                ids.discard(subscribe_id)
+
+    def completed_user(self, title: str) -> Optional[Tuple[str, str]]:
+        """
+        已完成订阅消息对应的订阅用户
+        :return: (用户名, 背景图)
+        """
+        match = self.COMPLETED_TITLE.match(str(title))
+        if not match:
+            return None
+        season = match.group("season")
+        try:
+            return self.__latest_history(name=match.group("name"), year=match.group("year"),
+                                         season=int(season) if season else None)
+        except Exception as e:
+            logger.error(f"查询订阅历史失败：{str(e)}")
+            return None
+
+    @staticmethod
+    @db_query
+    def __latest_history(db: Session = None, name: str = None, year: str = None,
+                         season: Optional[int] = None) -> Optional[Tuple[str, str]]:
+        """
+        订阅历史中最近一次完成订阅的用户及背景图，季为空时不限季
+        """
+        query = db.query(SubscribeHistory).filter(SubscribeHistory.name == name,
+                                                  SubscribeHistory.year == year)
+        if season is not None:
+            query = query.filter(SubscribeHistory.season == season)
+        history = query.order_by(SubscribeHistory.id.desc()).first()
+        return (history.username, history.backdrop) if history else None
+
+    def is_subscribing(self, username: str, title: str) -> bool:
+        """
+        用户是否正在订阅标题中的电视剧
+        """
+        self.__ensure()
+        for name, year in self.__title_candidates(str(title)):
+            ids = self._active.get((str(username), name, year))
+            for subscribe_id in list(ids or []):
+                subscribe = SubscribeOper().get(subscribe_id)
+                if not subscribe:
+                    with self._lock:
+                        ids.discard(subscribe_id)
+                    continue
+                if subscribe.state == "R":
+                    return True
+        return False
+
+    @classmethod
+    def __title_candidates(cls, title: str) -> List[Tuple[str, str]]:
+        """
+        标题中可能的 (名称, 年份)，名称取年份前任意空格开始的部分
+        """
+        candidates = []
+        for match in cls.YEAR.finditer(title):
+            prefix = title[:match.start()]
+            start = 0
+            while True:
+                if prefix[start:]:
+                    candidates.append((prefix[start:], match.group(1)))
+                start = prefix.find(" ", start) + 1
+                if start <= 0:
+                    break
+        return candidates
+
+
 class WeChatForward(_PluginBase):
     # 插件名称
     plugin_name = "微信消息转发"
@@ -21,7 +449,7 @@ class WeChatForward(_PluginBase):
     # 插件图标
     plugin_icon = "Wechat_A.png"
     # 插件版本
-    plugin_version = "2.8"
+    plugin_version = "3.1"
     # 插件作者
     plugin_author = "thsrite"
     # 作者主页
@@ -43,6 +471,20 @@ class WeChatForward(_PluginBase):
     _extra_msg_history = {}
     _history_days = None
     _wechat_proxy = None
+    # 转发历史
+    _history: Optional[HistoryStore] = None
+    # 详情页显示条数
+    _page_size = 50
+    # 每个应用的发送线程数
+    _send_workers = 2
+    # 消息发送队列
+    _send_queue: Optional[SendQueue] = None
+    # 额外消息处理线程
+    _extra_executor: Optional[ThreadPoolExecutor] = None
+    # 发送线程共用token，刷新时加锁
+    _token_lock = threading.Lock()
+    # 订阅用户索引
+    _subscriber_index: Optional[SubscriberIndex] = None
 
     # 企业微信发送消息URL
     _send_msg_url = "%s/cgi-bin/message/send?access_token=%s"
@@ -71,6 +513,9 @@ class WeChatForward(_PluginBase):
     ]
 
     def init_plugin(self, config: dict = None):
+        # 停止现有任务
+        self.stop_service()
+
         if config:
             self._enabled = config.get("enabled")
             self._rebuild = config.get("rebuild")
@@ -79,11 +524,20 @@ class WeChatForward(_PluginBase):
             self._specify_confs = config.get("specify_confs")
             self._wechat_proxy = config.get("wechat_proxy")
             self._history_days = config.get("history_days") or 7
+            self._send_workers = int(config.get("send_workers") or 2)
 
             # 获取token存库
             if self._enabled and self._wechat_confs:
                 self.__save_wechat_token()
 
+        self._history = HistoryStore(self.get_data_path() / "history", keep_days=int(self._history_days or 7))
+        self.__migrate_history()
+
+        if self._enabled:
+            self._subscriber_index = SubscriberIndex()
+            self._send_queue = SendQueue(sender=self.__post_request, workers=self._send_workers)
+            self._extra_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="wechat-extra")
+
     def __save_wechat_token(self):
         """
         获取并存储wechat token
@@ -147,6 +601,20 @@ class WeChatForward(_PluginBase):
         if len(self._wechat_token_pattern_confs.keys()) > 0:
             self.__save_wechat_confs()
 
+    def __migrate_history(self):
+        """
+        旧版历史记录整体保存在插件数据中，导入按天分区的历史存储
+        """
+        historys = self.get_data('history')
+        if not historys:
+            return
+        if not isinstance(historys, list):
+            historys = [historys]
+        if self._history.empty():
+            self._history.extend(sorted(historys, key=lambda x: x.get("time") or ""))
+            logger.info(f"已导入旧版转发历史 {len(historys)} 条")
+        self.del_data(key="history")
+
     def __update_config(self):
         self.update_config({
             "enabled": self._enabled,
@@ -155,6 +623,7 @@ class WeChatForward(_PluginBase):
             "ignore_userid": self._ignore_userid,
             "specify_confs": self._specify_confs,
             "history_days": self._history_days,
+            "send_workers": self._send_workers,
             "wechat_proxy": self._wechat_proxy
         })
 
@@ -173,7 +642,24 @@ class WeChatForward(_PluginBase):
         pass
 
     def get_api(self) -> List[Dict[str, Any]]:
-        pass
+        return [{
+            "path": "/history",
+            "endpoint": self.history,
+            "methods": ["GET"],
+            "summary": "转发历史",
+            "description": "分页查询转发历史，按时间倒序",
+        }]
+
+    def history(self, apikey: str, page: int = 1, count: int = 50) -> Any:
+        """
+        分页查询转发历史
+        """
+        if apikey != settings.API_TOKEN:
+            return schemas.Response(success=False, message="API密钥错误")
+        if not self._history:
+            return {"list": [], "more": False}
+        records, more = self._history.query(page=page, count=min(max(int(count), 1), 500))
+        return {"list": records, "more": more}
 
     def get_form(self) -> Tuple[List[dict], Dict[str, Any]]:
         """
@@ -243,7 +729,7 @@ class WeChatForward(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 3
+                                    'md': 2
                                 },
                                 'content': [
                                     {
@@ -259,7 +745,23 @@ class WeChatForward(_PluginBase):
                                 'component': 'VCol',
                                 'props': {
                                     'cols': 12,
-                                    'md': 3
+                                    'md': 2
+                                },
+                                'content': [
+                                    {
+                                        'component': 'VTextField',
+                                        'props': {
+                                            'model': 'send_workers',
+                                            'label': '每应用发送线程数'
+                                        }
+                                    }
+                                ]
+                            },
+                            {
+                                'component': 'VCol',
+                                'props': {
+                                    'cols': 12,
+                                    'md': 2
                                 },
                                 'content': [
                                     {
@@ -440,14 +942,18 @@ class WeChatForward(_PluginBase):
             "ignore_userid": "",
             "specify_confs": "",
             "history_days": 7,
+            "send_workers": 2,
             "wechat_confs": json.dumps(WeChatForward.example, indent=4, ensure_ascii=False)
         }
 
     def get_page(self) -> List[dict]:
-        # 查询同步详情
-        historys = self.get_data('history')
+        # 发送队列状态
+        elements = self.__queue_elements()
+
+        # 查询最新一页转发历史，已按时间倒序
+        historys, _ = self._history.query(page=1, count=self._page_size) if self._history else ([], False)
         if not historys:
-            return [
+            return elements + [
                 {
                     'component': 'div',
                     'text': '暂无数据',
@@ -457,12 +963,6 @@ class WeChatForward(_PluginBase):
                 }
             ]
 
-        if not isinstance(historys, list):
-            historys = [historys]
-
-        # 按照时间倒序
-        historys = sorted(historys, key=lambda x: x.get("time") or 0, reverse=True)
-
         msgs = [
             {
                 'component': 'tr',
@@ -498,7 +998,7 @@ class WeChatForward(_PluginBase):
         ]
 
         # 拼装页面
-        return [
+        return elements + [
             {
                 'component': 'VRow',
                 'content': [
@@ -566,6 +1066,99 @@ class WeChatForward(_PluginBase):
             }
         ]
 
+    def __queue_elements(self) -> List[dict]:
+        """
+        发送队列状态表格
+        """
+        stats = self._send_queue.stats() if self._send_queue else {}
+        if not stats:
+            return []
+        headers = ['appid', '排队', '发送中', '已发送', '失败', '重试', '合并', '平均延迟', '最大延迟']
+        rows = [
+            {
+                'component': 'tr',
+                'props': {
+                    'class': 'text-sm'
+                },
+                'content': [
+                    {
+                        'component': 'td',
+                        'text': text
+                    } for text in [
+                        f"{appid}{self._wechat_token_pattern_confs.get(appid, {}).get('remark') or ''}",
+                        stat.get("depth"),
+                        stat.get("sending"),
+                        stat.get("sent"),
+                        stat.get("failed"),
+                        stat.get("retried"),
+                        stat.get("coalesced"),
+                        f"{stat.get('latency_avg'):.2f}秒",
+                        f"{stat.get('latency_max'):.2f}秒",
+                    ]
+                ]
+            } for appid, stat in stats.items()
+        ]
+        return [
+            {
+                'component': 'VRow',
+                'content': [
+                    {
+                        'component': 'VCol',
+                        'props': {
+                            'cols': 12,
+                        },
+                        'content': [
+                            {
+                                'component': 'VTable',
+                                'props': {
+                                    'hover': True
+                                },
+                                'content': [
+                                    {
+                                        'component': 'thead',
+                                        'content': [
+                                            {
+                                                'component': 'th',
+                                                'props': {
+                                                    'class': 'text-start ps-4'
+                                                },
+                                                'text': header
+                                            } for header in headers
+                                        ]
+                                    },
+                                    {
+                                        'component': 'tbody',
+                                        'content': rows
+                                    }
+                                ]
+                            }
+                        ]
+                    }
+                ]
+            }
+        ]
+
+    @eventmanager.register(EventType.SubscribeAdded)
+    def subscribe_added(self, event: Event = None):
+        """
+        新增订阅，更新订阅用户索引
+        """
+        if not self._subscriber_index or not event or not event.event_data:
+            return
+        subscribe_id = event.event_data.get("subscribe_id")
+        if subscribe_id:
+            self._subscriber_index.add_subscribe(SubscribeOper().get(subscribe_id))
+
+    @eventmanager.register(EventType.SubscribeComplete)
+    def subscribe_complete(self, event: Event = None):
+        """
+        订阅完成，更新订阅用户索引
+        """
+        if not self._subscriber_index or not event or not event.event_data:
+            return
+        self._subscriber_index.complete_subscribe(subscribe_id=event.event_data.get("subscribe_id"),
+                                                  subscribe_info=event.event_data.get("subscribe_info"))
+
     @eventmanager.register(EventType.NoticeMessage)
     def send(self, event):
         """
@@ -601,29 +1194,23 @@ class WeChatForward(_PluginBase):
                     # 特定消息指定用户
                     userid = self.__specify_userid(title=title, text=text, userid=userid)
 
-                access_token = self.__flush_access_token(appid=wechat_appid)
-                if not access_token:
-                    logger.error("未获取到有效token，请检查配置")
-                    continue
-
-                # 发送消息
+                # 加入发送队列
                 if image:
                     self.__send_image_message(title=title, text=text, image_url=image, userid=userid,
-                                              access_token=wechat_conf.get("access_token"), appid=wechat_appid)
+                                              appid=wechat_appid)
                 else:
-                    self.__send_message(title=title, text=text, userid=userid,
-                                        access_token=wechat_conf.get("access_token"),
-                                        appid=wechat_appid)
+                    self.__send_message(title=title, text=text, userid=userid, appid=wechat_appid)
 
             # 发送额外消息
             # 开始下载 > userid > {name} 后台下载任务已提交，请耐心等候入库通知。 > appid
             # 已添加订阅 > userid > {name} 电视剧正在更新，已添加订阅，待更新后自动下载。 > appid
-            if wechat_conf.get("extra_confs"):
-                self.__send_extra_msg(wechat_appid=wechat_appid,
-                                      extra_confs=wechat_conf.get("extra_confs"),
-                                      access_token=wechat_conf.get("access_token"),
-                                      title=title,
-                                      text=text)
+            # 需查询订阅，在后台线程中处理
+            if wechat_conf.get("extra_confs") and self._extra_executor:
+                self._extra_executor.submit(self.__send_extra_msg,
+                                            wechat_appid=wechat_appid,
+                                            extra_confs=wechat_conf.get("extra_confs"),
+                                            title=title,
+                                            text=text)
 
     def __specify_userid(self, title, text, userid):
         """
@@ -646,7 +1233,7 @@ class WeChatForward(_PluginBase):
 
         return userid
 
-    def __send_extra_msg(self, wechat_appid, extra_confs, access_token, title, text):
+    def __send_extra_msg(self, wechat_appid, extra_confs, title, text):
         """
         根据自定义规则发送额外消息
         """
@@ -670,26 +1257,19 @@ class WeChatForward(_PluginBase):
 
                 # 订阅完成消息单独处理
                 if "已完成订阅" in str(title):
-                    # 查订阅历史的用户
-                    subscribes = SubscribeHistory().list()
-                    # 倒叙
-                    subscribes = sorted(subscribes, key=lambda x: x.id, reverse=True)
-                    for subscribe in subscribes:
-                        # 匹配订阅title
-                        if f"{subscribe.name} ({subscribe.year}) 已完成订阅" == title \
-                                or f"{subscribe.name} ({subscribe.year}) S{str(subscribe.season).rjust(2, '0')} 已完成订阅" == title:
-                            user_id = subscribe.username
-                            logger.info(f"{title} 获取到订阅用户 {user_id}")
-                            if user_id and any(user_id == user for user in extra_userid.split(",")):
-                                logger.info(f"{title} 消息用户 {user_id} 匹配到目标用户 {extra_userid}")
-                                self.__send_image_message(title=title,
-                                                          text=extra_msg,
-                                                          userid=user_id,
-                                                          access_token=access_token,
-                                                          appid=wechat_appid,
-                                                          image_url=subscribe.backdrop)
-                                logger.info(f"{wechat_appid} 发送额外消息 {extra_msg} 成功")
-                            break
+                    # 查最近一次完成该订阅的用户
+                    subscriber = self._subscriber_index.completed_user(title)
+                    if subscriber:
+                        user_id, backdrop = subscriber
+                        logger.info(f"{title} 获取到订阅用户 {user_id}")
+                        if user_id and any(user_id == user for user in extra_userid.split(",")):
+                            logger.info(f"{title} 消息用户 {user_id} 匹配到目标用户 {extra_userid}")
+                            self.__send_image_message(title=title,
+                                                      text=extra_msg,
+                                                      userid=user_id,
+                                                      appid=wechat_appid,
+                                                      image_url=backdrop)
+                            logger.info(f"{wechat_appid} 额外消息 {extra_msg} 已加入发送队列")
                 else:
                     # 搜索消息，获取消息text中的用户
                     result = re.search(r"用户：(.*?)\n", text)
@@ -721,18 +1301,8 @@ class WeChatForward(_PluginBase):
                                         f"{title} 额外消息 {self.__parse_tv_title(title)} 十分钟内重复发送，跳过。")
                                     continue
                             # 判断当前用户是否订阅，是否订阅后续消息
-                            subscribes = SubscribeOper().list_by_username(username=str(user_id),
-                                                                          state="R",
-                                                                          mtype=MediaType.TV.value)
-                            is_subscribe = False
-                            for subscribe in subscribes:
-                                # 匹配订阅title
-                                if f"{subscribe.name} ({subscribe.year})" in title:
-                                    is_subscribe = True
-                                    break
-
                             # 电视剧之前该用户订阅下载过，不再发送额外消息
-                            if is_subscribe:
+                            if self._subscriber_index.is_subscribing(username=user_id, title=title):
                                 logger.warn(
                                     f"{title} 额外消息 {self.__parse_tv_title(title)} 用户 {user_id} 已订阅，不再发送额外消息。")
                                 continue
@@ -741,9 +1311,8 @@ class WeChatForward(_PluginBase):
 
                         self.__send_message(title=extra_msg,
                                             userid=user_id,
-                                            access_token=access_token,
                                             appid=wechat_appid)
-                        logger.info(f"{title} {wechat_appid} 发送额外消息 {extra_msg} 成功")
+                        logger.info(f"{title} {wechat_appid} 额外消息 {extra_msg} 已加入发送队列")
                         # 保存已发送消息
                         if "开始下载" in str(title):
                             self._extra_msg_history[
@@ -806,6 +1375,13 @@ class WeChatForward(_PluginBase):
         """
         获取appid wechat token
         """
+        with self._token_lock:
+            return self.__refresh_access_token(appid=appid, force=force)
+
+    def __refresh_access_token(self, appid: int, force: bool = False):
+        """
+        检查token有效期，过期则重新获取
+        """
         wechat_confs = self._wechat_token_pattern_confs[appid]
         if not wechat_confs:
             logger.error(f"未获取到 {appid} 配置信息，请检查配置")
@@ -840,13 +1416,13 @@ class WeChatForward(_PluginBase):
         return access_token
 
     def __send_message(self, title: str, text: str = None, userid: str = None,
-                       access_token: str = None, appid: int = None) -> Optional[bool]:
+                       appid: int = None) -> bool:
         """
         发送文本消息
         :param title: 消息标题
         :param text: 消息内容
         :param userid: 消息发送对象的ID，为空则发给所有人
-        :return: 发送状态，错误信息
+        :return: 是否加入发送队列
         """
         if text:
             conent = "%s\n%s" % (title, text.replace("\n\n", "\n"))
@@ -866,18 +1442,17 @@ class WeChatForward(_PluginBase):
             "enable_id_trans": 0,
             "enable_duplicate_check": 0
         }
-        return self.__post_request(access_token=access_token, req_json=req_json, appid=appid, title=title, text=text,
-                                   userid=userid)
+        return self.__enqueue(appid=appid, req_json=req_json, title=title, text=text, userid=userid)
 
     def __send_image_message(self, title: str, image_url: str, text: str = None, userid: str = None,
-                             access_token: str = None, appid: int = None) -> Optional[bool]:
+                             appid: int = None) -> bool:
         """
         发送图文消息
         :param title: 消息标题
         :param text: 消息内容
         :param image_url: 图片地址
         :param userid: 消息发送对象的ID，为空则发给所有人
-        :return: 发送状态，错误信息
+        :return: 是否加入发送队列
         """
         if text:
             text = text.replace("\n\n", "\n")
@@ -898,15 +1473,36 @@ class WeChatForward(_PluginBase):
                 ]
             }
         }
-        return self.__post_request(access_token=access_token, req_json=req_json, appid=appid, title=title, text=text,
-                                   userid=userid)
+        return self.__enqueue(appid=appid, req_json=req_json, title=title, text=text, userid=userid)
 
-    def __post_request(self, access_token: str, req_json: dict, appid: int, title: str, retry: int = 0,
-                       text: str = None, userid: str = None) -> bool:
-        message_url = self._send_msg_url % (self._wechat_proxy, access_token)
+    def __enqueue(self, appid: int, req_json: dict, title: str, text: str = None, userid: str = None) -> bool:
         """
-        向微信发送请求
+        加入发送队列，排队中的相同消息只发送一次
         """
+        if not self._send_queue:
+            return False
+        queued = self._send_queue.put(appid, {
+            "req_json": req_json,
+            "title": title,
+            "text": text,
+            "userid": userid,
+        })
+        if not queued:
+            logger.info(f"转发 配置 {appid} 消息 {title} 已在发送队列中，合并发送")
+        return queued
+
+    def __post_request(self, appid: int, message: dict) -> Optional[bool]:
+        """
+        向微信发送请求，由发送队列调用
+        :return: True 成功 / False 失败 / None 可重试的失败，由队列延迟重发
+        """
+        req_json = message.get("req_json")
+        title = message.get("title")
+        access_token = self.__flush_access_token(appid=appid)
+        if not access_token:
+            logger.error(f"转发 配置 {appid} 消息 {title} 未获取到有效token，请检查配置")
+            return None
+        message_url = self._send_msg_url % (self._wechat_proxy, access_token)
         try:
             res = RequestUtils(content_type='application/json').post(
                 message_url,
@@ -916,23 +1512,17 @@ class WeChatForward(_PluginBase):
                 ret_json = res.json()
                 if ret_json.get('errcode') == 0:
                     logger.info(f"转发 配置 {appid} 消息 {title} {req_json} 成功")
-                    # 读取历史记录
-                    history = self.get_data('history') or []
-                    history.append({
-                        "appid": appid,
-                        "remark": f"({self._wechat_token_pattern_confs.get(appid).get('remark')})" if self._wechat_token_pattern_confs.get(
-                            appid).get('remark') else "",
-                        "title": title,
-                        "text": text,
-                        "userid": userid,
-                        "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
-                    })
-                    thirty_days_ago = time.time() - int(self._history_days) * 24 * 60 * 60
-                    history = [record for record in history if
-                               datetime.strptime(record["time"],
-                                                 '%Y-%m-%d %H:%M:%S').timestamp() >= thirty_days_ago]
-                    # 保存历史
-                    self.save_data(key="history", value=history)
+                    # 追加历史记录
+                    if self._history:
+                        self._history.append({
+                            "appid": appid,
+                            "remark": f"({self._wechat_token_pattern_confs.get(appid).get('remark')})" if self._wechat_token_pattern_confs.get(
+                                appid).get('remark') else "",
+                            "title": title,
+                            "text": message.get("text"),
+                            "userid": message.get("userid"),
+                            "time": time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(time.time()))
+                        })
                     return True
                 else:
                     if ret_json.get('errcode') == 81013:
@@ -940,32 +1530,21 @@ class WeChatForward(_PluginBase):
 
                     logger.error(f"转发 配置 {appid} 消息 {title} {req_json} 失败，错误信息：{ret_json}")
                     if ret_json.get('errcode') == 42001 or ret_json.get('errcode') == 40014:
-                        logger.info("token已过期，正在重新刷新token重试")
-                        # 重新获取token
-                        access_token = self.__flush_access_token(appid=appid,
-                                                                 force=True)
-                        if access_token:
-                            retry += 1
-                            # 重发请求
-                            if retry <= 3:
-                                return self.__post_request(access_token=access_token,
-                                                           req_json=req_json,
-                                                           appid=appid,
-                                                           title=title,
-                                                           retry=retry,
-                                                           text=text,
-                                                           userid=userid)
+                        logger.info("token已过期，正在重新刷新token，稍后重试")
+                        # 重新获取token，由队列重发
+                        if self.__flush_access_token(appid=appid, force=True):
+                            return None
                     return False
             elif res is not None:
                 logger.error(
                     f"转发 配置 {appid} 消息 {title} {req_json} 失败，错误码：{res.status_code}，错误原因：{res.reason}")
-                return False
+                return None if res.status_code >= 500 else False
             else:
-                logger.error(f"转发 配置 {appid} 消息 {title} {req_json} 失败，未获取到返回信息")
-                return False
+                logger.error(f"转发 配置 {appid} 消息 {title} {req_json} 失败，未获取到返回信息，稍后重试")
+                return None
         except Exception as err:
             logger.error(f"转发 配置 {appid} 消息 {title} {req_json} 异常，错误信息：{str(err)}")
-            return False
+            return None
 
     def __get_access_token(self, corpid: str, appsecret: str):
         """
@@ -997,7 +1576,12 @@ class WeChatForward(_PluginBase):
         """
         退出插件
         """
-        pass
+        if self._send_queue:
+            self._send_queue.stop()
+            self._send_queue = None
+        if self._extra_executor:
+            self._extra_executor.shutdown(wait=False, cancel_futures=True)
+            self._extra_executor = None
 
 
 if __name__ == '__main__':